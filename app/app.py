@@ -2,14 +2,21 @@ from flask import Flask, render_template, flash, jsonify, request, redirect, ses
 from dotenv import load_dotenv
 from waitress import serve
 from datetime import datetime
-from cocktail_scraper.scraper import scrap_data
-from cocktail_scraper.data_processor import process_data
+from cocktail_scraper.scraper import scrap_data, get_head_commit_sha, get_rate_limit_budget, analysis_depths, default_analysis_depth
+from cocktail_scraper.async_scraper import scrap_data_async, get_head_commit_sha_async, get_async_client_stats
+from cocktail_scraper.data_processor import process_data, scraper_extras
 from cocktail_scraper.translator import generate_cic, generate_graph_dot
+from cocktail_scraper.call_tracer import trace_analysis, get_call_stats
+from cocktail_scraper.http_client import get_client_stats
+from cocktail_scraper.rate_limiter import RateLimitExceeded
 from pprint import pprint
 from flask_caching import Cache
+import asyncio
+import math
 import re
 import os
 import secrets
+import hashlib
 
 load_dotenv() 
 
@@ -19,12 +26,23 @@ app.secret_key = secrets.token_hex(32)
 
 cache = Cache(config={
     'CACHE_TYPE': 'SimpleCache',
-    'CACHE_THRESHOLD': 100, # Max size
+    'CACHE_THRESHOLD': 500, # Max size
     'CACHE_DEFAULT_TIMEOUT': 3600}) # Stores for 1 hour
 cache.init_app(app)
 
 #render_template('homepage.html', date={"date": formated_iso_date})
 
+# CICs of a specific commit never change, so they are kept for longer (24 hours)
+cic_cache_timeout = 86400
+
+# Scraper mode: 'sequential', 'concurrent' (independent GitHub API calls made in parallel) or 'async' (the same calls made
+# by coroutines on the scraper's shared event loop and connection pool, so waiting on GitHub doesn't hold a thread per call)
+scrape_mode = 'async'
+
+# Extra fields (see data_processor.extra_fields, e.g. 'readme' or 'files') kept in the results; none of them are needed to
+# generate a CIC, so nothing extra is fetched
+result_extras = []
+
 # System Date
 current_date = datetime.now()
 formated_iso_date = current_date.strftime('%Y-%m-%dT%H:%M:%S')
@@ -39,10 +57,12 @@ def about():
     return render_template('about.html')
 
 @app.route('/generate', methods=['POST'])
-def generate():
+async def generate():
     # Get form data
     repo_url = request.form.get('repo_url')
     github_token = request.form.get('github_token')
+    # 'fast' only looks at the ecosystems of the repo's languages and skips lockfiles next to their manifest, 'deep' looks at everything
+    depth = request.form.get('analysis_depth') or default_analysis_depth
 
     session['github_token'] = github_token
     
@@ -56,11 +76,14 @@ def generate():
                 'Please make sure that you inserted the URL correctly and that it belongs to an ' \
                 'available repository.', 'error')
         return redirect(url_for('homepage'))  # Redirect to homepage
+    elif depth not in analysis_depths:
+        flash('The analysis depth you selected is not valid.', 'error')
+        return redirect(url_for('homepage'))  # Redirect to homepage
         
     
     # Process data
     try:
-        results = generate_repo_cic(repo_url, github_token)
+        results = await generate_repo_cic(repo_url, github_token, depth)
 
         # GitHub API returned an error
         if type(results) == tuple:
@@ -80,13 +103,19 @@ def generate():
                 flash('It seems that multiple repositories were fetched at once, intstead of only one.\n' \
                 'Please try again later.')
         else:
-            # Generate unique ID and store results
-            result_id = secrets.token_hex(8)
-            cache.set(result_id, results)
-            
+            # Results are stored under an ID derived from the repo and commit (see generate_repo_cic)
+            result_id = results["result_id"]
+
             # Redirect with ID instead of full data
             return redirect(url_for('results', result_id=result_id))
-    
+
+    # The token's budget won't allow the analysis's requests any time soon
+    except RateLimitExceeded as e:
+        print(f"Error generating results: {str(e)}")
+        flash('Your personal access token has reached the GitHub API rate limit.\n'
+              f'Please try again in {math.ceil(e.wait)} seconds.', 'error')
+        return redirect(url_for('homepage'))
+
     except Exception as e:
         print(f"Error generating results: {str(e)}")
         return "Error processing request", 500
@@ -108,8 +137,41 @@ def results():
         print(f"Error loading results: {str(e)}")
         return redirect(url_for('homepage'))
 
-def generate_repo_cic(repo_url, github_token):
-    repo_data = scrap_data(repo_url,github_token)
+# Builds the cache ID of the CIC of a repo at a specific commit (and analysis depth)
+def cic_result_id(repo_url, commit_sha, depth=default_analysis_depth):
+    # Extract owner and repo name from URL (GitHub names are case insensitive)
+    parts = repo_url.rstrip('/').removesuffix('.git').split('/')
+    repo_key = f"{parts[-2]}/{parts[-1]}".lower()
+    return hashlib.sha256(f"{repo_key}@{commit_sha}:{scrape_mode}:{depth}".encode('utf-8')).hexdigest()[:16]
+
+# Generates the CIC of a repo, tracing the GitHub API calls it makes as one analysis (kept in the results as 'call_trace')
+async def generate_repo_cic(repo_url, github_token, depth=default_analysis_depth):
+    with trace_analysis(repo_url) as trace:
+        return await build_repo_cic(repo_url, github_token, depth, trace)
+
+async def build_repo_cic(repo_url, github_token, depth, trace):
+    # Resolve the commit at HEAD first; if its CIC was already generated, reuse it
+    # Otherwise the repo is read at that commit (not at its branch, which may move in the meantime), so the CIC matches its ID
+    if scrape_mode == 'async':
+        commit_sha = await get_head_commit_sha_async(repo_url,github_token)
+    else:
+        commit_sha = await asyncio.to_thread(get_head_commit_sha,repo_url,github_token)
+
+    # GitHub API Error
+    if type(commit_sha) != str:
+        print('GitHub API Error: ' + str(commit_sha))
+        return ('Error',commit_sha)
+
+    result_id = cic_result_id(repo_url,commit_sha,depth)
+    cached_results = cache.get(result_id)
+    if cached_results:
+        print(f"CIC of commit {commit_sha} found in cache")
+        return cached_results
+
+    if scrape_mode == 'async':
+        repo_data = await scrap_data_async(repo_url,github_token,depth=depth,extras=scraper_extras(result_extras),ref=commit_sha)
+    else:
+        repo_data = await asyncio.to_thread(scrap_data,repo_url,github_token,mode=scrape_mode,depth=depth,extras=scraper_extras(result_extras),ref=commit_sha)
     
     # GitHub API Error
     if type(repo_data) == tuple:
@@ -121,13 +183,14 @@ def generate_repo_cic(repo_url, github_token):
         #print(repo_data)
 
         print("PROCESSOR:\n")
-        processed_data = process_data([repo_data])
+        # Processing and translation are CPU bound, they run outside of the event loop
+        processed_data = await asyncio.to_thread(process_data,[repo_data],result_extras)
         
         #print(processed_data)
 
         if len(processed_data) == 1:
             print("TRANSLATOR:\n")
-            cic = generate_cic(processed_data[0])
+            cic = await asyncio.to_thread(generate_cic,processed_data[0])
             #print(cic)
         else:
             # Multiple repos error treatement (just to be safe)
@@ -135,15 +198,20 @@ def generate_repo_cic(repo_url, github_token):
             return (('Error',901))
 
         results = {
+            "result_id" : result_id,
+            "commit_sha" : commit_sha,
+            "analysis_depth" : depth,
             "scraper_data" : repo_data,
             "processor_data" : processed_data,
-            "cic_data" : cic 
+            "cic_data" : cic,
+            "call_trace" : trace.to_dict()
         }
+        cache.set(result_id, results, timeout=cic_cache_timeout)
 
         return results
 
 @app.route('/graph_data')
-def graph_data():
+async def graph_data():
     # Get the cache ID of the requested CIC data
     result_id = request.args.get('result_id')
     if not result_id:
@@ -156,11 +224,29 @@ def graph_data():
     cic_data = results["cic_data"]
 
     # Generate the GraphViz graph of the CIC
-    dot = generate_graph_dot(cic_data["name"],cic_data["cic"])
+    dot = await asyncio.to_thread(generate_graph_dot,cic_data["name"],cic_data["cic"])
 
     # .source gets the DOT string for the browser to genarate the graph
     return jsonify({'dot': dot.source})
 
+# Rate limit budget of the GitHub token used in the current session, as last reported by the API
+@app.route('/rate_limit')
+def rate_limit():
+    github_token = session.get('github_token')
+    if not github_token:
+        return jsonify({"error": "No GitHub token in session"}), 400
+
+    return jsonify(get_rate_limit_budget(github_token))
+
+# GitHub API calls made by the app, by endpoint (the calls of an analysis are in its results, as 'call_trace'), with the
+# connections of the clients of the blocking ('http_client') and async ('async_client') scrape modes
+@app.route('/call_stats')
+def call_stats():
+    stats = get_call_stats()
+    stats["http_client"] = get_client_stats()
+    stats["async_client"] = get_async_client_stats()
+    return jsonify(stats)
+
 # Switch to 'dev' to run in default local flask server
 mode = 'prod'
 
@@ -170,4 +256,6 @@ if __name__ == '__main__':
         app.run(port=8000, debug=True)
     
     else:
-        serve(app, host='0.0.0.0', port='50100', threads=1)
\ No newline at end of file
+        # Requests to GitHub are all made from the scraper's event loop, so a few threads are enough to serve analyses at
+        # the same time (each one only waits on its own request)
+        serve(app, host='0.0.0.0', port='50100', threads=8)
\ No newline at end of file
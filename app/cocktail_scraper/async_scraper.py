@@ -0,0 +1,742 @@
+import asyncio
+import atexit
+import base64
+import contextvars
+import functools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlencode
+import aiohttp
+from multidict import CIMultiDict
+from . import scraper
+from .scraper import (load_data_json, save_file, filter_tree_item, find_dependency_files, select_dependency_files, default_analysis_depth,
+                      get_blob_shas, get_blob_sizes,
+                      build_dependency_query, StreamedText, dependency_batch_result, split_into_batches, split_batch, submodules_query, parse_submodules_response)
+from .file_tree import FileTree, TreeStreamParser
+from .http_cache import get_shared_cache, CacheWriter
+from .blob_store import get_shared_store
+from .rate_limiter import scheduler, RateLimitExceeded
+from .http_client import (HTTPClient, default_connect_timeout, default_read_timeout, default_max_retries, retry_statuses,
+                          idempotent_methods)
+from . import call_tracer
+
+# asyncio version of the scrap_data call graph (repo data, languages, README, tree, submodules and dependency batches)
+# Every coroutine runs on the event loop of a single shared client, whose aiohttp session keeps a pool of connections to
+# the GitHub API: any number of analyses wait on GitHub from that one thread instead of one thread each.
+# Requests go through the same request scheduler, HTTP cache and blob store as the blocking scraper
+# Only network waits happen on the loop itself: parsing and disk access (HTTP cache, blob store) are handed to a small pool
+# of threads (see off_loop), so a big repo doesn't hold up every other analysis in flight
+
+# Maximum number of connections kept open by the shared client (in total and to a single host)
+max_connections = 100
+max_connections_per_host = 30
+# Size of the chunks streamed bodies are read in (in bytes)
+stream_chunk_bytes = 64 * 1024
+# Threads the shared client's loop hands parsing and disk access to
+offload_workers = 8
+
+# Response of the shared client, with the attributes of requests.Response that the scraper and the request scheduler use
+class AsyncResponse(object):
+
+    def __init__(self, status_code, headers, content=b"", encoding=None, from_cache=False):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.from_cache = from_cache
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+# A download abandoned for going over its size limit
+class DownloadTooLarge(Exception):
+    pass
+
+# Event loop running in its own thread, with the aiohttp session (and connection pool) shared by every coroutine run on it
+# Its requests have the same timeouts and retries as the ones of the blocking client (see http_client.HTTPClient)
+class AsyncGitHubClient(object):
+
+    def __init__(self, limit=max_connections, limit_per_host=max_connections_per_host, connect_timeout=default_connect_timeout,
+                 read_timeout=default_read_timeout, max_retries=default_max_retries):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self.hosts = {}
+        self.session = None
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(max_workers=offload_workers, thread_name_prefix="gitcocktail-offload"))
+        self.thread = threading.Thread(target=self.loop.run_forever, name="gitcocktail-async-client", daemon=True)
+        self.thread.start()
+
+    # Session of the client, created on first use (only called from the client's loop)
+    async def get_session(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host),
+                timeout=self.timeout,
+                auto_decompress=True,
+                trace_configs=[self.connection_tracing()],
+            )
+        return self.session
+
+    # Counts the requests sent to each host, and how many of them opened a new connection or reused one of the pool
+    def connection_tracing(self):
+        async def request_start(session, context, params):
+            context.host = f"{params.url.scheme}://{params.url.host}:{params.url.port}"
+            self.count_connection(context.host, "requests")
+
+        async def connection_created(session, context, params):
+            self.count_connection(context.host, "connections")
+
+        async def connection_reused(session, context, params):
+            self.count_connection(context.host, "reused")
+
+        tracing = aiohttp.TraceConfig()
+        tracing.on_request_start.append(request_start)
+        tracing.on_connection_create_end.append(connection_created)
+        tracing.on_connection_reuseconn.append(connection_reused)
+        return tracing
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def count_connection(self, host, stat):
+        with self.lock:
+            self.hosts.setdefault(host, {"requests": 0, "connections": 0, "reused": 0})[stat] += 1
+
+    # Sends a request (send is a coroutine function returning an AsyncResponse), retrying idempotent ones that fail with a
+    # server error or without a response like HTTPClient.request does
+    # A streamed body can't be taken back once part of it was handed over, so a request that fails after that (streamed()
+    # returns True) isn't retried. The number of retries is kept in the response's 'transport_retries' attribute
+    async def request(self, method, url, send, streamed=lambda: False):
+        retries = self.max_retries if method.upper() in idempotent_methods else 0
+
+        for attempt in range(retries + 1):
+            self.count("requests")
+            try:
+                response = await send()
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == retries or streamed():
+                    self.count("failures")
+                    raise
+                delay = HTTPClient.retry_delay(attempt)
+            else:
+                if response.status_code not in retry_statuses or attempt == retries:
+                    response.transport_retries = attempt
+                    return response
+                delay = HTTPClient.retry_delay(attempt, response)
+
+            self.count("retries")
+            print(f"Request to {url} failed, retrying in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+
+    # Request counters, plus how many connections were opened and reused (in total and by host), as HTTPClient.get_stats
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            hosts = {host: dict(counts) for host, counts in self.hosts.items()}
+        stats["connections"] = sum(host["connections"] for host in hosts.values())
+        stats["reused_connections"] = sum(host["reused"] for host in hosts.values())
+        sent = sum(host["requests"] for host in hosts.values())
+        stats["reuse_ratio"] = stats["reused_connections"] / sent if sent else 0.0
+        stats["hosts"] = hosts
+        return stats
+
+    # Runs a coroutine on the client's loop, with the caller's context variables (e.g. the trace of its analysis)
+    # Returns a concurrent.futures.Future with its result
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(run_in_context(coroutine, contextvars.copy_context()), self.loop)
+
+    # Awaits a coroutine run on the client's loop, from any other event loop (e.g. the one an async Flask view runs in)
+    async def run(self, coroutine):
+        return await asyncio.wrap_future(self.submit(coroutine))
+
+    def close(self):
+        if self.session is not None:
+            asyncio.run_coroutine_threadsafe(self.session.close(), self.loop).result()
+            self.session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+async def run_in_context(coroutine, context):
+    # Tasks start with a copy of the loop thread's context, so the caller's values are set again inside the task
+    for variable, value in context.items():
+        variable.set(value)
+    return await coroutine
+
+
+# Client shared by the whole process, created on first use
+shared_client = None
+shared_client_lock = threading.Lock()
+
+def get_shared_client():
+    global shared_client
+    with shared_client_lock:
+        if shared_client is None:
+            shared_client = AsyncGitHubClient()
+            # Close the pooled connections before the interpreter shuts down
+            atexit.register(shared_client.close)
+    return shared_client
+
+# Requests sent by the shared client and how many of them reused an open connection
+def get_async_client_stats():
+    return get_shared_client().get_stats()
+
+# Runs blocking code (parsing, disk access) in the loop's thread pool, with the caller's context
+async def off_loop(function, *args):
+    return await asyncio.to_thread(function, *args)
+
+# Makes a coroutine function always run on the shared client's loop, whatever loop it is awaited from
+def on_client_loop(function):
+    @functools.wraps(function)
+    async def wrapper(*args, **kwargs):
+        client = get_shared_client()
+        if asyncio.get_running_loop() is client.loop:
+            return await function(*args, **kwargs)
+        return await client.run(function(*args, **kwargs))
+    return wrapper
+
+# Runs a coroutine on the shared client's loop from blocking code and returns its result
+def run_sync(coroutine):
+    return get_shared_client().submit(coroutine).result()
+
+# Same as scraper.scheduled_request, for coroutines (the body of streamed responses is counted by github_get_async)
+async def scheduled_request_async(send, url, headers, span):
+    authorization = (headers or {}).get("Authorization")
+    resource = "graphql" if url.endswith("/graphql") else "core"
+
+    response = None
+    try:
+        for attempt in range(scraper.max_rate_limit_retries + 1):
+            try:
+                with call_tracer.timed_phase(span, "wait"):
+                    await scheduler.acquire_async(authorization, resource)
+            except RateLimitExceeded:
+                # The retry can't be made in time, the caller gets the rate limit error instead
+                if response is None:
+                    raise
+                attempt -= 1
+                break
+            with call_tracer.timed_phase(span, "latency"):
+                response = await send()
+            retry_after = scheduler.update(authorization, response, resource)
+            if retry_after is None or attempt == scraper.max_rate_limit_retries:
+                break
+            print(f"Rate limited by the GitHub API, retrying in {retry_after:.0f} seconds")
+    except Exception as e:
+        call_tracer.finish_span(span, None, error=e)
+        raise
+
+    call_tracer.finish_span(span, response, attempt, len(response.content))
+    return response
+
+# Reads a cached body from disk, passing it to on_chunk in chunks (returns b"") or returning it whole
+def read_cached_body(body_file, on_chunk):
+    with body_file:
+        if on_chunk is None:
+            return body_file.read()
+        for chunk in iter(lambda: body_file.read(stream_chunk_bytes), b""):
+            on_chunk(chunk)
+    return b""
+
+# Sends a GET request with the shared session, revalidating it against the HTTP cache if one is specified
+# The body of a successful response is either read whole or, if on_chunk is specified, passed to it one chunk at a time
+async def send_get(url, headers, cache, on_chunk, revalidate=True):
+    session = await get_shared_client().get_session()
+
+    key = cached_meta = None
+    request_headers = dict(headers or {})
+    if cache is not None:
+        key, cached_meta, conditional_headers = await off_loop(cache.prepare, url, headers)
+        if revalidate:
+            request_headers = conditional_headers
+        else:
+            cached_meta = None
+
+    async with session.get(url, headers=request_headers) as response:
+        response_headers = CIMultiDict(response.headers)
+
+        # Not modified, serve it from disk (with the headers of the 304, which carry the current rate limit)
+        if response.status == 304 and cached_meta:
+            body_file = await off_loop(cache.revalidated, key)
+            if body_file is None:
+                # The entry was evicted in the meantime, ask for the whole body
+                return await send_get(url, headers, cache, on_chunk, revalidate=False)
+            response_headers.update(cached_meta.get("headers", {}))
+            content = await off_loop(read_cached_body, body_file, on_chunk)
+            return AsyncResponse(200, response_headers, content, cached_meta.get("encoding"), from_cache=True)
+
+        if cache is not None:
+            cache.count_miss()
+        meta = cache.response_meta(url, response.status, response_headers, response.charset) if cache is not None else None
+
+        if response.status != 200 or on_chunk is None:
+            content = await response.read()
+            if meta is not None:
+                await off_loop(cache.store, key, meta, content)
+            return AsyncResponse(response.status, response_headers, content, response.charset)
+
+        writer = await off_loop(CacheWriter, cache, key, meta) if meta is not None else None
+
+        def handle(chunk):
+            if writer is not None:
+                writer.write(chunk)
+            on_chunk(chunk)
+
+        try:
+            # Chunks are handed to the thread pool stream_chunk_bytes at a time, however small the network reads are
+            pending = bytearray()
+            async for chunk in response.content.iter_chunked(stream_chunk_bytes):
+                pending += chunk
+                if len(pending) >= stream_chunk_bytes:
+                    await off_loop(handle, bytes(pending))
+                    pending.clear()
+            if pending:
+                await off_loop(handle, bytes(pending))
+            if writer is not None:
+                await off_loop(writer.finish)
+        finally:
+            # Nothing is stored if the body wasn't read until the end
+            if writer is not None:
+                await off_loop(writer.discard)
+        return AsyncResponse(200, response_headers, b"", response.charset)
+
+# Same as scraper.github_get, for coroutines (on_chunk: see send_get)
+async def github_get_async(url, headers=None, cached=True, params=None, on_chunk=None):
+    if params:
+        url = f"{url}?{urlencode(params)}"
+    cache = get_shared_cache() if cached else None
+    span = call_tracer.start_span("GET", url)
+    streamed = []
+
+    # Streamed bodies are counted as they arrive
+    def counted(chunk):
+        streamed.append(len(chunk))
+        call_tracer.add_bytes(span, len(chunk))
+        on_chunk(chunk)
+
+    def send():
+        return get_shared_client().request("GET", url, lambda: send_get(url, headers, cache, counted if on_chunk else None),
+                                           streamed=lambda: bool(streamed))
+    return await scheduled_request_async(send, url, headers, span)
+
+# Same as scraper.github_post, for coroutines
+async def github_post_async(url, headers=None, json_body=None):
+    async def post():
+        session = await get_shared_client().get_session()
+        async with session.post(url, headers=headers, json=json_body) as response:
+            return AsyncResponse(response.status, CIMultiDict(response.headers), await response.read(), response.charset)
+
+    def send():
+        return get_shared_client().request("POST", url, post)
+    return await scheduled_request_async(send, url, headers, call_tracer.start_span("POST", url, json_body))
+
+# Owner and repo name of a repo URL
+def split_repo_url(repo_url):
+    parts = repo_url.rstrip('/').split('/')
+    return parts[-2], parts[-1]
+
+# Headers for authentication
+def auth_headers(token, accept=None):
+    headers = {}
+    if accept:
+        headers["Accept"] = accept
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return headers
+
+# Same as scraper.get_repo_data
+@on_client_loop
+async def get_repo_data_async(repo_url, token=None):
+    owner, repo_name = split_repo_url(repo_url)
+    response = await github_get_async(f"{scraper.api_base_url}/repos/{owner}/{repo_name}", auth_headers(token))
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        print(f"Error: Unable to fetch repository details (Status code {response.status_code}: {response.text})")
+        return response.status_code
+
+# Same as scraper.get_head_commit_sha
+@on_client_loop
+async def get_head_commit_sha_async(repo_url, token=None):
+    owner, repo_name = split_repo_url(repo_url)
+    api_url = f"{scraper.api_base_url}/repos/{owner}/{repo_name}/commits/HEAD"
+    response = await github_get_async(api_url, auth_headers(token, "application/vnd.github.sha"))
+
+    if response.status_code == 200:
+        return response.text.strip()
+    else:
+        print(f"Error: Unable to fetch the HEAD commit (Status code {response.status_code}: {response.text})")
+        return response.status_code
+
+# Same as scraper.get_repo_languages
+@on_client_loop
+async def get_repo_languages_async(repo_url, token=None):
+    owner, repo_name = split_repo_url(repo_url)
+    response = await github_get_async(f"{scraper.api_base_url}/repos/{owner}/{repo_name}/languages", auth_headers(token))
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        print(f"Error: Unable to fetch repository languages (Status code {response.status_code}: {response.text})")
+        return None
+
+# Same as scraper.get_repo_readme
+@on_client_loop
+async def get_repo_readme_async(repo_url, token=None):
+    owner, repo_name = split_repo_url(repo_url)
+    response = await github_get_async(f"{scraper.api_base_url}/repos/{owner}/{repo_name}/readme", auth_headers(token))
+
+    if response.status_code == 200:
+        # The content is Base64 encoded
+        return base64.b64decode(response.json()['content']).decode('utf-8')
+    else:
+        return f"Error: Unable to fetch README. Status code {response.status_code}: {response.text}"
+
+# Same as scraper.download_raw_file
+@on_client_loop
+async def download_raw_file_async(repo_url, path, token=None, ref=None, max_bytes=None):
+    if max_bytes is None:
+        max_bytes = scraper.max_raw_file_bytes
+
+    owner, repo_name = split_repo_url(repo_url)
+    api_url = f"{scraper.api_base_url}/repos/{owner}/{repo_name}/contents/{quote(path)}"
+    headers = auth_headers(token, "application/vnd.github.v3.raw")
+
+    text = StreamedText()
+    downloaded = 0
+
+    def write(chunk):
+        nonlocal downloaded
+        downloaded += len(chunk)
+        if downloaded > max_bytes:
+            raise DownloadTooLarge()
+        text.feed(chunk)
+
+    try:
+        response = await github_get_async(api_url, headers, cached=False, params={"ref": ref} if ref else None, on_chunk=write)
+    except DownloadTooLarge:
+        print(f"Error: File {path} is too big to download (over {max_bytes} bytes)")
+        return None
+
+    if response.status_code != 200:
+        print(f"Error: Unable to download file {path} (Status code {response.status_code}: {response.text})")
+        return None
+
+    return text.text()
+
+# Same as scraper.get_repo_files: the tree is parsed into a FileTree as its body arrives
+@on_client_loop
+async def get_repo_files_async(repo_url, default_branch, token=None):
+    owner, repo_name = split_repo_url(repo_url)
+    tree_api_url = f"{scraper.api_base_url}/repos/{owner}/{repo_name}/git/trees/{default_branch}?recursive=1"
+    url_prefix = f"{scraper.api_base_url}/repos/{owner}/{repo_name}/git/"
+
+    parser = TreeStreamParser(FileTree(url_prefix))
+    response = await github_get_async(tree_api_url, auth_headers(token), on_chunk=parser.feed)
+    if response.status_code != 200:
+        return f"Error: Unable to fetch the repository's file path data. Status code {response.status_code}: {response.text}"
+
+    try:
+        file_tree, truncated = await off_loop(parser.close)
+    except ValueError as e:
+        return f"Error: Unable to parse the repository's file path data: {e}"
+
+    # The recursive tree is cut short for very large repos, so walk it one subtree at a time instead
+    if truncated:
+        print("The repository's tree is too large to fetch at once, fetching it by subtrees")
+        file_path_data = await walk_repo_tree_async(repo_url, default_branch, token)
+        if type(file_path_data) == str:
+            return file_path_data
+        return await off_loop(FileTree.from_entries, file_path_data, url_prefix)
+
+    return file_tree
+
+# Same as scraper.get_subtree
+async def get_subtree_async(repo_url, tree_sha, prefix, token=None):
+    owner, repo_name = split_repo_url(repo_url)
+    tree_api_url = f"{scraper.api_base_url}/repos/{owner}/{repo_name}/git/trees/{quote(tree_sha)}"
+    response = await github_get_async(tree_api_url, auth_headers(token))
+
+    if response.status_code != 200:
+        print(f"Error: Unable to fetch subtree {prefix or '/'} (Status code {response.status_code}: {response.text})")
+        return None
+
+    return await off_loop(parse_subtree_response, response, prefix)
+
+# Entries of a subtree response
+def parse_subtree_response(response, prefix):
+    tree_data = response.json()
+    if tree_data.get('truncated'):
+        print(f"Warning: Subtree {prefix or '/'} has too many entries and was truncated by the API")
+    return [filter_tree_item(item, prefix) for item in tree_data.get('tree', [])]
+
+# Same as scraper.walk_repo_tree, with at most max_workers subtrees fetched at the same time
+@on_client_loop
+async def walk_repo_tree_async(repo_url, default_branch, token=None, max_entries=None, max_workers=None):
+    max_entries = max_entries or scraper.max_tree_entries
+    semaphore = asyncio.Semaphore(max_workers or scraper.max_tree_workers)
+
+    async def fetch(tree_sha, prefix):
+        async with semaphore:
+            return prefix, await get_subtree_async(repo_url, tree_sha, prefix, token)
+
+    file_path_data = []
+    pending = {asyncio.ensure_future(fetch(default_branch, ''))}
+    capped = False
+    failed = None
+
+    try:
+        while pending and failed is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                prefix, items = task.result()
+                # A subtree is missing, drop the subtrees that are still pending
+                if items is None:
+                    failed = prefix
+                    break
+
+                for item in items:
+                    if len(file_path_data) >= max_entries:
+                        capped = True
+                        break
+                    file_path_data.append(item)
+                    # Walk into the subtree
+                    if item.get('type') == 'tree' and 'sha' in item:
+                        pending.add(asyncio.ensure_future(fetch(item['sha'], item['path'] + '/')))
+
+                # No more room, drop the subtrees that are still pending
+                if capped:
+                    break
+            if capped:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if failed is not None:
+        return f"Error: Unable to fetch the repository's file path data (subtree {failed or '/'} couldn't be fetched)"
+    if capped:
+        print(f"Warning: The repository's tree has more than {max_entries} entries, only the first ones were listed")
+
+    # Same order as the recursive tree API (each tree followed by its contents)
+    file_path_data.sort(key=lambda item: item.get('path', '').split('/'))
+    return file_path_data
+
+# Same as scraper.get_submodules
+@on_client_loop
+async def get_submodules_async(repo_url, token, ref=None):
+    owner, repo = split_repo_url(repo_url)
+    variables = {"owner": owner, "repo": repo, "expression": ref or "HEAD"}
+    response = await github_post_async(scraper.graphql_url, auth_headers(token), {"query": submodules_query, "variables": variables})
+
+    if response.status_code == 200:
+        return parse_submodules_response(response.json())
+    else:
+        print(f"Error: {response.status_code}")
+        print(response.text)
+        return []
+
+# Same as scraper.fetch_dependency_batch
+async def fetch_dependency_batch_async(repo_url, token, batch, default_branch):
+    owner, repo = split_repo_url(repo_url)
+    query, alias_map = build_dependency_query(batch, default_branch)
+    variables = {"owner": owner, "repo": repo}
+    response = await github_post_async(scraper.graphql_url, auth_headers(token), {"query": query, "variables": variables})
+
+    # Authentication and permission errors won't go away by retrying
+    if response.status_code in (401, 403, 404):
+        raise Exception(f"Query failed with status code {response.status_code}. {response.text}")
+    elif response.status_code != 200:
+        print(f"Error in batch (Status code {response.status_code}), it will be split and retried")
+        return [], batch
+
+    blobs, retry = dependency_batch_result(await off_loop(response.json), alias_map)
+    entries = []
+    for file_info, blob in blobs:
+        # If content is not complete, download the full contents
+        if blob.get("isTruncated"):
+            content = await download_raw_file_async(repo_url, file_info["path"], token, default_branch)
+            entry = {"path": file_info["path"], "text": content, "isTruncated": "Not anymore"}
+        else:
+            entry = {"path": file_info["path"], "text": blob.get("text"), "isTruncated": blob.get("isTruncated")}
+        entries.append((file_info["file_type"], entry))
+
+    return entries, retry
+
+# Same as scraper.fetch_large_dependency_file
+async def fetch_large_dependency_file_async(repo_url, token, file_type, path, default_branch):
+    content = await download_raw_file_async(repo_url, path, token, default_branch)
+    if content is None:
+        return [], {}
+    return [(file_type, {"path": path, "text": content, "isTruncated": False})], {}
+
+# Same as scraper.get_dependencies, with at most parallel_batches queries (or raw downloads) made at the same time
+@on_client_loop
+async def get_dependencies_async(repo_url, token, target_files, default_branch, blob_shas=None, file_sizes=None, parallel_batches=None):
+    blob_shas = blob_shas or {}
+    file_sizes = file_sizes or {}
+    semaphore = asyncio.Semaphore(parallel_batches or scraper.max_parallel_batches)
+    store = get_shared_store()
+    results, files_to_fetch, large_files = await off_loop(stored_dependency_files, store, target_files, blob_shas, file_sizes)
+
+    async def limited(function, *args):
+        async with semaphore:
+            return await function(*args)
+
+    # Task -> batch it is fetching (a large file is a batch of its own, downloaded raw)
+    pending = {}
+    for batch in split_into_batches(files_to_fetch, file_sizes=file_sizes):
+        pending[asyncio.ensure_future(limited(fetch_dependency_batch_async, repo_url, token, batch, default_branch))] = batch
+    for file_type, path in large_files:
+        pending[asyncio.ensure_future(limited(fetch_large_dependency_file_async, repo_url, token, file_type, path, default_branch))] = {file_type: [path]}
+
+    fetched = []
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.pop(task)
+                entries, batch = task.result()
+                fetched.extend(entries)
+                if not batch:
+                    continue
+                if sum(len(paths) for paths in batch.values()) > 1:
+                    # Retry each half of the files the batch couldn't fetch
+                    for half in split_batch(batch):
+                        pending[asyncio.ensure_future(limited(fetch_dependency_batch_async, repo_url, token, half, default_branch))] = half
+                else:
+                    # A single file that can't be fetched through GraphQL
+                    for file_type, paths in batch.items():
+                        pending[asyncio.ensure_future(limited(fetch_large_dependency_file_async, repo_url, token, file_type, paths[0], default_branch))] = {file_type: []}
+    finally:
+        # A batch that failed for good leaves the rest of them unfinished
+        for task in pending:
+            task.cancel()
+
+    await off_loop(store_dependency_files, store, fetched, blob_shas)
+    for file_type, entry in fetched:
+        results.setdefault(file_type, []).append(entry)
+
+    # Keep the files of each type in the same order as target_files, whatever order they were fetched in
+    for file_type, entries in results.items():
+        order = {path: index for index, path in enumerate(target_files.get(file_type, []))}
+        entries.sort(key=lambda entry: order.get(entry["path"], len(order)))
+
+    return results
+
+# Takes the files that are already in the blob store out of the ones to fetch, and separates the ones too big for GraphQL
+# Returns (stored files by type, files to fetch by type, [(file type, path)] of the large files)
+def stored_dependency_files(store, target_files, blob_shas, file_sizes):
+    results = {}
+    files_to_fetch = {}
+    large_files = []
+    for file_type, paths in target_files.items():
+        for path in paths:
+            sha = blob_shas.get(path)
+            text = store.get_text(sha) if sha else None
+            if text is not None:
+                results.setdefault(file_type, []).append({"path": path, "text": text, "isTruncated": False, "sha": sha})
+            elif file_sizes.get(path, 0) > scraper.max_graphql_file_bytes:
+                large_files.append((file_type, path))
+            else:
+                files_to_fetch.setdefault(file_type, []).append(path)
+    return results, files_to_fetch, large_files
+
+# Stores the fetched content by its blob SHA, so it can be reused by any repo that has the same blob
+def store_dependency_files(store, fetched, blob_shas):
+    for _, entry in fetched:
+        sha = blob_shas.get(entry["path"])
+        if sha:
+            entry["sha"] = sha
+            store.put_text(sha, entry["text"])
+
+# Dependency files to fetch from a repo's tree, with their blob SHAs and sizes
+def target_dependency_files(file_path_data, lang_data, depth, data_json):
+    target_files = select_dependency_files(find_dependency_files(file_path_data, data_json["dependency_file_targets"]), lang_data, depth, data_json)
+    return target_files, get_blob_shas(file_path_data, target_files), get_blob_sizes(file_path_data, target_files)
+
+# Stands in for a call that isn't made (see scraper.extra_fields)
+async def skipped_call():
+    return None
+
+# Awaits a coroutine and returns its result along with the time it took (in seconds), like scraper.timed_call
+async def timed_call_async(coroutine):
+    start = time.perf_counter()
+    result = await coroutine
+    return result, time.perf_counter() - start
+
+# Same as scraper.scrap_data (with mode='concurrent'): every independent call is awaited at the same time, and the
+# dependency files are fetched as soon as the tree is available
+@on_client_loop
+async def scrap_data_async(repo_url, token, debug=None, depth=default_analysis_depth, extras=(), ref=None):
+    # Load data.json
+    data_json = load_data_json()
+    call_timings = {}
+
+    # Every other call depends on the repo's existence and default branch
+    repo_data, call_timings["get_repo_data"] = await timed_call_async(get_repo_data_async(repo_url, token))
+
+    # If repo exists, is available and data was able to be fetched
+    if repo_data and type(repo_data) == dict:
+        repo_name = repo_data.get('name')
+        print(f"The repository name is: {repo_name}")
+        ref = ref or repo_data.get('default_branch')
+
+        async def timed(call, coroutine):
+            result, call_timings[call] = await timed_call_async(coroutine)
+            return result
+
+        languages = asyncio.ensure_future(timed("get_repo_languages", get_repo_languages_async(repo_url, token)))
+
+        # Dependency fetching starts as soon as the tree (and, at the 'fast' depth, the languages) are available
+        async def files_and_dependencies():
+            file_path_data = await timed("get_repo_files", get_repo_files_async(repo_url, ref, token))
+            dependency_files_data = None
+            if file_path_data and type(file_path_data) == FileTree:
+                lang_data = await languages if depth == 'fast' else None
+                target_files, blob_shas, file_sizes = await off_loop(target_dependency_files, file_path_data, lang_data, depth, data_json)
+                dependency_files_data = await timed("get_dependencies", get_dependencies_async(
+                    repo_url, token, target_files, ref, blob_shas, file_sizes,
+                ))
+            return file_path_data, dependency_files_data
+
+        readme_data, lang_data, (file_path_data, dependency_files_data), submodule_data = await asyncio.gather(
+            timed("get_repo_readme", get_repo_readme_async(repo_url, token)) if 'readme' in extras else skipped_call(),
+            languages,
+            files_and_dependencies(),
+            timed("get_submodules", get_submodules_async(repo_url, token, ref)),
+        )
+
+        # Same keys and conditions as the blocking versions
+        if lang_data:
+            repo_data["languages"] = lang_data
+        if readme_data:
+            repo_data["readme"] = readme_data
+        if file_path_data:
+            if 'file_path_data' in extras:
+                repo_data["file_path_data"] = file_path_data
+            if dependency_files_data:
+                repo_data["dependency_file_data"] = dependency_files_data
+        if submodule_data:
+            repo_data["submodules"] = submodule_data
+
+        repo_data["analysis_depth"] = depth
+        repo_data["call_timings"] = call_timings
+
+        if debug:
+            save_file(repo_data)
+
+        return repo_data
+    else:
+        return ('Error',repo_data)
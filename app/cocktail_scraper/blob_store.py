@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from .config import app_cache_dir, make_private_dir
+
+# Default location of the store, can be changed through an environment variable
+default_store_dir = os.getenv('GITCOCKTAIL_BLOB_STORE_DIR', os.path.join(app_cache_dir, 'blob_store'))
+
+# Bump when the output of the parsers changes, so results stored by older versions are not reused
+parsed_format_version = 1
+
+# Version of the output of each parser (1 if not listed), bumped when a single parser is changed or replaced so only
+# its stored results stop being reused
+parser_versions = {
+    "go_goMod": 3,
+    "ruby_gemfile": 2,
+    "js_yarnLock": 2,
+}
+
+# Content-addressed store of dependency files, keyed by their git blob SHA
+# Keeps the raw text of each blob ('blobs/<sha[:2]>/<sha>.txt') and the output of each parser that ran on it
+# ('parsed/<parser_key>/<sha[:2]>/<sha>.json'). Since a blob SHA identifies its content, entries never go stale
+class BlobStore(object):
+
+    def __init__(self, store_dir=default_store_dir):
+        self.store_dir = store_dir
+        self.lock = threading.Lock()
+        self.stats = {"text_hits": 0, "text_misses": 0, "parsed_hits": 0, "parsed_misses": 0}
+        make_private_dir(store_dir)
+
+    def text_path(self, sha):
+        return os.path.join(self.store_dir, 'blobs', sha[:2], sha + '.txt')
+
+    def parsed_path(self, sha, parser_key):
+        return os.path.join(self.store_dir, 'parsed', f"v{parsed_format_version}", parser_key, sha[:2], sha + '.json')
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    # Writes a file atomically, so concurrent readers (threads or other processes) never see half of it
+    def write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # Raw text of a blob (None if it isn't stored)
+    def get_text(self, sha):
+        try:
+            with open(self.text_path(sha), encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            self.count("text_misses")
+            return None
+        self.count("text_hits")
+        return text
+
+    def put_text(self, sha, text):
+        if sha and text is not None:
+            self.write(self.text_path(sha), text)
+
+    # Output of a parser for a blob (None if it isn't stored)
+    def get_parsed(self, sha, parser_key):
+        try:
+            with open(self.parsed_path(sha, parser_key), encoding='utf-8') as f:
+                parsed = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            self.count("parsed_misses")
+            return None
+        self.count("parsed_hits")
+        return parsed
+
+    def put_parsed(self, sha, parser_key, parsed):
+        if sha:
+            self.write(self.parsed_path(sha, parser_key), json.dumps(parsed))
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+
+# Identifies a parser (and the version of its output) and the extra arguments it was called with (the same blob can be
+# parsed differently, e.g. .NET languages)
+def parser_key(parser, args=()):
+    name = parser.__name__
+    version = parser_versions.get(name, 1)
+    if version > 1:
+        name = f"{name}.v{version}"
+    if not args:
+        return name
+    args_digest = hashlib.sha256(json.dumps(args, sort_keys=True, default=sorted).encode('utf-8')).hexdigest()[:16]
+    return f"{name}-{args_digest}"
+
+
+# Store shared by the whole process, created on first use
+shared_store = None
+shared_store_lock = threading.Lock()
+
+def get_shared_store():
+    global shared_store
+    with shared_store_lock:
+        if shared_store is None:
+            shared_store = BlobStore()
+    return shared_store
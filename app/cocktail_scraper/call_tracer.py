@@ -0,0 +1,238 @@
+import contextvars
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# Tracing of the calls made to the GitHub API
+# Every call is recorded as a span (endpoint, status, time spent waiting for the request scheduler and on the request
+# itself, response bytes, retries and rate limit headers). Spans are grouped by analysis (see trace_analysis) and added up
+# by endpoint for the whole process (see get_call_stats)
+# The traces of analyses (which have the repos and file paths of their users) are only handed to the analysis they belong
+# to, the process only keeps the stats by endpoint
+
+# Rate limit headers kept with each span
+rate_limit_headers = {
+    "limit": "X-RateLimit-Limit",
+    "remaining": "X-RateLimit-Remaining",
+    "used": "X-RateLimit-Used",
+    "reset": "X-RateLimit-Reset",
+    "resource": "X-RateLimit-Resource",
+}
+
+# Trace of the analysis the current context is running (None: calls are only added to the process stats)
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+# Variable parts of the REST endpoints, replaced by placeholders so calls to the same endpoint are grouped together
+endpoint_patterns = [
+    (re.compile(r'^.*?/repos/[^/]+/[^/]+'), '/repos/{owner}/{repo}'),
+    (re.compile(r'/git/(trees|blobs)/[^/]+$'), r'/git/\1/{sha}'),
+    (re.compile(r'/(commits|tarball|zipball)/.+$'), r'/\1/{ref}'),
+    (re.compile(r'/contents/.+$'), '/contents/{path}'),
+]
+graphql_operation = re.compile(r'^\s*(?:query|mutation)\s+(\w+)')
+
+# Name of the endpoint a call is made to, e.g. 'GET /repos/{owner}/{repo}/git/trees/{sha}' or 'POST /graphql FetchRepoOverview'
+def endpoint_name(method, url, json_body=None):
+    path = urlsplit(url).path.rstrip('/')
+    if path.endswith('/graphql'):
+        match = graphql_operation.match((json_body or {}).get("query") or "")
+        return f"{method} /graphql {match.group(1) if match else 'anonymous'}"
+
+    for pattern, replacement in endpoint_patterns:
+        path = pattern.sub(replacement, path)
+    return f"{method} {path}"
+
+# Calls of one analysis
+class CallTrace(object):
+
+    def __init__(self, label=None):
+        self.analysis_id = uuid.uuid4().hex[:16]
+        self.label = label
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, span):
+        with self.lock:
+            self.spans.append(span)
+
+    def finish(self):
+        self.duration = time.time() - self.started_at
+
+    # Summary of the calls by endpoint, without the spans themselves
+    def summary(self):
+        with self.lock:
+            spans = list(self.spans)
+        return {
+            "analysis_id": self.analysis_id,
+            "label": self.label,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "calls": len(spans),
+            "endpoints": summarize_spans(spans),
+            "rate_limit_cost": rate_limit_cost(spans),
+        }
+
+    def to_dict(self):
+        summary = self.summary()
+        with self.lock:
+            summary["spans"] = [dict(span) for span in self.spans]
+        return summary
+
+# Calls of a list of spans added up by endpoint
+def summarize_spans(spans):
+    endpoints = {}
+    for span in spans:
+        stats = endpoints.setdefault(span["endpoint"], new_endpoint_stats())
+        add_span_stats(stats, span)
+        stats["bytes"] += span["bytes"] or 0
+    return endpoints
+
+def new_endpoint_stats():
+    return {"calls": 0, "errors": 0, "from_cache": 0, "retries": 0, "wait": 0.0, "latency": 0.0, "max_latency": 0.0, "bytes": 0}
+
+def add_span_stats(stats, span):
+    stats["calls"] += 1
+    if span["status"] is None or span["status"] >= 400:
+        stats["errors"] += 1
+    if span["from_cache"]:
+        stats["from_cache"] += 1
+    stats["retries"] += span["retries"]
+    stats["wait"] += span["wait"]
+    stats["latency"] += span["latency"]
+    stats["max_latency"] = max(stats["max_latency"], span["latency"])
+
+# Rate limit points a list of spans used, by resource, going by the 'used' counter the API reported
+# The cost of the earliest call of each resource isn't known, it is counted as 1 point
+def rate_limit_cost(spans):
+    used = {}
+    for span in spans:
+        rate_limit = span["rate_limit"] or {}
+        if rate_limit.get("used") is not None:
+            used.setdefault(rate_limit.get("resource") or "core", []).append(int(rate_limit["used"]))
+    return {resource: max(values) - min(values) + 1 for resource, values in used.items()}
+
+# Calls of the whole process by endpoint
+class CallStats(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def add_span(self, span):
+        with self.lock:
+            add_span_stats(self.endpoints.setdefault(span["endpoint"], new_endpoint_stats()), span)
+
+    def add_bytes(self, endpoint, count):
+        with self.lock:
+            self.endpoints.setdefault(endpoint, new_endpoint_stats())["bytes"] += count
+
+    def to_dict(self):
+        with self.lock:
+            endpoints = {endpoint: dict(stats) for endpoint, stats in self.endpoints.items()}
+        for stats in endpoints.values():
+            stats["mean_latency"] = stats["latency"] / stats["calls"] if stats["calls"] else 0.0
+        return {"endpoints": endpoints}
+
+# Stats shared by the whole process
+call_stats = CallStats()
+
+# Groups the calls made inside the block (including the ones made by threads and coroutines started with its context) in a
+# trace
+# Nested blocks add their calls to the trace of the outermost one
+@contextmanager
+def trace_analysis(label=None):
+    trace = current_trace.get()
+    if trace is not None:
+        yield trace
+        return
+
+    trace = CallTrace(label)
+    reset_token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(reset_token)
+        trace.finish()
+
+# Starts the span of a call, which belongs to the trace of the current context
+def start_span(method, url, json_body=None):
+    return {
+        "endpoint": endpoint_name(method, url, json_body),
+        "url": url,
+        "status": None,
+        "started_at": time.time(),
+        "wait": 0.0,
+        "latency": 0.0,
+        "bytes": None,
+        "retries": 0,
+        "from_cache": False,
+        "rate_limit": None,
+        "error": None,
+        "trace": current_trace.get(),
+    }
+
+# Adds the time spent inside the block to a phase of a span ('wait' for the scheduler, 'latency' for the request)
+@contextmanager
+def timed_phase(span, phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        span[phase] += time.perf_counter() - start
+
+# Adds bytes of the response body to a span (bodies that are streamed are counted as they are read)
+def add_bytes(span, count):
+    span["bytes"] = (span["bytes"] or 0) + count
+    call_stats.add_bytes(span["endpoint"], count)
+
+# Ends a span with the response of its call (None if it failed with an exception) and records it
+# Retries made by the HTTP client itself (see http_client) are added to the ones made after a rate limit
+def finish_span(span, response, retries=0, body_bytes=None, error=None):
+    if response is not None:
+        span["status"] = response.status_code
+        span["from_cache"] = getattr(response, "from_cache", False)
+        span["rate_limit"] = {key: response.headers[header] for key, header in rate_limit_headers.items() if header in response.headers} or None
+        retries += getattr(response, "transport_retries", 0)
+    span["retries"] = retries
+    if error is not None:
+        span["error"] = f"{type(error).__name__}: {error}"
+
+    trace = span.pop("trace")
+    call_stats.add_span(span)
+    if trace is not None:
+        trace.add(span)
+    if body_bytes is not None:
+        add_bytes(span, body_bytes)
+
+# Wraps the raw body of a streamed response, counting the bytes read into a span
+# Bodies sent with Content-Encoding (e.g. gzip) are decoded, like requests does (see http_cache.CachingReader)
+class CountingReader(object):
+
+    def __init__(self, raw, span):
+        self.raw = raw
+        self.span = span
+
+    def read(self, amount=None):
+        if hasattr(self.raw, "stream"):
+            data = self.raw.read(amount, decode_content=True)
+        else:
+            data = self.raw.read(amount)
+        if data:
+            add_bytes(self.span, len(data))
+        return data
+
+    def close(self):
+        self.raw.close()
+
+    def release_conn(self):
+        if hasattr(self.raw, "release_conn"):
+            self.raw.release_conn()
+
+# Process-wide calls by endpoint
+def get_call_stats():
+    return call_stats.to_dict()
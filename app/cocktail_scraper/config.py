@@ -0,0 +1,134 @@
+import functools
+import json
+import os
+import threading
+from types import MappingProxyType
+
+# Configuration of the pipeline (data.json), loaded once per process wherever it is started from
+# The registry keeps a read-only copy of it along with the lookup tables built from it (dependency file matcher, .NET TFMs),
+# so no stage has to read the file or rebuild them again
+
+# Location of data.json (next to this module, not relative to the working directory)
+data_json_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data.json')
+
+# Directory the on-disk caches are kept in by default ($XDG_CACHE_HOME/gitcocktail, ~/.cache/gitcocktail if it isn't set),
+# can be changed through an environment variable
+# The caches hold what the tokens of the app's users can read (including private repos), so unlike the system's temporary
+# directory it is only accessible to the user the app runs as
+app_cache_dir = os.getenv('GITCOCKTAIL_CACHE_DIR', os.path.join(
+    os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'gitcocktail'))
+
+# Creates a directory (and the missing ones above it) that only the current user can access
+def make_private_dir(path):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+
+# Read-only copy of parsed JSON (dicts become mapping proxies and lists become tuples)
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+# Classifies paths as one of the targeted dependency files, built once from the list of targets
+# Targets that start with '.' (e.g. '.csproj') are matched by extension, the remaining ones by exact file name
+class DependencyFileMatcher(object):
+
+    def __init__(self, targets):
+        self.names = {}
+        self.extensions = {}
+        for dep_file in targets:
+            if dep_file.startswith('.'):
+                self.extensions.setdefault(dep_file, dep_file)
+            else:
+                self.names.setdefault(dep_file, dep_file)
+        # Lets str.endswith rule out most paths before the extension is extracted
+        self.extension_suffixes = tuple(self.extensions)
+
+    # Finds which of the targeted dependency files a path is (None if it isn't one)
+    def match(self, path):
+        name = path[path.rfind('/') + 1:]
+        dep_file = self.names.get(name)
+        if dep_file is None and name.endswith(self.extension_suffixes):
+            dot = name.rfind('.')
+            # A file named just '.csproj' has no name, only an extension
+            if dot > 0:
+                dep_file = self.extensions.get(name[dot:])
+        return dep_file
+
+# Distinct TFMs whose group is remembered by TfmLookup.match (TFMs come from project files, so there is no fixed set of them)
+tfm_match_cache_size = 1024
+
+# Target framework moniker (e.g. 'net6.0') -> .NET framework group, built from data.json's dotNet_framework_tfm
+# It is still the plain {tfm: group} dict the .NET parsers always got (so the keys of their stored results don't change), plus
+# match, which finds the group of a TFM found in a project file without going through every key
+# Like the rest of the registry it is read-only: changing it raises a TypeError
+class TfmLookup(dict):
+
+    def __init__(self, items=()):
+        super().__init__(items)
+        self.order = tuple(self)
+        self.positions = MappingProxyType({tfm: position for position, tfm in enumerate(self.order)})
+        self.max_length = max(map(len, self), default=0)
+        self.cached_match = functools.lru_cache(maxsize=tfm_match_cache_size)(self.find_group)
+
+    # Builds the lookup from data.json's {group: [tfm, ...]}
+    # A TFM listed under more than one group keeps its first position and its last group, like the lookup built before
+    @classmethod
+    def from_frameworks(cls, frameworks):
+        return cls((tfm, group) for group, tfms in frameworks.items() for tfm in tfms)
+
+    def read_only(self, *args, **kwargs):
+        raise TypeError("TfmLookup is read-only")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = read_only
+
+    # Sent to the parser pool's workers as its items, the match cache is rebuilt there
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+    # Group of the first TFM (in lookup order) that is part of the specified one, None if there isn't any
+    # Same result as checking 'tfm in text' for every TFM in order; the surrounding whitespace of the text doesn't change it, so
+    # the last tfm_match_cache_size results are remembered without it
+    def match(self, text):
+        return self.cached_match(text.strip())
+
+    # Only the substrings of the text (up to the longest TFM) are looked up, instead of every TFM
+    def find_group(self, text):
+        positions = self.positions
+        # An empty TFM would be part of any text
+        best = positions.get("")
+        for start in range(len(text)):
+            for end in range(start + 1, min(len(text), start + self.max_length) + 1):
+                position = positions.get(text[start:end])
+                if position is not None and (best is None or position < best):
+                    best = position
+
+        return self[self.order[best]] if best is not None else None
+
+# The loaded configuration and its lookup tables
+class Config(object):
+
+    def __init__(self, data):
+        self.data = freeze(data)
+        self.dependency_file_targets = self.data["dependency_file_targets"]
+        self.target_matcher = DependencyFileMatcher(self.dependency_file_targets)
+        self.framework_tfm = TfmLookup.from_frameworks(data["dotNet_framework_tfm"])
+        self.dotNet_languages = self.data["dotNet_languages"]
+
+    @classmethod
+    def load(cls, path=data_json_path):
+        with open(path) as json_data:
+            return cls(json.load(json_data))
+
+
+# Configuration shared by the whole process, loaded on first use
+shared_config = None
+shared_config_lock = threading.Lock()
+
+def get_config():
+    global shared_config
+    with shared_config_lock:
+        if shared_config is None:
+            shared_config = Config.load()
+    return shared_config
@@ -2,7 +2,9 @@ import json
 import re
 import pprint
 from . import dependencies_parser
-from .scraper import load_data_json
+from .config import get_config
+from .blob_store import get_shared_store, parser_key
+from .parser_pool import get_parser_pool
 
 # Auxiliary function to help rebuid file hierarchy
 def build_hierarchy(entries):
@@ -106,8 +108,17 @@ def get_types(obj, types=None, count=None):
             get_types(item, types, count)
     return types, count
 
+# Fields of the loaded data that no later stage reads (process_repo_data and the translator only use the name, languages,
+# submodules and dependency files), mapped to the scraper field each one is built from. They are only built when asked
+# for through 'extras', and the scraper only has to fetch the fields of the extras asked for (see scraper_extras)
+extra_fields = {"readme": "readme", "files": "file_path_data"}
+
+# Scraper fields needed to build the specified extras
+def scraper_extras(extras):
+    return [extra_fields[extra] for extra in extras]
+
 # Loads the repo data from a file or from a dictionary
-def load_repos(file_path,is_file):
+def load_repos(file_path,is_file,extras=()):
     repo_data = []
 
     if is_file:
@@ -125,7 +136,8 @@ def load_repos(file_path,is_file):
         if "languages" in repo:
             for lang in repo["languages"]:
                 content["languages"].append(lang.replace(" ","_"))
-        content["readme"] = repo["readme"]
+        if "readme" in extras and "readme" in repo:
+            content["readme"] = repo["readme"]
         """
         content["files"] = {"pathlessFiles":[]}
         for file_data in repo["file_path_data"]:
@@ -141,8 +153,9 @@ def load_repos(file_path,is_file):
             elif file_data["type"] == "blob":
                 content["files"]["pathlessFiles"].append(file_data["path"])
         """ 
-        file_hierarchy = build_hierarchy(repo["file_path_data"])
-        content["files"] = convert_to_output_format(file_hierarchy)
+        if "files" in extras and "file_path_data" in repo:
+            file_hierarchy = build_hierarchy(repo["file_path_data"])
+            content["files"] = convert_to_output_format(file_hierarchy)
         #content["files"] = build_file_structure(repo["file_path_data"])
         if "submodules" in repo: 
             content["submodules"] = repo["submodules"]
@@ -237,191 +250,203 @@ def eliminate_and_merge_duplicates(obj):
         # Base case: not a dict or list
         return obj
 
+# Runs the parser of each dependency file target (with its extra arguments) on the target's non empty files
+# Returns {target: [(file, dependencies), ...]}, with the files in their original order
+# Results stored for the same blob and arguments are reused, the remaining files are parsed at once by the parser pool
+# (in worker processes when there is enough to parse, see parser_pool)
+def run_parsers(dependency_file_data, parsers, pool=None):
+    store = get_shared_store()
+    parsed = {}
+    pending = []
+
+    for target, (parser, *args) in parsers.items():
+        files = [file for file in dependency_file_data.get(target, []) if file["text"] != ""]
+        if not files:
+            continue
+        key = parser_key(parser, args)
+        for file in files:
+            entry = [file, None]
+            parsed.setdefault(target, []).append(entry)
+            if file.get("sha"):
+                entry[1] = store.get_parsed(file["sha"], key)
+            if entry[1] is None:
+                pending.append((entry, parser, args, key))
+
+    results = (pool or get_parser_pool()).parse([(parser, entry[0]["text"], args) for entry, parser, args, _ in pending])
+    for (entry, parser, args, key), dependencies in zip(pending, results):
+        entry[1] = dependencies
+        if entry[0].get("sha"):
+            store.put_parsed(entry[0]["sha"], key, dependencies)
+
+    return {target: [tuple(entry) for entry in entries] for target, entries in parsed.items()}
+
 # Parses a repo's dependency files for ingredients
-def parse_dependencies(repo,languages=None):
-    # Load data.json
-    data_json = load_data_json()
+# The files are parsed by the specified parser pool (the shared one by default), their results are merged in the same order
+def parse_dependencies(repo,languages=None,pool=None):
+    # Configuration and lookups loaded once per process (e.g. the dotNet framework tfm (target framework moniker) lookup)
+    config = get_config()
+    framework_tfm = config.framework_tfm
     
     # Find which compatible .NET languages are present
     if languages:
-        dotNet_langs = [item for item in data_json["dotNet_languages"] if item in languages]
+        dotNet_langs = [item for item in config.dotNet_languages if item in languages]
     else:
         languages = []
+        dotNet_langs = []
+
+    # Parser of each dependency file target and its extra arguments
+    parsers = {
+        "pyproject.toml": (dependencies_parser.py_pyproject,),
+        "requirements.txt": (dependencies_parser.py_requirements,),
+        "package.json": (dependencies_parser.js_packageJson,),
+        "yarn.lock": (dependencies_parser.js_yarnLock,),
+        "package-lock.json": (dependencies_parser.js_packageLock,),
+        "pom.xml": (dependencies_parser.java_pomXML,),
+        "Gemfile": (dependencies_parser.ruby_gemfile,),
+        "Gemfile.lock": (dependencies_parser.ruby_gemfileLock,),
+        "composer.json": (dependencies_parser.php_composerJson,),
+        "composer.lock": (dependencies_parser.php_composerLock,),
+        "go.mod": (dependencies_parser.go_goMod,),
+        "go.sum": (dependencies_parser.go_goSum,),
+        "Cargo.toml": (dependencies_parser.rust_cargoToml, False),
+        "Cargo.lock": (dependencies_parser.rust_cargoLock,),
+        ".csproj": (dependencies_parser.dotNet_proj, framework_tfm, dotNet_langs),
+        ".vbproj": (dependencies_parser.dotNet_proj, framework_tfm, dotNet_langs),
+        ".fsproj": (dependencies_parser.dotNet_proj, framework_tfm, dotNet_langs),
+        "packages.config": (dependencies_parser.dotNet_packagesConfig, framework_tfm, dotNet_langs),
+    }
+    parsed = run_parsers(repo["dependency_file_data"], parsers, pool)
 
     content = {}
 
-    if "pyproject.toml" in repo["dependency_file_data"]:
+    if "pyproject.toml" in parsed:
         # {'dependencies': dependencies{ "necessary"[], "optional"{grupo:[]} || [] }, 'tools': tools[]}
-        for file in repo["dependency_file_data"]["pyproject.toml"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.py_pyproject(file["text"])
-                if 'dependencies' in dependencies:
-                    if 'necessary' in dependencies['dependencies']:
-                        content.setdefault('necessary', []).extend(dependencies['dependencies']['necessary'])
-                    # optionals are a special case
-                    if 'optional' in dependencies['dependencies']:
-                        match(dependencies['dependencies']['optional']):
-                            case list():
-                                content.setdefault('optional',{}).setdefault('none_found', []).extend(dependencies['dependencies']['optional'])
-                            case dict():
-                                for group in dependencies['dependencies']['optional']:
-                                    content.setdefault('optional',{}).setdefault(group, []).extend(dependencies['dependencies']['optional'][group])
-
-                if 'tools' in dependencies:
-                    content.setdefault('tools',[]).extend(dependencies["tools"])
-
-    if "requirements.txt" in repo["dependency_file_data"]:
+        for file, dependencies in parsed["pyproject.toml"]:
+            if 'dependencies' in dependencies:
+                if 'necessary' in dependencies['dependencies']:
+                    content.setdefault('necessary', []).extend(dependencies['dependencies']['necessary'])
+                # optionals are a special case
+                if 'optional' in dependencies['dependencies']:
+                    match(dependencies['dependencies']['optional']):
+                        case list():
+                            content.setdefault('optional',{}).setdefault('none_found', []).extend(dependencies['dependencies']['optional'])
+                        case dict():
+                            for group in dependencies['dependencies']['optional']:
+                                content.setdefault('optional',{}).setdefault(group, []).extend(dependencies['dependencies']['optional'][group])
+
+            if 'tools' in dependencies:
+                content.setdefault('tools',[]).extend(dependencies["tools"])
+
+    if "requirements.txt" in parsed:
         # {'dependencies' : dependecies[], 'req_files' : requires[]}
-        for file in repo["dependency_file_data"]["requirements.txt"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.py_requirements(file["text"])
-                if 'dependencies' in dependencies: 
-                    content.setdefault('necessary', []).extend(dependencies['dependencies'])
-                #TODO: Tratar req_files
-
-    if "package.json" in repo["dependency_file_data"]:
+        for file, dependencies in parsed["requirements.txt"]:
+            if 'dependencies' in dependencies: 
+                content.setdefault('necessary', []).extend(dependencies['dependencies'])
+            #TODO: Tratar req_files
+
+    if "package.json" in parsed:
         # {'necessary':[],'devDependencies':[],'peerDependencies':[],'bundledDependencies':[],'optional':[],'os':[]}
-        for file in repo["dependency_file_data"]["package.json"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.js_packageJson(file["text"])
-                for key in dependencies:
-                    # optionals are a special case
-                    if key == 'optional':
-                        content.setdefault('optional',{}).setdefault('none_found', []).extend(dependencies['optional'])
-                    else:
-                        content.setdefault(key, []).extend(dependencies[key])          
+        for file, dependencies in parsed["package.json"]:
+            for key in dependencies:
+                # optionals are a special case
+                if key == 'optional':
+                    content.setdefault('optional',{}).setdefault('none_found', []).extend(dependencies['optional'])
+                else:
+                    content.setdefault(key, []).extend(dependencies[key])          
 
-    if "yarn.lock" in repo["dependency_file_data"]:   
+    if "yarn.lock" in parsed:   
         # []       
-        for file in repo["dependency_file_data"]["yarn.lock"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.js_yarnLock(file["text"])
-                content.setdefault('others', []).extend(dependencies)
+        for file, dependencies in parsed["yarn.lock"]:
+            content.setdefault('others', []).extend(dependencies)
 
-    if "pom.xml" in repo["dependency_file_data"]:
+    if "package-lock.json" in parsed:
+        # []
+        for file, dependencies in parsed["package-lock.json"]:
+            content.setdefault('others', []).extend(dependencies)
+
+    if "pom.xml" in parsed:
         # []             
-        for file in repo["dependency_file_data"]["pom.xml"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.java_pomXML(file["text"])
-                content.setdefault('necessary', []).extend(dependencies)
+        for file, dependencies in parsed["pom.xml"]:
+            content.setdefault('necessary', []).extend(dependencies)
 
-    if "Gemfile" in repo["dependency_file_data"]:
+    if "Gemfile" in parsed:
         # {'groupName' : elements[]}
-        for file in repo["dependency_file_data"]["Gemfile"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.ruby_gemfile(file["text"])
-                for group in dependencies:
-                    # Parser puts ungrouped dependencies under 'runtime' key; necessary by default
-                    if group == 'runtime':
-                        content.setdefault('necessary', []).extend(dependencies[group])
-                    else:
-                        content.setdefault('groups',{}).setdefault(group, []).extend(dependencies[group])
+        for file, dependencies in parsed["Gemfile"]:
+            for group in dependencies:
+                # Parser puts ungrouped dependencies under 'runtime' key; necessary by default
+                if group == 'runtime':
+                    content.setdefault('necessary', []).extend(dependencies[group])
+                else:
+                    content.setdefault('groups',{}).setdefault(group, []).extend(dependencies[group])
+
+    if "Gemfile.lock" in parsed:
+        # []
+        for file, dependencies in parsed["Gemfile.lock"]:
+            content.setdefault('others', []).extend(dependencies)
 
-    if "composer.json" in repo["dependency_file_data"]:     
+    if "composer.json" in parsed:     
         # {'necessary':[], 'devDependencies':[]}      
-        for file in repo["dependency_file_data"]["composer.json"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.php_composerJson(file["text"])
-                for key in dependencies:
-                    content.setdefault(key, []).extend(dependencies[key])   
+        for file, dependencies in parsed["composer.json"]:
+            for key in dependencies:
+                content.setdefault(key, []).extend(dependencies[key])   
+
+    if "composer.lock" in parsed:
+        # []
+        for file, dependencies in parsed["composer.lock"]:
+            content.setdefault('others', []).extend(dependencies)
 
-    if "go.mod" in repo["dependency_file_data"]: 
+    if "go.mod" in parsed: 
         # {'necessary':[], 'indirect':[]}            
-        for file in repo["dependency_file_data"]["go.mod"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.go_goMod(file["text"])
-                for key in dependencies:
-                    content.setdefault(key, []).extend(dependencies[key])
+        for file, dependencies in parsed["go.mod"]:
+            for key in dependencies:
+                content.setdefault(key, []).extend(dependencies[key])
 
-    if "go.sum" in repo["dependency_file_data"]:    
+    if "go.sum" in parsed:    
         # []        
-        for file in repo["dependency_file_data"]["go.sum"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.go_goSum(file["text"])
-                content.setdefault('others', []).extend(dependencies)
+        for file, dependencies in parsed["go.sum"]:
+            content.setdefault('others', []).extend(dependencies)
 
-    if "Cargo.toml" in repo["dependency_file_data"]:
+    if "Cargo.toml" in parsed:
         # {'necessary':[], 'devDependencies':[], 'buildDependencies':[], 'workspaceDependencies':[], 'target':{'targetName': {all previous are possible} } }             
-        for file in repo["dependency_file_data"]["Cargo.toml"]:
-            if file["text"] != "":
-                if file["path"].endswith("Cargo.toml"):
-                    dependencies = dependencies_parser.rust_cargoToml(file["text"], recursive=False)
-                    for key in dependencies:
-                        # Some dependencies are organized by 'target'
-                        if key == 'target':
-                            for target in dependencies['target']:
-                                for target_sub in dependencies['target'][target]:
-                                    content.setdefault('target',{}).setdefault(target, {}).setdefault(target_sub,[]).extend(dependencies['target'][target][target_sub])
-                        else:
-                            content.setdefault(key, []).extend(dependencies[key])  
-
-    if ".csproj" in repo["dependency_file_data"]:   
-        # Load dotNet framework tfm (target framework moniker)
-        frameworks_json = data_json["dotNet_framework_tfm"]
-        
-        # Build lookup for faster checking
-        framework_tfm = {}
-        for group, tfms in frameworks_json.items():
-            for tfm in tfms:
-                framework_tfm[tfm] = group
-
-        # {'packageReference':[], 'reference':[], 'frameworks':[]}      
-        for file in repo["dependency_file_data"][".csproj"]:
-            if file["text"] != "":      
-                dependencies = dependencies_parser.dotNet_proj(file["text"],framework_tfm,dotNet_langs)
+        for file, dependencies in parsed["Cargo.toml"]:
+            if file["path"].endswith("Cargo.toml"):
                 for key in dependencies:
-                    content.setdefault('necessary', []).extend(dependencies[key])  
+                    # Some dependencies are organized by 'target'
+                    if key == 'target':
+                        for target in dependencies['target']:
+                            for target_sub in dependencies['target'][target]:
+                                content.setdefault('target',{}).setdefault(target, {}).setdefault(target_sub,[]).extend(dependencies['target'][target][target_sub])
+                    else:
+                        content.setdefault(key, []).extend(dependencies[key])  
 
-    if ".vbproj" in repo["dependency_file_data"]:
-        # Load dotNet framework tfm (target framework moniker)
-        frameworks_json = data_json["dotNet_framework_tfm"]
-        
-        # Build lookup for faster checking
-        framework_tfm = {}
-        for group, tfms in frameworks_json.items():
-            for tfm in tfms:
-                framework_tfm[tfm] = group
+    if "Cargo.lock" in parsed:
+        # []
+        for file, dependencies in parsed["Cargo.lock"]:
+            content.setdefault('others', []).extend(dependencies)
 
+    if ".csproj" in parsed:   
         # {'packageReference':[], 'reference':[], 'frameworks':[]}      
-        for file in repo["dependency_file_data"][".vbproj"]:
-            if file["text"] != "":        
-                dependencies = dependencies_parser.dotNet_proj(file["text"],framework_tfm,dotNet_langs)
-                for key in dependencies:
-                    content.setdefault('necessary', []).extend(dependencies[key])
+        for file, dependencies in parsed[".csproj"]:
+            for key in dependencies:
+                content.setdefault('necessary', []).extend(dependencies[key])  
 
-    if ".fsproj" in repo["dependency_file_data"]:
-        # Load dotNet framework tfm (target framework moniker)
-        frameworks_json = data_json["dotNet_framework_tfm"]
-        
-        # Build lookup for faster checking
-        framework_tfm = {}
-        for group, tfms in frameworks_json.items():
-            for tfm in tfms:
-                framework_tfm[tfm] = group
+    if ".vbproj" in parsed:
+        # {'packageReference':[], 'reference':[], 'frameworks':[]}      
+        for file, dependencies in parsed[".vbproj"]:
+            for key in dependencies:
+                content.setdefault('necessary', []).extend(dependencies[key])
 
+    if ".fsproj" in parsed:
         # {'packageReference':[], 'reference':[], 'frameworks':[]}      
-        for file in repo["dependency_file_data"][".fsproj"]:
-            if file["text"] != "":        
-                dependencies = dependencies_parser.dotNet_proj(file["text"],framework_tfm,dotNet_langs)
-                for key in dependencies:
-                    content.setdefault('necessary', []).extend(dependencies[key]) 
+        for file, dependencies in parsed[".fsproj"]:
+            for key in dependencies:
+                content.setdefault('necessary', []).extend(dependencies[key]) 
     
-    if "packages.config" in repo["dependency_file_data"]:
-        # Load dotNet framework tfm (target framework moniker)
-        frameworks_json = data_json["dotNet_framework_tfm"]
-        
-        # Build lookup for faster checking
-        framework_tfm = {}
-        for group, tfms in frameworks_json.items():
-            for tfm in tfms:
-                framework_tfm[tfm] = group
-
+    if "packages.config" in parsed:
         # {'package':[], 'devDependencies':[], 'frameworks':[]}     
-        for file in repo["dependency_file_data"]["packages.config"]:
-            if file["text"] != "":
-                dependencies = dependencies_parser.dotNet_packagesConfig(file["text"],framework_tfm,dotNet_langs)
-                for key in dependencies:
-                    content.setdefault('necessary', []).extend(dependencies[key]) 
+        for file, dependencies in parsed["packages.config"]:
+            for key in dependencies:
+                content.setdefault('necessary', []).extend(dependencies[key]) 
     
     #return eliminate_duplicates(content)
     return eliminate_and_merge_duplicates(content)
@@ -472,15 +497,15 @@ def save_processed_data(repo_data):
         json.dump(repo_data, f, indent=4)
 
 # Processes the scraped data into a more suitable format to build the ontology
-def process_data(data):
-    repo_data = load_repos(data,False)
+def process_data(data,extras=()):
+    repo_data = load_repos(data,False,extras)
     processed_data = process_repo_data(repo_data)
 
     return processed_data
 
 # Same as above function, but saves the content into a file (for debug)
 def test_process_data():
-    repo_data = load_repos("repo_data.json",True)
+    repo_data = load_repos("repo_data.json",True,list(extra_fields))
     #pprint.pprint(repo_data)
     save_loaded_data(repo_data)
     processed_data = process_repo_data(repo_data)
@@ -490,5 +515,50 @@ def test_process_data():
 
     return processed_data
 
+# Times parse_dependencies on a monorepo made of 'copies' copies of a fixture repo's dependency files, for each number of
+# parser pool workers (0 parses on the calling thread), and checks every run merges the same output (for debug)
+# The files have no blob SHA, so nothing is reused from the blob store. The pool is used whatever the size of the batch
+# (min_pool_bytes is lowered for the benchmark), and workers can only make up for their cost with as many CPUs
+def benchmark_parse_dependencies(repo="gitcocktail-fixtures/polyglot-shop", copies=50, workers=(0, 2, 4), runs=3):
+    import os
+    import time
+    from . import parser_pool
+    from .fake_github import load_fixtures
+    from .parser_pool import ParserPool
+
+    fixture = load_fixtures()[repo]
+    matcher = get_config().target_matcher
+    dependency_file_data = {}
+    for copy in range(copies):
+        for path, content in sorted(fixture.files.items()):
+            target = matcher.match(path)
+            if target:
+                dependency_file_data.setdefault(target, []).append({"path": f"package{copy}/{path}", "text": content.decode('utf-8'), "isTruncated": False})
+    monorepo = {"name": fixture.name, "dependency_file_data": dependency_file_data}
+    print(f"{sum(map(len, dependency_file_data.values()))} files, {sum(len(file['text']) for files in dependency_file_data.values() for file in files)} bytes, {os.cpu_count()} CPUs")
+
+    results = {}
+    expected = None
+    min_pool_bytes = parser_pool.min_pool_bytes
+    for count in workers:
+        pool = ParserPool(count)
+        parser_pool.min_pool_bytes = 0
+        try:
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                dependencies = parse_dependencies(monorepo, list(fixture.languages), pool)
+                timings.append(time.perf_counter() - start)
+        finally:
+            pool.close()
+            parser_pool.min_pool_bytes = min_pool_bytes
+
+        if expected is None:
+            expected = dependencies
+        results[count] = {"runs": timings, "same_output": dependencies == expected}
+        print(f"{count} workers: " + ", ".join(f"{timing:.3f}s" for timing in timings) + f" | same output: {results[count]['same_output']}")
+
+    return results
+
 #if __name__ == "__main__":
 #    test_process_data()
\ No newline at end of file
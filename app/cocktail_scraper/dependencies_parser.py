@@ -1,7 +1,6 @@
-import re, json, tomllib, tempfile, subprocess, os
+import re, json, tomllib
 import xml.etree.ElementTree as ET
-import pyarn.lockfile
-from .modified_gemfileparser import GemfileParser
+from .config import TfmLookup
 from pprint import pprint
 
 # Used to normalize names to be compared
@@ -22,25 +21,23 @@ def type_identifier(ingredient,info=None,associated_languages=None):
             if info["type"] == 'dotNet_framework':
                 results = []
                 frameworks_found = set()
+                # Precompiled lookup (see config.TfmLookup), or built from a plain {tfm: group} dict
+                tfm_lookup = info["data"] if isinstance(info["data"], TfmLookup) else TfmLookup(info["data"])
                 # For each tfm found
                 for tfm in ingredient:
-                    # Find the associated framework
-                    for key in info["data"]:
-                        # If tfm matches, identify the Framework
-                        if key in tfm:
-                            framework_entry = info["data"][key]
-                             # Prevent repeated frameworks
-                            if framework_entry not in frameworks_found:
-                                frameworks_found.add(framework_entry)
-                                # '/' -> Case where framworks share tfm
-                                frameworks = framework_entry.split('/') if '/' in framework_entry else [framework_entry]
-                                for framework in frameworks:
-                                    entry = {"name": framework, 'type': "Framework"}
-                                    # If an associated languages list was passed as an argument
-                                    if associated_languages:
-                                        entry["associated_languages"] = associated_languages
-                                    results.append(entry)
-                            break
+                    # Find the associated framework (the first known tfm that is part of it)
+                    framework_entry = tfm_lookup.match(tfm)
+                    # Prevent repeated frameworks
+                    if framework_entry is not None and framework_entry not in frameworks_found:
+                        frameworks_found.add(framework_entry)
+                        # '/' -> Case where framworks share tfm
+                        frameworks = framework_entry.split('/') if '/' in framework_entry else [framework_entry]
+                        for framework in frameworks:
+                            entry = {"name": framework, 'type': "Framework"}
+                            # If an associated languages list was passed as an argument
+                            if associated_languages:
+                                entry["associated_languages"] = associated_languages
+                            results.append(entry)
                 
                 return results
 
@@ -309,16 +306,33 @@ def js_packageJson(package_content):
 
     return dependencies
 
+# Lines of a yarn.lock that aren't indented (entry keys, comments and Yarn 2+ metadata), found in one scan of the text
+yarn_lock_top_level_line = re.compile(r'^\S.*', re.M)
+# Specifier in an entry key, quoted or not
+yarn_lock_key_part = re.compile(r'"([^"\n]*)"|([^\s,"][^\s,]*)')
+
+# Keys of the entries of a yarn.lock, in order, without parsing the entries themselves
+# Each key is its ', ' separated specifiers (e.g. 'lodash@^4.17.0, lodash@^4.17.21'), as pyarn gives them
+# Works for classic (v1) lockfiles and Yarn 2+ ones (YAML, with a '__metadata' block and keys such as 'lodash@npm:^4.17.21')
+def yarn_lock_keys(yarn_content):
+    for match in yarn_lock_top_level_line.finditer(yarn_content):
+        line = match.group(0).rstrip()
+        if line.startswith('#') or not line.endswith(':'):
+            continue
+        key = ", ".join(quoted or plain for quoted, plain in yarn_lock_key_part.findall(line[:-1]))
+        if key != "__metadata":
+            yield key
+
 # Parses a "yarn.lock" file for dependencies
 def js_yarnLock(yarn_content):
-    yarn_dict = pyarn.lockfile.Lockfile.from_str(yarn_content)
-    #print(yarn_dict.data.keys())
-
     package_regex = r"([a-zA-Z0-9_\-\.\/@]+)@.+"
     dependencies = []
     names = set()
-    # Go through each package info to fetch name
-    for package in yarn_dict.data.keys():
+    # Go through each package entry to fetch name
+    for package in yarn_lock_keys(yarn_content):
+        # Yarn 2+ lists the repo's own workspaces too, they aren't dependencies
+        if "@workspace:" in package.split(",")[0]:
+            continue
         match = re.match(package_regex, package.strip())
         # Prevent repeated entries for packages with multiple version declarations
         if match:
@@ -327,13 +341,117 @@ def js_yarnLock(yarn_content):
                 dependencies.append(type_identifier(match.group(1),associated_languages=['JavaScript']))
                 names.add(match.group(1))
         else:
-            print("yarn.lock - Not a package match: " + package)
-            input("Press enter to continue")
+            print("yarn.lock - Not a package match, skipping it: " + package)
     
     #pprint(dependencies)
 
     return dependencies
 
+# Lines of a lockfile, found one at a time (without splitting the whole file)
+lockfile_line = re.compile(r'[^\r\n]+')
+
+# Tokens of a JSON document the key scanner needs: a key (with its value, if that is a string), any other string, and the
+# brackets of objects and arrays (numbers, booleans, null, commas and whitespace are skipped)
+json_token = re.compile(r'"((?:[^"\\]|\\.)*)"(\s*:\s*(?:"((?:[^"\\]|\\.)*)")?)?|([{}\[\]])')
+
+def json_string(raw):
+    return json.loads('"' + raw + '"') if '\\' in raw else raw
+
+# Scans a JSON document for its object keys, without building it, yielding (path, key, value) for each one in order
+# The path is the tuple of keys of the containers the key is in, from the document's root (None for the root and array
+# elements), and the value is the key's value if it is a string (None otherwise); only the path is kept while scanning
+def json_keys(json_content):
+    path = []
+    pending = None
+    for match in json_token.finditer(json_content):
+        raw, colon, value, bracket = match.groups()
+        if bracket is None:
+            if colon is not None:
+                key = json_string(raw)
+                yield tuple(path), key, json_string(value) if value is not None else None
+                # The key of the object or array that may follow
+                pending = key if value is None else None
+            else:
+                pending = None
+        elif bracket in "{[":
+            path.append(pending)
+            pending = None
+        else:
+            if path:
+                path.pop()
+            pending = None
+
+# Parses a "package-lock.json" file for the resolved packages (lockfile v2/v3 'packages' or v1 nested 'dependencies')
+def js_packageLock(lock_content):
+    packages = {}
+    links = set()
+    legacy_packages = {}
+
+    for path, key, value in json_keys(lock_content):
+        if path == (None, "packages"):
+            # 'node_modules/a/node_modules/@scope/b' -> '@scope/b' (paths without node_modules are the repo's own workspaces)
+            if "node_modules/" in key:
+                packages[key] = key[key.rindex("node_modules/") + len("node_modules/"):]
+        elif len(path) == 3 and path[:2] == (None, "packages") and key == "link":
+            # Links to the repo's own workspaces
+            links.add(path[2])
+        elif len(path) >= 2 and path[0] is None and len(path) % 2 == 0 and all(parent == "dependencies" for parent in path[1::2]):
+            legacy_packages.setdefault(key)
+
+    # Lockfile v2 lists the packages both ways, 'packages' being the complete one
+    if packages:
+        names = dict.fromkeys(name for package, name in packages.items() if package not in links)
+    else:
+        names = legacy_packages
+    return [type_identifier(name,associated_languages=['JavaScript']) for name in names]
+
+# Compares js_yarnLock with the pyarn based parser it replaced on a generated classic (v1) yarn.lock of 'entries' entries,
+# timing both and tracing the memory they allocate at most (for debug)
+def benchmark_yarn_lock(entries=40000, runs=3):
+    import time
+    import tracemalloc
+    import pyarn.lockfile
+
+    def pyarn_yarn_lock(yarn_content):
+        names = {}
+        for package in pyarn.lockfile.Lockfile.from_str(yarn_content).data.keys():
+            match = re.match(r"([a-zA-Z0-9_\-\.\/@]+)@.+", package.strip())
+            if match:
+                names.setdefault(match.group(1))
+        return [type_identifier(name,associated_languages=['JavaScript']) for name in names]
+
+    blocks = ["# THIS IS AN AUTOGENERATED FILE. DO NOT EDIT THIS FILE DIRECTLY.\n# yarn lockfile v1\n"]
+    for index in range(entries):
+        name = f"@scope{index % 50}/package-{index // 2}" if index % 3 == 0 else f"package-{index // 2}"
+        blocks.append(
+            f'\n"{name}@^1.{index % 7}.0", "{name}@^1.{index % 7}.2":\n'
+            f'  version "1.{index % 7}.{index % 11}"\n'
+            f'  resolved "https://registry.yarnpkg.com/{name}/-/{name.split("/")[-1]}-1.{index % 7}.{index % 11}.tgz#{index:040x}"\n'
+            f'  integrity sha512-{index:064x}==\n'
+            f'  dependencies:\n    package-{index // 3} "^2.0.0"\n    "@scope1/package-{index // 5}" "~3.1.0"\n'
+        )
+    yarn_content = "".join(blocks)
+    print(f"{entries} entries, {len(yarn_content) / 1024 / 1024:.1f} MB")
+
+    results = {}
+    for label, parser in (("pyarn", pyarn_yarn_lock), ("scanner", js_yarnLock)):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            dependencies = parser(yarn_content)
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        parser(yarn_content)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        results[label] = {"runs": timings, "peak_memory": peak, "dependencies": dependencies}
+        print(f"{label}: " + ", ".join(f"{timing:.3f}s" for timing in timings) + f" | peak memory: {peak / 1024 / 1024:.1f} MB")
+
+    print(f"same output: {results['pyarn']['dependencies'] == results['scanner']['dependencies']}")
+    return results
+
 # Auxiliary function used to strip namespaces from XML files
 def strip_namespace(xml_content):
     # Remove xmlns definitions
@@ -370,15 +488,105 @@ def java_pomXML(xml_content):
 #def kotlin_buildGradle():
 #    return
 
+# Groups every parsed Gemfile starts with (in this order), even if they end up empty
+gem_default_groups = ["development", "runtime", "dependency", "test", "production", "metrics"]
+
+# What a column of a gem declaration is, by the first alternative that matches its start: an option (source, git, platform,
+# path, branch, require or group), the gem's quoted name or a version requirement
+gem_column = re.compile(
+    r"source:[ ]?(?P<source>[a-zA-Z:\/\.-]+)"
+    r"|git:[ ]?(?P<git>[a-zA-Z:\/\.-]+)"
+    r"|platforms?:[ ]?(?P<platform>[a-zA-Z:\/\.-]+)"
+    r"|path:[ ]?(?P<path>[a-zA-Z:\/\.-]+)"
+    r"|branch:[ ]?(?P<branch>[a-zA-Z:\/\.-]+)"
+    r"|require:[ ]?(?P<autorequire>[a-zA-Z:\/\.-]+)"
+    r"|groups?:[ ]?(?P<group>[a-zA-Z:\/\.-]+)"
+    r"|(?P<name>['\"][a-zA-Z]+[\.0-9a-zA-Z _-]*['\"])"
+    r"|(?P<requirement>(?:[>|<|=|~>|\d]+[ ]*[0-9\.\w]+[ ,]*)+)"
+)
+# Ruby syntax removed from a column before it is matched (e.g. "%q<rails>.freeze" or "['>= 1.0']")
+gem_column_noise = re.compile(r"%q<|[()\[\]]")
+# Columns are separated by commas, a column that starts with '"' runs until its closing quote ('""' being a quote inside it)
+gem_quoted_column = re.compile(r'((?:[^"]|"")*)"?([^,]*)')
+gem_plain_column = re.compile(r'[^,]*')
+
+gem_group_block = re.compile(r"group[ ]?:[ ]?(?P<groupblock>.*?) do")
+# Dependencies declared in a gemspec, by group (a line is checked against each of them in this order)
+gemspec_dependencies = [
+    ("development", re.compile(r".*add_development_dependency(?P<line>.*)")),
+    ("runtime", re.compile(r".*add_runtime_dependency(?P<line>.*)")),
+    ("dependency", re.compile(r".*add_dependency(?P<line>.*)")),
+]
+
+# Splits a gem declaration into its comma separated columns
+def gem_columns(line):
+    columns = []
+    position = 0
+    while position < len(line) or not columns:
+        if line.startswith('"', position):
+            # The opening quote is skipped
+            match = gem_quoted_column.match(line, position + 1)
+            columns.append(match.group(1).replace('""', '"') + match.group(2))
+        else:
+            match = gem_plain_column.match(line, position)
+            columns.append(match.group(0))
+        position = match.end()
+        if position < len(line):
+            # Skip the comma, a line that ends with one has an empty last column
+            position += 1
+            if position == len(line):
+                columns.append("")
+    return columns
+
+# Adds the gem declared in a line (what follows 'gem' or 'add_dependency') to its group
+# Its group is the one of the block it is in, unless the line sets one (e.g. 'group: :test')
+def add_gem(gems, line, group):
+    if line == "":
+        return
+    gem = {"name": "", "requirement": [], "autorequire": "", "source": "", "group": group}
+    for column in gem_columns(line):
+        column = gem_column_noise.sub("", column).replace(".freeze", "").strip()
+        match = gem_column.match(column)
+        if match:
+            if match.lastgroup == "requirement":
+                gem["requirement"].append(match.group("requirement"))
+            else:
+                gem[match.lastgroup] = match.group(match.lastgroup).replace("'", "").replace('"', "")
+    gems.setdefault(gem["group"], []).append(gem)
+
+# Parses the text of a Gemfile (or of a .gemspec/.podspec) into {group: [gem, ...]}, one line at a time
+# Comments are cut from the first '#'; a 'gemspec' line is skipped, since only the Gemfile itself is available
+def parse_gemfile(gemfile_content, gemspec=False):
+    gems = {group: [] for group in gem_default_groups}
+    group = "runtime"
+
+    for line in re.split(r'\r\n|\r|\n', gemfile_content):
+        if "#" in line:
+            line = line[:line.index("#")]
+        line = line.strip()
+
+        if gemspec:
+            for group, dependency_regex in gemspec_dependencies:
+                match = dependency_regex.match(line)
+                if match:
+                    add_gem(gems, match.group("line"), group)
+                    break
+        elif line == "" or line.startswith("source"):
+            continue
+        elif line.startswith("group"):
+            match = gem_group_block.match(line)
+            if match:
+                group = match.group("groupblock")
+        elif line.startswith("end"):
+            group = "runtime"
+        elif line.startswith("gem "):
+            add_gem(gems, line[3:], group)
+
+    return gems
+
 # Parses a "Gemfile" file for dependencies
 def ruby_gemfile(gemfile_content):
-    # Gemfile parsing library only reads from file, use tempfile to create a temporary file with the content fetched
-    with tempfile.NamedTemporaryFile('w+', delete=False) as tmp:
-        tmp.write(gemfile_content)
-        tmp.flush()
-        # Iniciate parser
-        parser = GemfileParser(tmp.name)
-        deps = parser.parse()
+    deps = parse_gemfile(gemfile_content)
 
     dependencies = {}
 
@@ -387,8 +595,8 @@ def ruby_gemfile(gemfile_content):
         #print(group)
         dependencies[group] = []
         for gem in gems:
-            #print(f"  {gem.name} {gem.requirement} {gem.autorequire}")
-            dependencies[group].append(type_identifier(gem.name,associated_languages=['Ruby']))
+            #print(f"  {gem['name']} {gem['requirement']} {gem['autorequire']}")
+            dependencies[group].append(type_identifier(gem["name"],associated_languages=['Ruby']))
         
         # Eliminate empty groups from the parsed file
         if dependencies[group] == []:
@@ -398,6 +606,30 @@ def ruby_gemfile(gemfile_content):
 
     return dependencies
 
+# Parses a "Gemfile.lock" file for the resolved gems (the 'specs' of its GEM and GIT sections)
+# The gems of PATH sections are the repo's own (e.g. the gem its gemspec builds) and are left out
+def ruby_gemfileLock(lock_content):
+    gem_regex = re.compile(r'^    ([^\s(]+)')
+    gems = {}
+    section = None
+    in_specs = False
+
+    for match in lockfile_line.finditer(lock_content):
+        line = match.group(0)
+        if not line[0].isspace():
+            # Section header, e.g. 'GEM', 'GIT', 'PATH', 'PLATFORMS' or 'DEPENDENCIES'
+            section = line.strip()
+            in_specs = False
+        elif line.strip() == "specs:":
+            in_specs = section in ("GEM", "GIT")
+        elif in_specs:
+            # Gems are indented by 4 spaces, the gems they depend on by 6
+            gem = gem_regex.match(line)
+            if gem:
+                gems.setdefault(gem.group(1))
+
+    return [type_identifier(name,associated_languages=['Ruby']) for name in gems]
+
 # Parses a "composer.json" file for dependencies
 def php_composerJson(composer_content):
     json_dict = json.loads(composer_content)
@@ -417,38 +649,96 @@ def php_composerJson(composer_content):
 
     return dependencies
 
+# Parses a "composer.lock" file for the resolved packages (of 'packages' and 'packages-dev')
+def php_composerLock(lock_content):
+    packages = {}
+    for path, key, value in json_keys(lock_content):
+        if key == "name" and value is not None and path in ((None, "packages", None), (None, "packages-dev", None)):
+            packages.setdefault(value)
+
+    return [type_identifier(name,associated_languages=['PHP']) for name in packages]
+
+# Tokens of a go.mod line: quoted strings, the trailing '//' comment, block parentheses and '=>', and plain words
+go_mod_token = re.compile(r'"((?:[^"\\]|\\.)*)"|`([^`]*)`|(//.*)|(=>|[()])|([^\s"`()]+)')
+
+# Splits a go.mod line into its tokens (with quoted strings unquoted) and its comment (None if it has none)
+def go_mod_tokens(line):
+    tokens = []
+    comment = None
+    for match in go_mod_token.finditer(line):
+        quoted, raw, line_comment, symbol, word = match.groups()
+        if line_comment is not None:
+            comment = line_comment
+            break
+        if quoted is not None:
+            tokens.append(json.loads('"' + quoted + '"'))
+        else:
+            tokens.append(raw if raw is not None else symbol or word)
+    return tokens, comment
+
+# A module path and, if it has one, its version (as in the output of 'go mod edit -json')
+def go_mod_version(args):
+    module = {"Path": args[0]}
+    if len(args) > 1:
+        module["Version"] = args[1]
+    return module
+
+# Adds a go.mod directive (e.g. a 'require' line, on its own or inside a block) to the parsed data
+# Parentheses only open and close blocks, on lines of their own: the Go toolchain rejects a directive that has one anywhere
+# else (e.g. 'require (a.b/c v1.0.0)'), so it is skipped
+def go_mod_directive(mod_data, verb, args, comment):
+    if not args or "(" in args or ")" in args:
+        return
+    if verb == "module":
+        mod_data["Module"] = {"Path": args[0]}
+    elif verb == "go":
+        mod_data["Go"] = args[0]
+    elif verb == "require" and len(args) >= 2:
+        require = go_mod_version(args)
+        # Same check as the Go toolchain: a '// indirect' comment, optionally followed by '; <more comments>'
+        note = (comment or "")[2:].strip()
+        if note == "indirect" or note.startswith("indirect;"):
+            require["Indirect"] = True
+        mod_data.setdefault("Require", []).append(require)
+    elif verb == "exclude" and len(args) >= 2:
+        mod_data.setdefault("Exclude", []).append(go_mod_version(args))
+    elif verb == "replace" and "=>" in args:
+        arrow = args.index("=>")
+        if arrow > 0 and len(args) > arrow + 1:
+            mod_data.setdefault("Replace", []).append({"Old": go_mod_version(args[:arrow]), "New": go_mod_version(args[arrow + 1:])})
+
+# Parses a "go.mod" file into the same structure 'go mod edit -json' outputs (Module, Go, Require, Exclude and Replace)
+# Directives can be on their own line or grouped in a block ('require ( ... )'); the other ones (e.g. 'retract') are skipped
+def parse_go_mod(go_mod_content):
+    mod_data = {}
+    block = None
+
+    for line in go_mod_content.splitlines():
+        tokens, comment = go_mod_tokens(line)
+        if not tokens:
+            continue
+        if block is not None:
+            if tokens[0] == ")":
+                block = None
+            else:
+                go_mod_directive(mod_data, block, tokens, comment)
+        elif tokens[1:] == ["("]:
+            block = tokens[0]
+        else:
+            go_mod_directive(mod_data, tokens[0], tokens[1:], comment)
+
+    return mod_data
+
 # Parses a "go.mod" file for dependencies
 def go_goMod(go_mod_content):
-   # Create a temporary directory to act as the module root
-    with tempfile.TemporaryDirectory() as tempdir:
-        go_mod_path = os.path.join(tempdir, "go.mod")
-        # Write go.mod content to the temp directory
-        with open(go_mod_path, "w") as f:
-            f.write(go_mod_content)
-            f.flush()
-        try:
-            # Run 'go mod edit -json' with cwd set to the temp directory
-            result = subprocess.run(
-                ["go", "mod", "edit", "-json"],
-                cwd=tempdir,
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            # Load json data originated from the output of the command
-            mod_data = json.loads(result.stdout)
-            #print(json.dumps(mod_data, indent=2))
-        except subprocess.CalledProcessError as e:
-            print("Return code:", e.returncode)
-            print("Output:", e.output)
-            print("Stderr:", e.stderr)
-    
+    mod_data = parse_go_mod(go_mod_content)
+
     # Catches the dependency name excluding the version identifier part that some have
     require_regex = r'^(.*?)(?:\/v\d+(\.\d+)*)?$'
     dependencies = {'necessary':[]}
 
     # All dependencies listed with 'require'
-    for dependency in mod_data['Require']:
+    for dependency in mod_data.get('Require', []):
         # Get name
         match = re.match(require_regex,dependency["Path"])
         if match:
@@ -461,8 +751,7 @@ def go_goMod(go_mod_content):
             else:
                 dependencies['necessary'].append(type_identifier(name,associated_languages=['Go']))
         else:
-            print("go.mod - Not a match: " + dependency["Path"])
-            input("Press enter to continue")
+            print("go.mod - Not a match, skipping it: " + dependency["Path"])
     
     #pprint(dependencies)
     #print('Necessary: ' + str(len(dependencies['necessary'])) + "    Indirect: " + str(len(dependencies['indirect'])))
@@ -544,6 +833,34 @@ def rust_cargoToml(toml_content,recursive):
 
     return dependencies
 
+# Parses a "Cargo.lock" file for the resolved crates, one line at a time
+# Crates without a 'source' are the repo's own (workspace members and path dependencies) and are left out
+def rust_cargoLock(lock_content):
+    name_regex = re.compile(r'name\s*=\s*"([^"]+)"')
+    crates = {}
+    in_package = False
+    name = None
+    source = False
+
+    for match in lockfile_line.finditer(lock_content):
+        line = match.group(0).strip()
+        if line.startswith("["):
+            # A [[package]] table ends where the next table starts
+            if name is not None and source:
+                crates.setdefault(name)
+            in_package = line == "[[package]]"
+            name, source = None, False
+        elif in_package and line.startswith("name"):
+            crate = name_regex.match(line)
+            if crate:
+                name = crate.group(1)
+        elif in_package and line.startswith("source"):
+            source = True
+    if name is not None and source:
+        crates.setdefault(name)
+
+    return [type_identifier(name,associated_languages=['Rust']) for name in crates]
+
 # Parses a ".cproj",".vbproj" or ".fsproj" file (.Net) for dependencies
 def dotNet_proj(xml_content,framework_tfm,languages):
     tfms = set()
@@ -0,0 +1,635 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import re
+import tarfile
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+# Local stand-in for the parts of the GitHub REST and GraphQL APIs used by the scraper, serving fixture repos from disk
+# Meant for benchmarks and tests that must not depend on the network, a real token or GitHub's rate limits
+
+# Directory of the fixture repos bundled with the app ('<owner>/<repo>.json')
+default_fixtures_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Blob text returned by GraphQL is cut (isTruncated) after this many bytes
+# Smaller than GitHub's own limit, so fixtures of a reasonable size still go through the truncated blob path
+default_blob_text_limit = 100 * 1024
+# The recursive tree endpoint answers with 'truncated' for trees with more entries than this
+default_tree_entry_limit = 100000
+# Points of each rate limit resource ('core', 'graphql') given to each token per window
+default_rate_limit = 5000
+rate_limit_window = 3600
+
+# Same as scraper.git_blob_sha (not imported, so the server can run without the scraper's dependencies)
+def git_blob_sha(content):
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+# Fake but stable SHA for objects the fixtures don't record (trees, commits)
+def fake_sha(*parts):
+    return hashlib.sha1("\0".join(parts).encode('utf-8')).hexdigest()
+
+# A fixture repo: the REST repo data, languages, submodules and files (with their contents) of a repo at a single commit
+# Fixtures recorded from real repos may list files whose contents weren't recorded (in 'tree'); those are served without content
+class FixtureRepo(object):
+
+    def __init__(self, data):
+        self.repo = data["repo"]
+        self.owner = self.repo["owner"]["login"]
+        self.name = self.repo["name"]
+        self.default_branch = self.repo.get("default_branch") or "main"
+        self.languages = data.get("languages", {})
+        self.submodules = data.get("submodules", [])
+        self.files = {path: text.encode('utf-8') for path, text in data.get("files", {}).items()}
+        self.head_sha = data.get("head_sha") or fake_sha(self.owner, self.name, *sorted(self.files))
+
+        # path -> {"path", "mode", "type", "sha", "size"}, for every blob, tree and submodule
+        self.entries = {}
+        for path, content in self.files.items():
+            self.entries[path] = {"path": path, "mode": "100644", "type": "blob", "sha": git_blob_sha(content), "size": len(content)}
+        for entry in data.get("tree", []):
+            if entry["path"] not in self.entries and entry["type"] == "blob":
+                self.entries[entry["path"]] = {
+                    "path": entry["path"], "mode": "100644", "type": "blob",
+                    "sha": entry.get("sha") or fake_sha(self.head_sha, entry["path"]), "size": entry.get("size", 0),
+                }
+        for submodule in self.submodules:
+            self.entries[submodule["path"]] = {
+                "path": submodule["path"], "mode": "160000", "type": "commit",
+                "sha": submodule.get("sha") or fake_sha(submodule["path"]),
+            }
+
+        # Directories of every entry
+        for path in list(self.entries):
+            directory = path.rpartition('/')[0]
+            while directory and directory not in self.entries:
+                self.entries[directory] = {"path": directory, "mode": "040000", "type": "tree", "sha": None}
+                directory = directory.rpartition('/')[0]
+
+        # Same order as the recursive tree API (each tree followed by its contents)
+        self.ordered_paths = sorted(self.entries, key=lambda path: path.split('/'))
+
+        # path of each tree ('' for the root) -> paths of its direct children
+        self.children = {'': []}
+        for path in self.ordered_paths:
+            self.children.setdefault(path.rpartition('/')[0], []).append(path)
+            if self.entries[path]["type"] == "tree":
+                self.children.setdefault(path, [])
+
+        # Tree SHAs depend on their contents, like in git
+        self.tree_paths = {}
+        for path in sorted(self.children, key=lambda path: -path.count('/') if path else 1):
+            listing = [f"{self.entries[child]['mode']} {child} {self.entries[child]['sha']}" for child in self.children[path]]
+            sha = fake_sha("tree", path, *listing)
+            if path:
+                self.entries[path]["sha"] = sha
+            else:
+                self.root_sha = sha
+            self.tree_paths[sha] = path
+
+    # Path of the tree a ref points to ('' for the root), None if the ref is unknown
+    def resolve_tree(self, ref):
+        if ref in ("HEAD", self.default_branch, self.head_sha):
+            return ''
+        return self.tree_paths.get(ref)
+
+    # Entries of a tree, all of the entries under it if recursive, with their paths relative to it
+    def tree_entries(self, tree_path, recursive):
+        if recursive:
+            prefix = tree_path + '/' if tree_path else ''
+            paths = [path for path in self.ordered_paths if path.startswith(prefix)]
+        else:
+            paths = self.children[tree_path]
+        start = len(tree_path) + 1 if tree_path else 0
+        return [dict(self.entries[path], path=path[start:]) for path in paths]
+
+    # Content of the file at a path, None if there's no such file (or its content wasn't recorded)
+    def content(self, path):
+        return self.files.get(path)
+
+# Loads every fixture repo in a directory, as {'owner/repo': FixtureRepo} (names are case insensitive, like GitHub's)
+def load_fixtures(fixtures_dir=default_fixtures_dir):
+    fixtures = {}
+    for owner in sorted(os.listdir(fixtures_dir)):
+        owner_dir = os.path.join(fixtures_dir, owner)
+        if not os.path.isdir(owner_dir):
+            continue
+        for filename in sorted(os.listdir(owner_dir)):
+            if filename.endswith('.json'):
+                with open(os.path.join(owner_dir, filename), encoding='utf-8') as f:
+                    fixture = FixtureRepo(json.load(f))
+                fixtures[f"{fixture.owner}/{fixture.name}".lower()] = fixture
+    return fixtures
+
+# Rate limit budget of each token, with the same headers as GitHub
+class FakeRateLimits(object):
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.used = {}  # (token, resource) -> (points used, reset epoch)
+
+    # Uses the points of a request, returns its rate limit headers and whether the budget allowed it
+    def use(self, token, resource, cost=1):
+        now = int(time.time())
+        with self.lock:
+            used, reset = self.used.get((token, resource), (0, now + rate_limit_window))
+            if now >= reset:
+                used, reset = 0, now + rate_limit_window
+            allowed = used + cost <= self.limit
+            if allowed:
+                used += cost
+            self.used[(token, resource)] = (used, reset)
+
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.limit - used),
+            "X-RateLimit-Used": str(used),
+            "X-RateLimit-Reset": str(reset),
+            "X-RateLimit-Resource": resource,
+        }
+        return headers, allowed
+
+# Answers the requests made to the fake API
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which on a kept-alive connection would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def token(self):
+        authorization = self.headers.get("Authorization", "")
+        return authorization.partition(' ')[2] or "anonymous"
+
+    def send_body(self, status, body, content_type="application/json; charset=utf-8", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        # Conditional requests that match are answered with an empty 304
+        if status == 200 and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status in (200, 304):
+            self.send_header("ETag", etag)
+        if body:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self, status, message, headers=None):
+        self.send_body(status, {"message": message, "documentation_url": "https://docs.github.com/rest"}, headers=headers)
+
+    # Checks the token and the rate limit of a request, returns its rate limit headers (None if it was already answered)
+    def admit(self, resource):
+        self.fake.count_request(resource)
+        if self.fake.latency:
+            time.sleep(self.fake.latency)
+
+        if self.fake.tokens is not None and self.token() not in self.fake.tokens:
+            self.send_error_body(401, "Bad credentials")
+            return None
+
+        headers, allowed = self.fake.rate_limits.use(self.token(), resource)
+        if not allowed:
+            self.send_error_body(403, "API rate limit exceeded for user.", headers)
+            return None
+        return headers
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+
+        headers = self.admit("core")
+        if headers is None:
+            return
+
+        if len(parts) < 3 or parts[0] != "repos":
+            return self.send_error_body(404, "Not Found", headers)
+        fixture = self.fake.fixtures.get(f"{parts[1]}/{parts[2]}".lower())
+        if fixture is None:
+            return self.send_error_body(404, "Not Found", headers)
+
+        endpoint = parts[3:]
+        accept = self.headers.get("Accept", "")
+
+        if not endpoint:
+            return self.send_body(200, fixture.repo, headers=headers)
+
+        if endpoint[0] == "commits" and len(endpoint) == 2:
+            if fixture.resolve_tree(endpoint[1]) != '':
+                return self.send_error_body(422, f"No commit found for SHA: {endpoint[1]}", headers)
+            if "application/vnd.github.sha" in accept:
+                return self.send_body(200, fixture.head_sha, "application/vnd.github.sha", headers)
+            return self.send_body(200, {"sha": fixture.head_sha, "commit": {"tree": {"sha": fixture.root_sha}}}, headers=headers)
+
+        if endpoint == ["languages"]:
+            return self.send_body(200, fixture.languages, headers=headers)
+
+        if endpoint == ["readme"]:
+            for path in self.fake.readme_names:
+                content = fixture.content(path)
+                if content is not None:
+                    return self.send_body(200, self.content_item(fixture, path, content), headers=headers)
+            return self.send_error_body(404, "Not Found", headers)
+
+        if endpoint[:2] == ["git", "trees"] and len(endpoint) == 3:
+            tree_path = fixture.resolve_tree(endpoint[2])
+            if tree_path is None:
+                return self.send_error_body(404, "Not Found", headers)
+            return self.send_body(200, self.tree_body(fixture, tree_path, query.get("recursive") is not None), headers=headers)
+
+        if endpoint[0] == "contents" and len(endpoint) > 1:
+            path = "/".join(endpoint[1:])
+            ref = query.get("ref", ["HEAD"])[0]
+            content = fixture.content(path)
+            if fixture.resolve_tree(ref) != '' or content is None:
+                return self.send_error_body(404, "Not Found", headers)
+            if "application/vnd.github.v3.raw" in accept or "application/vnd.github.raw" in accept:
+                return self.send_body(200, content, "application/vnd.github.raw", headers)
+            return self.send_body(200, self.content_item(fixture, path, content), headers=headers)
+
+        if endpoint[0] == "tarball" and len(endpoint) == 2:
+            if fixture.resolve_tree(endpoint[1]) != '':
+                return self.send_error_body(404, "Not Found", headers)
+            return self.send_body(200, self.tarball(fixture), "application/x-gzip", headers)
+
+        return self.send_error_body(404, "Not Found", headers)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        headers = self.admit("graphql")
+        if headers is None:
+            return
+        if urlsplit(self.path).path.rstrip('/') not in ("/graphql", "/api/graphql"):
+            return self.send_error_body(404, "Not Found", headers)
+
+        try:
+            request = json.loads(body)
+            query = request["query"]
+            variables = request.get("variables") or {}
+        except (ValueError, KeyError, TypeError):
+            return self.send_error_body(400, "Problems parsing JSON", headers)
+
+        fixture = self.fake.fixtures.get(f"{variables.get('owner')}/{variables.get('repo')}".lower())
+        if fixture is None:
+            return self.send_body(200, {
+                "data": {"repository": None},
+                "errors": [{"type": "NOT_FOUND", "path": ["repository"], "message": "Could not resolve to a Repository."}],
+            }, headers=headers)
+
+        return self.send_body(200, {"data": {"repository": self.graphql_repository(fixture, query)}}, headers=headers)
+
+    # Same JSON the contents API gives for a file (the content is left empty for files over 1 MB, like on GitHub)
+    def content_item(self, fixture, path, content):
+        entry = fixture.entries[path]
+        return {
+            "type": "file",
+            "encoding": "base64",
+            "size": len(content),
+            "name": path.rpartition('/')[2],
+            "path": path,
+            "sha": entry["sha"],
+            "content": base64.encodebytes(content).decode('ascii') if len(content) <= 1024 * 1024 else "",
+        }
+
+    def tree_body(self, fixture, tree_path, recursive):
+        base_url = self.base_url()
+        url_prefix = f"{base_url}/repos/{fixture.owner}/{fixture.name}/git/"
+        entries = fixture.tree_entries(tree_path, recursive)
+
+        truncated = recursive and len(entries) > self.fake.tree_entry_limit
+        if truncated:
+            entries = entries[:self.fake.tree_entry_limit]
+
+        tree = []
+        for entry in entries:
+            item = dict(entry)
+            if entry["type"] == "tree":
+                item["url"] = url_prefix + "trees/" + entry["sha"]
+            elif entry["type"] == "blob":
+                item["url"] = url_prefix + "blobs/" + entry["sha"]
+            tree.append(item)
+
+        sha = fixture.root_sha if tree_path == '' else fixture.entries[tree_path]["sha"]
+        return {"sha": sha, "url": url_prefix + "trees/" + sha, "tree": tree, "truncated": truncated}
+
+    def tarball(self, fixture):
+        prefix = f"{fixture.owner}-{fixture.name}-{fixture.head_sha[:7]}/"
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+            root = tarfile.TarInfo(prefix)
+            root.type = tarfile.DIRTYPE
+            tar.addfile(root)
+            for path in fixture.ordered_paths:
+                entry = fixture.entries[path]
+                info = tarfile.TarInfo(prefix + path)
+                if entry["type"] == "blob":
+                    content = fixture.content(path) or b""
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+                else:
+                    # Submodules are empty directories in GitHub's tarballs
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+        return buffer.getvalue()
+
+    # Blob fields of a GraphQL object(expression: "<ref>:<path>"), None if there is no such file
+    def graphql_blob(self, fixture, expression):
+        ref, _, path = expression.partition(':')
+        if fixture.resolve_tree(ref) != '':
+            return None
+        content = fixture.content(path)
+        if content is None:
+            return None
+        limit = self.fake.blob_text_limit
+        return {
+            "text": content[:limit].decode('utf-8', errors='ignore'),
+            "isTruncated": len(content) > limit,
+            "byteSize": len(content),
+        }
+
+    def graphql_tree_entries(self, fixture, tree_path, depth):
+        entries = []
+        for path in fixture.children[tree_path]:
+            entry = fixture.entries[path]
+            item = {"path": path, "type": entry["type"], "oid": entry["sha"], "object": {}}
+            if entry["type"] == "blob":
+                item["object"] = {"byteSize": entry["size"]}
+            elif entry["type"] == "tree" and depth > 1:
+                item["object"] = {"entries": self.graphql_tree_entries(fixture, path, depth - 1)}
+            entries.append(item)
+        return entries
+
+    # Answers the queries the scraper makes (overview, submodules and object(expression: ...) batches)
+    # This is not a GraphQL implementation: the shape of each query is recognized from its text
+    def graphql_repository(self, fixture, query):
+        repository = {}
+
+        # Aliased blobs (dependency files, README candidates)
+        for alias, expression in re.findall(r'(\w+)\s*:\s*object\(expression:\s*"([^"]*)"\)', query):
+            repository[alias] = self.graphql_blob(fixture, expression)
+
+        submodules = {"nodes": [{"name": submodule["name"]} for submodule in fixture.submodules]}
+        if re.search(r'(?<!:)\s+object\(expression:\s*("HEAD"|\$expression)\)', query) and "submodules" in query:
+            repository["object"] = {"submodules": submodules}
+
+        if "FetchRepoOverview" in query:
+            repo = fixture.repo
+            license_info = repo.get("license")
+            repository.update({
+                "databaseId": repo.get("id"),
+                "name": repo["name"],
+                "nameWithOwner": repo.get("full_name", f"{fixture.owner}/{fixture.name}"),
+                "owner": {"login": fixture.owner},
+                "description": repo.get("description"),
+                "url": repo.get("html_url"),
+                "homepageUrl": repo.get("homepage"),
+                "isPrivate": repo.get("private", False),
+                "isFork": repo.get("fork", False),
+                "isArchived": repo.get("archived", False),
+                "createdAt": repo.get("created_at"),
+                "updatedAt": repo.get("updated_at"),
+                "pushedAt": repo.get("pushed_at"),
+                "diskUsage": repo.get("size"),
+                "stargazerCount": repo.get("stargazers_count", 0),
+                "forkCount": repo.get("forks_count", 0),
+                "primaryLanguage": {"name": repo["language"]} if repo.get("language") else None,
+                "licenseInfo": {"key": license_info.get("key"), "name": license_info.get("name"), "spdxId": license_info.get("spdx_id")} if license_info else None,
+                "languages": {"edges": [{"size": size, "node": {"name": name}} for name, size in fixture.languages.items()]},
+                "defaultBranchRef": {
+                    "name": fixture.default_branch,
+                    "target": {
+                        "oid": fixture.head_sha,
+                        "submodules": submodules,
+                        # Each level of the tree is selected with its own 'entries { ... }'
+                        "tree": {"entries": self.graphql_tree_entries(fixture, '', query.count("entries {"))},
+                    },
+                },
+            })
+
+        return repository
+
+# The stand-in server, running in a background thread
+class FakeGitHub(object):
+
+    def __init__(self, fixtures_dir=default_fixtures_dir, host="127.0.0.1", port=0, latency=0.0, tokens=None,
+                 rate_limit=default_rate_limit, blob_text_limit=default_blob_text_limit, tree_entry_limit=default_tree_entry_limit):
+        self.fixtures = load_fixtures(fixtures_dir)
+        self.host = host
+        self.port = port
+        # Seconds added to every request, to stand in for the round trip to GitHub
+        self.latency = latency
+        # Accepted tokens (None: any token, or none at all)
+        self.tokens = set(tokens) if tokens is not None else None
+        self.rate_limits = FakeRateLimits(rate_limit)
+        self.blob_text_limit = blob_text_limit
+        self.tree_entry_limit = tree_entry_limit
+        # Same README names the scraper looks for, in order of preference
+        self.readme_names = ["README.md", "README", "README.rst", "README.txt", "readme.md", "Readme.md", "README.markdown"]
+        self.request_counts = {"core": 0, "graphql": 0}
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+    def count_request(self, resource):
+        with self.lock:
+            self.request_counts[resource] += 1
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}"
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), FakeGitHubHandler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+# Records a repo from the GitHub API as a fixture ('<fixtures_dir>/<owner>/<repo>.json')
+# Only the contents the scraper reads are recorded (README, .gitmodules and dependency files), the rest of the tree is listed
+def record_fixture(repo_url, token=None, fixtures_dir=default_fixtures_dir):
+    from . import scraper
+
+    repo_data = scraper.get_repo_data(repo_url, token)
+    if type(repo_data) != dict:
+        print(f"Error: Unable to record {repo_url} (Status code {repo_data})")
+        return None
+
+    default_branch = repo_data.get("default_branch")
+    file_path_data = scraper.get_repo_files(repo_url, default_branch, token)
+    if type(file_path_data) == str:
+        print(file_path_data)
+        return None
+
+    blob_paths = {file["path"] for file in file_path_data if file["type"] == "blob"}
+    wanted = [path for path in scraper.readme_candidates + ['.gitmodules'] if path in blob_paths]
+    targets = scraper.load_data_json()["dependency_file_targets"]
+    for paths in scraper.find_dependency_files(file_path_data, targets).values():
+        wanted.extend(paths)
+
+    files = {}
+    for path in wanted:
+        content = scraper.download_raw_file(repo_url, path, token, default_branch)
+        if content is not None:
+            files[path] = content
+
+    gitmodules = files.get('.gitmodules')
+    submodule_paths = {file["path"] for file in file_path_data if file["type"] == "commit"}
+    submodules = []
+    if gitmodules:
+        for name, path in re.findall(r'\[submodule "([^"]+)"\][^\[]*?path\s*=\s*(\S+)', gitmodules):
+            if path in submodule_paths:
+                submodules.append({"name": name, "path": path})
+
+    fixture = {
+        "repo": repo_data,
+        "head_sha": scraper.get_head_commit_sha(repo_url, token),
+        "languages": scraper.get_repo_languages(repo_url, token) or {},
+        "submodules": submodules,
+        "files": files,
+        "tree": [{"path": file["path"], "type": "blob", "sha": file.get("sha"), "size": file.get("size", 0)}
+                 for file in file_path_data if file["type"] == "blob" and file["path"] not in files],
+    }
+
+    path = os.path.join(fixtures_dir, repo_data["owner"]["login"], repo_data["name"] + '.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, indent=1)
+    return path
+
+# Times the whole scrap_data -> process_data -> generate_cic path against the fake API, for each scrape mode (for debug)
+# The HTTP cache and the blob store start empty for every mode, so the first run of each is cold and the next ones are warm
+def benchmark_pipeline(repo="gitcocktail-fixtures/polyglot-shop", modes=("sequential", "concurrent", "async", "graphql", "tarball"),
+                       runs=3, depth="deep", **server_options):
+    from . import scraper, http_cache, blob_store
+    from .data_processor import process_data
+    from .translator import generate_cic
+
+    repo_url = f"https://github.com/{repo}"
+    results = {}
+    with FakeGitHub(**server_options) as fake:
+        previous = scraper.configure_github_api(fake.base_url)
+        previous_cache, previous_store = http_cache.shared_cache, blob_store.shared_store
+        try:
+            for mode in modes:
+                http_cache.shared_cache = http_cache.HTTPCache(tempfile.mkdtemp(prefix='gitcocktail_bench_cache_'))
+                blob_store.shared_store = blob_store.BlobStore(tempfile.mkdtemp(prefix='gitcocktail_bench_store_'))
+                counts_before = dict(fake.request_counts)
+
+                timings = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    repo_data = scraper.scrap_data(repo_url, "benchmark-token", mode=mode, depth=depth)
+                    scraped = time.perf_counter()
+                    processed_data = process_data([repo_data])
+                    generate_cic(processed_data[0])
+                    timings.append({"scrape": scraped - start, "total": time.perf_counter() - start})
+
+                results[mode] = {
+                    "runs": timings,
+                    "requests": {resource: fake.request_counts[resource] - counts_before[resource] for resource in fake.request_counts},
+                }
+                print(f"{mode}: " + ", ".join(f"{timing['total']:.3f}s (scrape {timing['scrape']:.3f}s)" for timing in timings)
+                      + f" | requests: {results[mode]['requests']}")
+        finally:
+            scraper.configure_github_api(**previous)
+            http_cache.shared_cache, blob_store.shared_store = previous_cache, previous_store
+
+    return results
+
+# Compares the latency of the 'fast' and 'deep' analysis depths on the fake GitHub API (for debug)
+# Only the first run of each depth starts with empty caches (the later ones reuse the stored dependency files), so both
+# the cold (first run) and warm (best of the rest) latencies are compared
+def benchmark_analysis_depth(repo="gitcocktail-fixtures/polyglot-shop", modes=("concurrent",), runs=3, latency=0.05, **server_options):
+    results = {}
+    for depth in ("deep", "fast"):
+        print(f"--- {depth} ---")
+        results[depth] = benchmark_pipeline(repo, modes, runs, depth=depth, latency=latency, **server_options)
+
+    for mode in modes:
+        for label, pick in (("cold", lambda runs: runs[0]), ("warm", lambda runs: min(runs[1:] or runs, key=lambda run: run["total"]))):
+            deep = pick(results["deep"][mode]["runs"])["total"]
+            fast = pick(results["fast"][mode]["runs"])["total"]
+            print(f"{mode} ({label}): deep {deep:.3f}s, fast {fast:.3f}s ({deep / fast:.2f}x)")
+    return results
+
+# Compares a run of the pipeline sending every request on a new connection (scraper.RequestsTransport) with one on the
+# shared HTTP client's keep-alive connections (for debug), printing how many connections the client opened and reused
+def benchmark_http_client(repo="gitcocktail-fixtures/polyglot-shop", modes=("sequential", "concurrent", "tarball"), runs=3, **server_options):
+    from . import scraper
+    from .rate_limiter import scheduler
+    from .http_client import HTTPClient
+
+    # The scheduler's token bucket is lifted, otherwise the runs after the first ones would wait for it to refill
+    limits = (scheduler.rate, scheduler.burst)
+    results = {}
+    for label, client in (("requests", scraper.RequestsTransport()), ("pooled", HTTPClient())):
+        print(f"--- {label} ---")
+        previous = scraper.configure_github_api(http_transport=client)
+        scheduler.rate, scheduler.burst = 1e6, 1e6
+        scheduler.states.clear()
+        try:
+            results[label] = benchmark_pipeline(repo, modes, runs, **server_options)
+        finally:
+            scraper.configure_github_api(**previous)
+            scheduler.rate, scheduler.burst = limits
+            scheduler.states.clear()
+        if isinstance(client, HTTPClient):
+            stats = client.get_stats()
+            print(f"connections: {stats['connections']}, reused: {stats['reused_connections']} ({stats['reuse_ratio']:.0%}), retries: {stats['retries']}")
+            client.close()
+    return results
+
+# Serves the bundled fixtures until interrupted (for debug), e.g. with GITCOCKTAIL_GITHUB_API_URL pointed at it
+def run_fake_github(port=8765, **server_options):
+    with FakeGitHub(port=port, **server_options) as fake:
+        print(f"Fake GitHub API serving {', '.join(sorted(fake.fixtures))} at {fake.base_url}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+# ------------------------------- FOR TESTING ONLY -------------------------------
+#if __name__ == "__main__":
+#    benchmark_pipeline()
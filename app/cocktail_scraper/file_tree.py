@@ -0,0 +1,250 @@
+import codecs
+import json
+import re
+from array import array
+
+# Types of tree entries, stored as their index in this list
+entry_types = ["blob", "tree", "commit"]
+type_codes = {entry_type: code for code, entry_type in enumerate(entry_types)}
+
+# Stored in place of the SHA of entries that don't have one
+no_sha = bytes(20)
+
+# Compact, column-oriented representation of a repo's file tree
+# Each entry is a row of a few typed arrays: the name of the entry (an index into a list of interned path segments), the
+# entry of the directory it is in, its type and its size, plus its binary SHA. Full paths and API URLs are only rebuilt when
+# entries are read, so a tree with hundreds of thousands of files takes a few MB instead of a list of dicts.
+# Iterating over it gives the same dicts get_repo_files always returned ({"path", "type", "url", "sha", "size"}), in order.
+class FileTree(object):
+
+    def __init__(self, url_prefix=None):
+        # Prefix of the API URL of blobs and trees (e.g. 'https://api.github.com/repos/{owner}/{repo}/git/')
+        self.url_prefix = url_prefix
+        self.segments = []
+        self.segment_ids = {}
+        self.names = array('i')
+        self.parents = array('i')  # -1: at the root
+        self.types = array('b')
+        self.sizes = array('q')  # -1: unknown
+        self.shas = bytearray()
+        # Entries whose URL isn't the one built from url_prefix (index -> URL, or None for entries that have no URL)
+        self.other_urls = {}
+        # Path of each directory -> its entry, only needed while entries are being added
+        self.directories = {}
+
+    def __len__(self):
+        return len(self.types)
+
+    def __bool__(self):
+        return len(self.types) > 0
+
+    # Frees the lookup tables that are only needed while entries are being added (they are rebuilt if more are added)
+    def drop_indexes(self):
+        self.segment_ids = None
+        self.directories = None
+
+    # The lookup tables aren't kept when the tree is cached either
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["segment_ids"] = None
+        state["directories"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+
+    def intern(self, segment):
+        if self.segment_ids is None:
+            self.segment_ids = {name: segment_id for segment_id, name in enumerate(self.segments)}
+        segment_id = self.segment_ids.get(segment)
+        if segment_id is None:
+            segment_id = len(self.segments)
+            self.segments.append(segment)
+            self.segment_ids[segment] = segment_id
+        return segment_id
+
+    # URL the API would give for an entry, built from its type and SHA
+    def build_url(self, type_code, sha):
+        if self.url_prefix is None or sha is None or type_code == type_codes["commit"]:
+            return None
+        return f"{self.url_prefix}{entry_types[type_code]}s/{sha}"
+
+    # Adds an entry; its directory should have been added before it (like in the API's tree), otherwise its full path is kept
+    def append(self, path, entry_type, size=None, sha=None, url=None):
+        if self.directories is None:
+            self.directories = {path: index for index, path in self.iter_paths(type_codes["tree"])}
+
+        index = len(self.types)
+        type_code = type_codes[entry_type]
+        directory, _, name = path.rpartition('/')
+        parent = self.directories.get(directory, -1) if directory else -1
+        if parent == -1:
+            name = path
+
+        self.names.append(self.intern(name))
+        self.parents.append(parent)
+        self.types.append(type_code)
+        self.sizes.append(-1 if size is None else size)
+        self.shas += bytes.fromhex(sha) if sha else no_sha
+
+        if url != self.build_url(type_code, sha):
+            self.other_urls[index] = url
+        if type_code == type_codes["tree"]:
+            self.directories[path] = index
+
+    # Adds an entry in the format returned by the API (missing keys are left empty)
+    def append_item(self, item):
+        self.append(item['path'], item['type'], item.get('size'), item.get('sha'), item.get('url'))
+
+    # Full path of each entry (only of the entries of the specified type, if any) as (index, path)
+    def iter_paths(self, only_type=None):
+        tree_code = type_codes["tree"]
+        directory_paths = {}
+        segments = self.segments
+        names = self.names
+        parents = self.parents
+        types = self.types
+
+        for index in range(len(types)):
+            parent = parents[index]
+            if parent == -1:
+                path = segments[names[index]]
+            else:
+                path = directory_paths[parent] + '/' + segments[names[index]]
+            type_code = types[index]
+            if type_code == tree_code:
+                directory_paths[index] = path
+            if only_type is None or type_code == only_type:
+                yield index, path
+
+    # Full path of a single entry
+    def path(self, index):
+        parts = []
+        while index != -1:
+            parts.append(self.segments[self.names[index]])
+            index = self.parents[index]
+        return '/'.join(reversed(parts))
+
+    def sha(self, index):
+        sha = self.shas[index * 20:index * 20 + 20]
+        return None if sha == no_sha else sha.hex()
+
+    # Entry as the dict the API gives (path, type, url, sha, size), skipping what it doesn't have
+    def entry(self, index, path=None):
+        type_code = self.types[index]
+        sha = self.sha(index)
+        item = {"path": self.path(index) if path is None else path, "type": entry_types[type_code]}
+        url = self.other_urls[index] if index in self.other_urls else self.build_url(type_code, sha)
+        if url is not None:
+            item["url"] = url
+        if sha is not None:
+            item["sha"] = sha
+        if self.sizes[index] != -1:
+            item["size"] = self.sizes[index]
+        return item
+
+    def __iter__(self):
+        for index, path in self.iter_paths():
+            yield self.entry(index, path)
+
+    # Paths of the blobs whose name is accepted by match (called once per distinct name), as (path, match result)
+    # Names shared by many files (e.g. 'index.js', '__init__.py') are only checked once, and paths are only built for matches
+    def match_blob_names(self, match):
+        blob_code = type_codes["blob"]
+        types = self.types
+
+        # Entries added without their directory keep their whole path as their name
+        matches = {}
+        for segment_id, name in enumerate(self.segments):
+            result = match(name[name.rfind('/') + 1:])
+            if result:
+                matches[segment_id] = result
+
+        if matches:
+            for index, segment_id in enumerate(self.names):
+                if segment_id in matches and types[index] == blob_code:
+                    yield self.path(index), matches[segment_id]
+
+    # Builds a tree from a list of entries in the format returned by the API
+    @classmethod
+    def from_entries(cls, entries, url_prefix=None):
+        tree = cls(url_prefix)
+        for item in entries:
+            tree.append_item(item)
+        tree.drop_indexes()
+        return tree
+
+    # Builds a tree from the JSON body of the API's tree endpoint, given as chunks of bytes (e.g. Response.iter_content)
+    # The items of the 'tree' array are decoded one at a time as the chunks arrive, so the whole body is never in memory
+    # Returns the tree and whether the API truncated it. Raises ValueError if the body isn't a valid tree response
+    @classmethod
+    def from_json_stream(cls, chunks, url_prefix=None):
+        parser = TreeStreamParser(cls(url_prefix))
+        for chunk in chunks:
+            parser.feed(chunk)
+        return parser.close()
+
+# Incremental parser of the JSON body of the API's tree endpoint, fed one chunk of bytes at a time (see FileTree.from_json_stream)
+# Lets callers that receive the body in other ways (e.g. asynchronously) build a FileTree as it arrives
+class TreeStreamParser(object):
+
+    array_start = re.compile(r'"tree"\s*:\s*\[')
+    separator = re.compile(r'[\s,]*')
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.decoder = json.JSONDecoder()
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        # Text outside the 'tree' array (the other keys of the response)
+        self.outside = []
+        self.buffer = ''
+        self.state = 'before'
+
+    def feed(self, chunk):
+        self.buffer += self.text_decoder.decode(chunk)
+        self.parse(finished=False)
+
+    # Parses what is left, returns the tree and whether the API truncated it
+    def close(self):
+        self.buffer += self.text_decoder.decode(b'', final=True)
+        self.parse(finished=True)
+        if self.state != 'after':
+            raise ValueError("Invalid tree response")
+
+        truncated = re.search(r'"truncated"\s*:\s*true', ''.join(self.outside)) is not None
+        self.tree.drop_indexes()
+        return self.tree, truncated
+
+    def parse(self, finished):
+        if self.state == 'before':
+            match = self.array_start.search(self.buffer)
+            if match is None:
+                return
+            self.outside.append(self.buffer[:match.start()])
+            self.buffer = self.buffer[match.end():]
+            self.state = 'items'
+
+        if self.state == 'items':
+            buffer = self.buffer
+            position = 0
+            while True:
+                position = self.separator.match(buffer, position).end()
+                if position == len(buffer):
+                    break
+                if buffer[position] == ']':
+                    self.state = 'after'
+                    position += 1
+                    break
+                try:
+                    item, position = self.decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    # The item continues in the next chunk
+                    if finished:
+                        raise ValueError("Incomplete tree response")
+                    break
+                self.tree.append_item(item)
+            self.buffer = buffer[position:]
+
+        if self.state == 'after':
+            self.outside.append(self.buffer)
+            self.buffer = ''
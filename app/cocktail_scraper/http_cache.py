@@ -0,0 +1,333 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import requests
+from requests.structures import CaseInsensitiveDict
+from .config import app_cache_dir, make_private_dir
+
+# Default location and maximum size (in bytes) of the on-disk cache, can be changed through environment variables
+default_cache_dir = os.getenv('GITCOCKTAIL_HTTP_CACHE_DIR', os.path.join(app_cache_dir, 'http_cache'))
+default_max_bytes = int(os.getenv('GITCOCKTAIL_HTTP_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+# Response headers kept with each cached body
+stored_headers = ['Content-Type', 'ETag', 'Last-Modified']
+
+# On-disk cache of GET responses that uses conditional requests (ETag / Last-Modified) to revalidate them
+# Each entry is a pair of files: '<key>.body' (raw body) and '<key>.json' (metadata). The least recently used entries are evicted
+# once the total size of the bodies goes over max_bytes
+class HTTPCache(object):
+
+    def __init__(self, cache_dir=default_cache_dir, max_bytes=default_max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # key -> size of the body, ordered from least to most recently used
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        make_private_dir(cache_dir)
+        self.load_index()
+
+    # Rebuilds the LRU order from the entries already on disk (last access = modification time of the metadata file)
+    def load_index(self):
+        found = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.json'):
+                key = filename[:-len('.json')]
+                body_path = self.body_path(key)
+                if os.path.exists(body_path):
+                    found.append((os.path.getmtime(self.meta_path(key)), key, os.path.getsize(body_path)))
+
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def body_path(self, key):
+        return os.path.join(self.cache_dir, key + '.body')
+
+    def meta_path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    # Entries are specific to the URL, the credentials and the requested media type
+    @staticmethod
+    def make_key(url, headers):
+        key_data = json.dumps([url, headers.get("Authorization", ""), headers.get("Accept", "")])
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+    # Reads the metadata of an entry (None if it doesn't exist or is corrupted)
+    def read_meta(self, key):
+        try:
+            with open(self.meta_path(key)) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    # Opens the body of an entry for reading (None if it doesn't exist)
+    def open_body(self, key):
+        try:
+            return open(self.body_path(key), 'rb')
+        except OSError:
+            return None
+
+    # Writes a file atomically, so concurrent readers never see half of it
+    def write_file(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def remove(self, key):
+        for path in (self.body_path(key), self.meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # Marks an entry as the most recently used one
+    def touch(self, key):
+        self.entries.move_to_end(key)
+        try:
+            os.utime(self.meta_path(key))
+        except OSError:
+            pass
+
+    # Adds (or replaces) an entry in the index and evicts the least recently used ones until the cache is within its size limit
+    # Must be called with the lock held
+    def register(self, key, size):
+        self.total_bytes -= self.entries.pop(key, 0)
+        self.entries[key] = size
+        self.total_bytes += size
+        self.stats["stores"] += 1
+
+        while self.total_bytes > self.max_bytes and self.entries:
+            old_key, old_size = self.entries.popitem(last=False)
+            self.remove(old_key)
+            self.total_bytes -= old_size
+            self.stats["evictions"] += 1
+
+    # Adds (or replaces) an entry
+    def store(self, key, meta, body):
+        # Bodies bigger than the whole cache are never stored
+        if len(body) > self.max_bytes:
+            return
+
+        with self.lock:
+            self.write_file(self.body_path(key), body)
+            self.write_file(self.meta_path(key), json.dumps(meta).encode('utf-8'))
+            self.register(key, len(body))
+
+    # Adds (or replaces) an entry whose body was already written to a temporary file in the cache directory
+    def store_file(self, key, meta, tmp_path, size):
+        with self.lock:
+            os.replace(tmp_path, self.body_path(key))
+            self.write_file(self.meta_path(key), json.dumps(meta).encode('utf-8'))
+            self.register(key, size)
+
+    # Builds a regular requests.Response from a cached entry, with the headers of the 304 it was revalidated by (which
+    # carry the current rate limit) updated with the cached ones
+    # Streamed responses read the body from disk as it is consumed instead of loading it all at once
+    @staticmethod
+    def build_response(url, meta, body_file, stream=False, revalidation_headers=None):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        if stream:
+            response.raw = body_file
+        else:
+            with body_file:
+                response._content = body_file.read()
+        response.encoding = meta.get("encoding")
+        response.headers = CaseInsensitiveDict(revalidation_headers or {})
+        response.headers.update(meta.get("headers", {}))
+        response.from_cache = True
+        return response
+
+    # Looks up a request in the cache, returns its key, the cached metadata (None if it isn't cached) and the request
+    # headers with the cached validators added
+    def prepare(self, url, headers=None):
+        headers = dict(headers or {})
+        key = self.make_key(url, headers)
+
+        with self.lock:
+            cached_meta = self.read_meta(key) if key in self.entries else None
+
+        if cached_meta:
+            if cached_meta.get("etag"):
+                headers["If-None-Match"] = cached_meta["etag"]
+            if cached_meta.get("last_modified"):
+                headers["If-Modified-Since"] = cached_meta["last_modified"]
+        return key, cached_meta, headers
+
+    # Opens the body of an entry the server answered 304 for, counting the hit (None if it was evicted in the meantime)
+    def revalidated(self, key):
+        body_file = self.open_body(key)
+        if body_file is not None:
+            with self.lock:
+                if key in self.entries:
+                    self.touch(key)
+                self.stats["hits"] += 1
+        return body_file
+
+    def count_miss(self):
+        with self.lock:
+            self.stats["misses"] += 1
+
+    # Metadata stored with a response, None if it shouldn't be stored
+    # Only complete responses that can be revalidated later are stored
+    @staticmethod
+    def response_meta(url, status_code, headers, encoding):
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if status_code != 200 or not (etag or last_modified):
+            return None
+        return {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": encoding,
+            "headers": {h: headers[h] for h in stored_headers if h in headers},
+        }
+
+    # Makes a GET request (through send, requests.get by default), sending the cached validators (if any) and serving the
+    # cached body if the server answers 304
+    def get(self, url, headers=None, send=None, **kwargs):
+        send = send or requests.get
+        stream = kwargs.get("stream", False)
+        key, cached_meta, conditional_headers = self.prepare(url, headers)
+
+        response = send(url, headers=conditional_headers, **kwargs)
+
+        # Not modified, serve it from disk (with the headers of the 304, like async_scraper.send_get)
+        if response.status_code == 304 and cached_meta:
+            body_file = self.revalidated(key)
+            if body_file is not None:
+                not_modified = response
+                response = self.build_response(url, cached_meta, body_file, stream, not_modified.headers)
+                response.transport_retries = getattr(not_modified, "transport_retries", 0)
+                not_modified.close()
+                return response
+            # The entry was evicted in the meantime, ask for the whole body
+            response = send(url, headers=headers, **kwargs)
+
+        self.count_miss()
+
+        meta = self.response_meta(url, response.status_code, response.headers, response.encoding)
+        if meta is not None:
+            if stream:
+                # Copy the body to disk as the caller reads it
+                response.raw = CachingReader(response.raw, CacheWriter(self, key, meta))
+            else:
+                self.store(key, meta, response.content)
+
+        response.from_cache = False
+        return response
+
+    # Current counters, plus the number of entries and their total size
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # Removes every entry from the cache
+    def clear(self):
+        with self.lock:
+            for key in list(self.entries):
+                self.remove(key)
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+# Writes a body to a temporary file as it is received, which becomes a cache entry once the whole body was written
+# (a body that goes over the cache's size limit or isn't received until the end is not stored)
+class CacheWriter(object):
+
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=cache.cache_dir)
+        self.tmp_file = os.fdopen(fd, 'wb')
+
+    def write(self, data):
+        if self.tmp_file is None:
+            return
+        self.size += len(data)
+        if self.size > self.cache.max_bytes:
+            self.discard()
+        else:
+            self.tmp_file.write(data)
+
+    # End of the body
+    def finish(self):
+        if self.tmp_file is not None:
+            self.tmp_file.close()
+            self.tmp_file = None
+            self.cache.store_file(self.key, self.meta, self.tmp_path, self.size)
+
+    def discard(self):
+        if self.tmp_file is not None:
+            self.tmp_file.close()
+            self.tmp_file = None
+            try:
+                os.remove(self.tmp_path)
+            except OSError:
+                pass
+
+# Wraps the raw body of a streamed response, copying what is read to the cache
+class CachingReader(object):
+
+    def __init__(self, raw, writer):
+        self.raw = raw
+        self.writer = writer
+
+    def read(self, amount=None):
+        # Bodies sent with Content-Encoding (e.g. gzip) are decoded, like requests does
+        if hasattr(self.raw, "stream"):
+            data = self.raw.read(amount, decode_content=True)
+        else:
+            data = self.raw.read(amount)
+
+        if data:
+            self.writer.write(data)
+        else:
+            self.writer.finish()
+        return data
+
+    def close(self):
+        self.writer.discard()
+        self.raw.close()
+
+    def release_conn(self):
+        if hasattr(self.raw, "release_conn"):
+            self.raw.release_conn()
+
+
+# Cache shared by the whole process, created on first use
+shared_cache = None
+shared_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    global shared_cache
+    with shared_cache_lock:
+        if shared_cache is None:
+            shared_cache = HTTPCache()
+    return shared_cache
+
+# Makes a conditional GET request through the shared cache
+def cached_get(url, headers=None, send=None, **kwargs):
+    return get_shared_cache().get(url, headers=headers, send=send, **kwargs)
+
+# Hit/miss counters of the shared cache
+def cache_stats():
+    return get_shared_cache().get_stats()
@@ -0,0 +1,126 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from .rate_limiter import parse_retry_after
+
+# Connect and read timeouts (in seconds) of the requests made to the GitHub API, can be changed through environment variables
+default_connect_timeout = float(os.getenv('GITCOCKTAIL_HTTP_CONNECT_TIMEOUT', 10))
+default_read_timeout = float(os.getenv('GITCOCKTAIL_HTTP_READ_TIMEOUT', 60))
+
+# Connections kept open to each host (enough for the parallel calls of a few analyses at the same time)
+default_pool_size = 32
+
+# Idempotent requests that fail with one of these status codes (or without a response) are retried up to max_retries
+# times, waiting a random time (full jitter) of up to retry_base_delay * 2 ** attempt seconds before each retry
+# Rate limit errors (403/429) are not retried here, the request scheduler waits for the time the API asks for instead
+retry_statuses = {500, 502, 503, 504}
+idempotent_methods = {"GET", "HEAD", "OPTIONS"}
+default_max_retries = 3
+retry_base_delay = 0.5
+max_retry_delay = 30.0
+
+# HTTP client shared by every call to the GitHub API: a requests.Session with a pool of keep-alive connections per host,
+# compressed responses, default timeouts and bounded retries of idempotent requests
+# It has the same get/post methods as scraper.RequestsTransport, so it can be used as the scraper's transport
+class HTTPClient(object):
+
+    def __init__(self, pool_size=default_pool_size, connect_timeout=default_connect_timeout, read_timeout=default_read_timeout,
+                 max_retries=default_max_retries):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    # Seconds to wait before a retry (full jitter, or what a 503's Retry-After asks for)
+    @staticmethod
+    def retry_delay(attempt, response=None):
+        if response is not None and response.headers.get("Retry-After"):
+            return min(max_retry_delay, parse_retry_after(response.headers["Retry-After"]))
+        return random.uniform(0, min(max_retry_delay, retry_base_delay * 2 ** attempt))
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    # Makes a request, retrying idempotent ones that fail with a server error or without a response
+    # The number of retries is kept in the response's 'transport_retries' attribute
+    def request(self, method, url, headers=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        retries = self.max_retries if method.upper() in idempotent_methods else 0
+
+        for attempt in range(retries + 1):
+            self.count("requests")
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    self.count("failures")
+                    raise
+                delay = self.retry_delay(attempt)
+            else:
+                if response.status_code not in retry_statuses or attempt == retries:
+                    response.transport_retries = attempt
+                    return response
+                delay = self.retry_delay(attempt, response)
+                response.close()
+
+            self.count("retries")
+            print(f"Request to {url} failed, retrying in {delay:.1f} seconds")
+            time.sleep(delay)
+
+    def get(self, url, headers=None, **kwargs):
+        return self.request("GET", url, headers=headers, **kwargs)
+
+    def post(self, url, headers=None, **kwargs):
+        return self.request("POST", url, headers=headers, **kwargs)
+
+    # Request counters, plus how many connections were opened and reused (in total and by host)
+    def get_stats(self):
+        hosts = {}
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = hosts.setdefault(f"{pool.scheme}://{pool.host}:{pool.port}", {"requests": 0, "connections": 0})
+            host["requests"] += pool.num_requests
+            host["connections"] += pool.num_connections
+
+        for host in hosts.values():
+            host["reused"] = max(0, host["requests"] - host["connections"])
+
+        with self.lock:
+            stats = dict(self.stats)
+        stats["connections"] = sum(host["connections"] for host in hosts.values())
+        stats["reused_connections"] = sum(host["reused"] for host in hosts.values())
+        sent = sum(host["requests"] for host in hosts.values())
+        stats["reuse_ratio"] = stats["reused_connections"] / sent if sent else 0.0
+        stats["hosts"] = hosts
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+# Client shared by the whole process, created on first use
+shared_client = None
+shared_client_lock = threading.Lock()
+
+def get_http_client():
+    global shared_client
+    with shared_client_lock:
+        if shared_client is None:
+            shared_client = HTTPClient()
+    return shared_client
+
+# Requests sent by the shared client and how many of them reused an open connection
+def get_client_stats():
+    return get_http_client().get_stats()
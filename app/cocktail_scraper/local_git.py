@@ -0,0 +1,187 @@
+import os
+import subprocess
+import threading
+from .file_tree import FileTree, type_codes
+from .scraper import load_data_json, find_dependency_files, select_dependency_files, default_analysis_depth, parse_gitmodules, readme_candidates, save_file
+
+# Default text git puts in the 'description' file of new repositories
+default_description = "Unnamed repository; edit this file 'description' to name the repository."
+
+# Runs a git command in the specified repository (working copy or bare) and returns its output
+def run_git(repo_path, *args):
+    result = subprocess.run(["git", "-C", repo_path, *args], capture_output=True, check=True)
+    return result.stdout
+
+# Long-lived 'git cat-file --batch' process, used to read any number of objects without starting a process for each one
+class GitCatFile(object):
+
+    def __init__(self, repo_path):
+        self.process = subprocess.Popen(
+            ["git", "-C", repo_path, "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self.lock = threading.Lock()
+
+    # Reads the content of an object (None if it doesn't exist)
+    def read(self, sha):
+        with self.lock:
+            self.process.stdin.write(sha.encode('ascii') + b"\n")
+            self.process.stdin.flush()
+
+            # '<sha> <type> <size>' or '<sha> missing'
+            header = self.process.stdout.readline().split()
+            if len(header) != 3:
+                return None
+            size = int(header[2])
+            content = self.process.stdout.read(size)
+            # Each object is followed by a newline
+            self.process.stdout.read(1)
+            return content
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+# Lists the whole tree of the specified ref, in the same format as scraper.get_repo_files
+def get_local_repo_files(repo_path, ref="HEAD"):
+    # -r: recursive, -t: include the trees themselves, -l: blob sizes, -z: NUL separated, unquoted paths
+    output = run_git(repo_path, "ls-tree", "-r", "-t", "-l", "-z", ref)
+
+    file_path_data = FileTree()
+    for line in output.split(b"\0"):
+        if not line:
+            continue
+        # '<mode> <type> <sha> <size>\t<path>'
+        info, _, path = line.partition(b"\t")
+        mode, object_type, sha, size = info.split()
+        file_path_data.append(
+            path.decode('utf-8', errors='replace'),
+            object_type.decode('ascii'),
+            int(size) if size != b"-" else None,
+            sha.decode('ascii'),
+        )
+
+    return file_path_data
+
+# Infers the languages of a repo from the extensions (or names) of its files, as {language: bytes} like the GitHub API
+def infer_languages(file_path_data, data_json):
+    extensions = data_json["language_extensions"]
+    filenames = data_json["language_filenames"]
+
+    languages = {}
+    for file in file_path_data:
+        if file["type"] != "blob":
+            continue
+        name = file["path"].rsplit('/', 1)[-1]
+        language = filenames.get(name) or extensions.get(os.path.splitext(name)[1])
+        if language:
+            languages[language] = languages.get(language, 0) + file.get("size", 0)
+
+    # Biggest first, like the GitHub API
+    return dict(sorted(languages.items(), key=lambda item: item[1], reverse=True))
+
+# Reads the repo data available locally, using the same keys as the GitHub API
+def get_local_repo_data(repo_path):
+    git_dir = run_git(repo_path, "rev-parse", "--absolute-git-dir").decode().strip()
+    is_bare = run_git(repo_path, "rev-parse", "--is-bare-repository").decode().strip() == "true"
+
+    name = os.path.basename(os.path.abspath(git_dir if is_bare else repo_path))
+    if name.endswith(".git"):
+        name = name[:-len(".git")]
+
+    description = None
+    description_path = os.path.join(git_dir, "description")
+    if os.path.exists(description_path):
+        with open(description_path) as f:
+            description = f.read().strip()
+        if description == default_description:
+            description = None
+
+    try:
+        default_branch = run_git(repo_path, "symbolic-ref", "--short", "HEAD").decode().strip()
+    except subprocess.CalledProcessError:
+        # Detached HEAD
+        default_branch = None
+
+    try:
+        html_url = run_git(repo_path, "config", "--get", "remote.origin.url").decode().strip()
+    except subprocess.CalledProcessError:
+        html_url = None
+
+    return {
+        "name": name,
+        "description": description,
+        "default_branch": default_branch,
+        "html_url": html_url,
+        "head_sha": run_git(repo_path, "rev-parse", "HEAD").decode().strip(),
+    }
+
+# Same as scraper.scrap_data, but reads everything from a local working copy or bare repository (e.g. a mirror) instead of the GitHub API
+def scrap_data_local(repo_path, debug=None, ref="HEAD", depth=default_analysis_depth, extras=()):
+    # Load data.json
+    data_json = load_data_json()
+
+    try:
+        repo_data = get_local_repo_data(repo_path)
+        file_path_data = get_local_repo_files(repo_path, ref)
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Error: Unable to read local repository {repo_path}: {e}")
+        # Same error the GitHub API gives for missing repos
+        return ('Error',404)
+
+    print(f"The repository name is: {repo_data['name']}")
+    blob_shas = {path: file_path_data.sha(index) for index, path in file_path_data.iter_paths(type_codes["blob"])}
+
+    with GitCatFile(repo_path) as cat_file:
+        # Reads a blob at the specified path as text
+        def read_text(path):
+            content = cat_file.read(blob_shas[path])
+            return content.decode('utf-8', errors='replace') if content is not None else None
+
+        lang_data = infer_languages(file_path_data, data_json)
+
+        readme_data = None
+        if 'readme' in extras:
+            readme_data = "Error: Unable to fetch README. No README file was found at the root of the repository"
+            for name in readme_candidates:
+                if name in blob_shas:
+                    readme_data = read_text(name)
+                    break
+
+        submodule_data = parse_gitmodules(read_text(".gitmodules")) if ".gitmodules" in blob_shas else []
+
+        # Load types of dependency files to target
+        targets = data_json["dependency_file_targets"]
+        target_files = select_dependency_files(find_dependency_files(file_path_data, targets), lang_data, depth, data_json)
+        dependency_files_data = {}
+        for file_type, paths in target_files.items():
+            for path in paths:
+                dependency_files_data.setdefault(file_type, []).append(
+                    {"path": path, "text": read_text(path), "isTruncated": False, "sha": blob_shas[path]}
+                )
+
+    if lang_data:
+        repo_data["languages"] = lang_data
+    if readme_data:
+        repo_data["readme"] = readme_data
+    if file_path_data:
+        if 'file_path_data' in extras:
+            repo_data["file_path_data"] = file_path_data
+        if dependency_files_data:
+            repo_data["dependency_file_data"] = dependency_files_data
+    if submodule_data:
+        repo_data["submodules"] = submodule_data
+    repo_data["analysis_depth"] = depth
+
+    if debug:
+        save_file(repo_data)
+
+    return repo_data
@@ -0,0 +1,90 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Worker processes the dependency file parsers run in, so parsing a big repo doesn't hold the GIL of the web server's threads
+# Can be changed through an environment variable (0 parses every file on the calling thread)
+# With a single CPU the workers only add the cost of sending them the files, so there are none
+def cpu_parse_workers():
+    cpus = os.cpu_count() or 1
+    return 0 if cpus < 2 else min(4, cpus)
+
+default_parse_workers = int(os.getenv('GITCOCKTAIL_PARSE_WORKERS', cpu_parse_workers()))
+
+# Files are only sent to the pool when there is enough text to make up for sending it to the workers and back
+# Measured with data_processor.benchmark_parse_dependencies: the parsers go through ~80 MB/s, and a round trip to a worker
+# adds about half of that time again, so a batch only gains from being split between a few workers when it takes long to
+# parse (4 MiB is ~50 ms on the calling thread; 14 MB took 0.18 s there against 0.28 s through 1 or 2 workers)
+min_pool_bytes = 4 * 1024 * 1024
+
+# The server runs several threads, which a forked worker would copy in whatever state they are in
+# The fork server starts the workers from a clean process instead (spawn where it isn't available)
+def pool_context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+# Runs a parser on a file's text (in a worker process)
+def parse_file(parser, text, args):
+    return parser(text, *args)
+
+# Pool of worker processes that parse dependency files, started on first use and reused by every analysis
+class ParserPool(object):
+
+    def __init__(self, workers=default_parse_workers):
+        self.workers = workers
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+            return self.executor
+
+    # Parses a list of (parser, text, args) jobs, returning their results in the same order as the jobs
+    # Small batches (or a pool without workers) are parsed on the calling thread, and so is a batch whose worker died
+    # (the next batch starts a new pool)
+    def parse(self, jobs):
+        if self.workers < 1 or sum(len(text) for _, text, _ in jobs) < min_pool_bytes:
+            return [parse_file(parser, text, args) for parser, text, args in jobs]
+
+        executor = self.get_executor()
+        # Big files go first, so they don't end up being parsed last by a single worker
+        order = sorted(range(len(jobs)), key=lambda index: -len(jobs[index][1]))
+        try:
+            futures = {index: executor.submit(parse_file, *jobs[index]) for index in order}
+            return [futures[index].result() for index in range(len(jobs))]
+        except BrokenProcessPool as e:
+            print(f"Parser pool failed ({e}), parsing on the calling thread")
+            self.reset(executor)
+            return [parse_file(parser, text, args) for parser, text, args in jobs]
+
+    # Drops a broken executor, unless another batch already replaced it
+    def reset(self, executor):
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+
+# Pool shared by the whole process, created on first use
+shared_pool = None
+shared_pool_lock = threading.Lock()
+
+def get_parser_pool():
+    global shared_pool
+    with shared_pool_lock:
+        if shared_pool is None:
+            shared_pool = ParserPool()
+            atexit.register(shared_pool.close)
+    return shared_pool
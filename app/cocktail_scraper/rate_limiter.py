@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Longest time (in seconds) a request waits for its turn (None: no limit)
+# A request that would have to wait longer gives up right away: the user is better served by the API's rate limit error
+# than by a page that hangs until the budget resets
+max_wait = 60
+
+# Seconds after which the state of a token that made no requests is dropped (longer than the hour a budget lasts)
+idle_state_ttl = 2 * 60 * 60
+
+# Seconds between the checks coroutines waiting for their turn make (they can't be woken up like threads)
+async_poll_interval = 0.05
+
+# Raised when a request would have to wait longer than max_wait for its turn
+class RateLimitExceeded(Exception):
+
+    def __init__(self, wait):
+        super().__init__(f"GitHub API rate limit exceeded, the next request can only be made in {wait:.0f} seconds")
+        self.wait = wait
+
+# Identifies a token without keeping it in memory in plain text
+def token_id(authorization):
+    if not authorization:
+        return "anonymous"
+    return hashlib.sha256(authorization.encode('utf-8')).hexdigest()[:12]
+
+# What is known about the budget of one rate limit resource ('core', 'graphql', ...) of a token
+class ResourceBudget(object):
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.used = None
+        self.reset = None  # epoch seconds
+        self.last_cost = None
+
+    def to_dict(self):
+        return {
+            "limit": self.limit,
+            "remaining": self.remaining,
+            "used": self.used,
+            "reset": self.reset,
+            "last_cost": self.last_cost,
+        }
+
+# Scheduling state of a single token: its budgets, a token bucket that paces its requests, a backoff deadline
+# and the requests waiting for their turn
+class TokenState(object):
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0  # monotonic seconds
+        self.backoff_count = 0
+        self.resources = {}
+        self.waiting = []  # heap of sequence numbers
+        self.used_at = time.monotonic()
+
+    def resource(self, name):
+        if name not in self.resources:
+            self.resources[name] = ResourceBudget()
+        return self.resources[name]
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def idle(self, now, ttl):
+        return not self.waiting and now - self.used_at > ttl and self.blocked_until <= now
+
+# Central scheduler of the requests made to the GitHub API
+# Every request waits for its turn (by arrival) among the requests that use the same token. A turn is given when the token
+# bucket of the token allows it, when the token is not backing off from a secondary rate limit and when the remaining
+# budget (as reported by the API) isn't used up
+# The state of a token is dropped once it has been idle for idle_ttl seconds, so tokens that stop being used don't pile up
+class RequestScheduler(object):
+
+    def __init__(self, rate=15.0, burst=30, max_backoff=900, max_wait=max_wait, idle_ttl=idle_state_ttl):
+        self.rate = rate
+        self.burst = burst
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait
+        self.idle_ttl = idle_ttl
+        self.condition = threading.Condition()
+        self.states = {}
+        self.sequence = itertools.count()
+
+    def state(self, token):
+        now = time.monotonic()
+        if token not in self.states:
+            # Drop the states of idle tokens (only when a new one is added, which is much rarer than a request)
+            for idle_token in [other for other, state in self.states.items() if state.idle(now, self.idle_ttl)]:
+                del self.states[idle_token]
+            self.states[token] = TokenState(self.rate, self.burst)
+        state = self.states[token]
+        state.used_at = now
+        return state
+
+    # Seconds until a request can use a resource (0 if it can go now)
+    def wait_time(self, state, resource_name, now):
+        state.refill(now)
+        waits = [state.blocked_until - now, (1 - state.tokens) / state.rate]
+
+        budget = state.resource(resource_name)
+        if budget.remaining is not None and budget.remaining <= 0 and budget.reset:
+            waits.append(max(0.0, budget.reset - time.time()))
+
+        return max(waits)
+
+    # Gives a waiting request its turn if it is first in line and can go now
+    # Must be called with the condition held. Returns (done, seconds to wait if it is first in line)
+    # Raises RateLimitExceeded (taking the request out of line) if its turn would only come after its deadline
+    def try_acquire(self, state, entry, resource_name, deadline):
+        if state.waiting[0] != entry:
+            return False, None
+
+        now = time.monotonic()
+        timeout = self.wait_time(state, resource_name, now)
+        if timeout > 0 and (deadline is None or now + timeout <= deadline):
+            return False, timeout
+
+        heapq.heappop(state.waiting)
+        # Let the next request in line check its turn
+        self.condition.notify_all()
+        if timeout > 0:
+            raise RateLimitExceeded(timeout)
+        state.tokens -= 1
+        return True, None
+
+    # Puts a request in line, returns its token state, its entry in the line and the deadline of its wait
+    def enqueue(self, authorization):
+        entry = next(self.sequence)
+        deadline = None if self.max_wait is None else time.monotonic() + self.max_wait
+        state = self.state(token_id(authorization))
+        heapq.heappush(state.waiting, entry)
+        return state, entry, deadline
+
+    # Blocks until a request with the specified token can be made
+    # Raises RateLimitExceeded if the request would have to wait longer than max_wait
+    def acquire(self, authorization, resource_name="core"):
+        with self.condition:
+            state, entry, deadline = self.enqueue(authorization)
+            while True:
+                done, timeout = self.try_acquire(state, entry, resource_name, deadline)
+                if done:
+                    return
+                self.condition.wait(timeout)
+
+    # Same as acquire, for coroutines: checks for its turn every async_poll_interval seconds instead of blocking the event loop
+    async def acquire_async(self, authorization, resource_name="core"):
+        with self.condition:
+            state, entry, deadline = self.enqueue(authorization)
+        try:
+            while True:
+                with self.condition:
+                    done, timeout = self.try_acquire(state, entry, resource_name, deadline)
+                if done:
+                    return
+                await asyncio.sleep(async_poll_interval if timeout is None else min(timeout, async_poll_interval))
+        except asyncio.CancelledError:
+            # Leave the line
+            with self.condition:
+                if entry in state.waiting:
+                    state.waiting.remove(entry)
+                    heapq.heapify(state.waiting)
+                    self.condition.notify_all()
+            raise
+
+    # Updates the budget of a token from the headers of a response
+    # Returns the seconds to wait before retrying if the response was rejected by a rate limit, None otherwise
+    def update(self, authorization, response, resource_name="core"):
+        headers = response.headers
+        now = time.monotonic()
+
+        with self.condition:
+            state = self.state(token_id(authorization))
+            budget = state.resource(headers.get("X-RateLimit-Resource", resource_name))
+
+            if "X-RateLimit-Remaining" in headers:
+                previous_used = budget.used
+                budget.limit = int(headers.get("X-RateLimit-Limit", budget.limit or 0))
+                budget.remaining = int(headers["X-RateLimit-Remaining"])
+                budget.used = int(headers.get("X-RateLimit-Used", budget.used or 0))
+                budget.reset = int(headers.get("X-RateLimit-Reset", budget.reset or 0))
+                # Cost of the request (GraphQL queries cost a variable number of points)
+                if previous_used is not None and budget.used >= previous_used:
+                    budget.last_cost = budget.used - previous_used
+
+            retry_after = None
+            if response.status_code in (403, 429):
+                if headers.get("Retry-After"):
+                    retry_after = parse_retry_after(headers["Retry-After"])
+                elif budget.remaining == 0 and budget.reset:
+                    # Primary rate limit, wait for the reset
+                    retry_after = max(0.0, budget.reset - time.time())
+                elif response.status_code == 429 or "secondary rate limit" in response.text.lower():
+                    # Secondary rate limit without a Retry-After, back off exponentially (starting at 1 minute)
+                    retry_after = min(self.max_backoff, 60 * 2 ** state.backoff_count)
+                    state.backoff_count += 1
+
+            if retry_after is not None:
+                state.blocked_until = max(state.blocked_until, now + retry_after)
+            elif response.status_code < 400:
+                state.backoff_count = 0
+
+            self.condition.notify_all()
+            return retry_after
+
+    # Known budget of a token (or of every token), by resource
+    def get_budget(self, authorization=None):
+        with self.condition:
+            if authorization is not None:
+                tokens = [token_id(authorization)]
+            else:
+                tokens = list(self.states)
+
+            budget = {}
+            now = time.monotonic()
+            for token in tokens:
+                state = self.states.get(token)
+                if state is None:
+                    budget[token] = {"resources": {}, "blocked_for": 0, "waiting": 0}
+                    continue
+                budget[token] = {
+                    "resources": {name: resource.to_dict() for name, resource in state.resources.items()},
+                    "blocked_for": max(0.0, state.blocked_until - now),
+                    "waiting": len(state.waiting),
+                }
+            return budget
+
+# Retry-After can either be a number of seconds or an HTTP date
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 60.0
+
+
+# Scheduler shared by the whole process
+scheduler = RequestScheduler()
@@ -4,14 +4,128 @@ import os
 import base64
 import pprint
 import re
-
-# Loads the data.json file as a dictionary
+import time
+import contextvars
+import random
+from functools import lru_cache
+import codecs
+import tarfile
+import hashlib
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .http_cache import cached_get
+from .blob_store import get_shared_store
+from .file_tree import FileTree
+from .config import get_config, DependencyFileMatcher
+from .rate_limiter import scheduler, token_id, RateLimitExceeded
+from .http_client import get_http_client
+from . import call_tracer
+
+# Contents of the data.json file, as a read-only dictionary (loaded once per process, see config.get_config)
 def load_data_json():
-    with open('cocktail_scraper/data.json') as json_data:
-        data = json.load(json_data)
-        json_data.close()
+    return get_config().data
+
+# GraphQL endpoint that goes with a REST API base URL (GitHub Enterprise Server serves them at /api/v3 and /api/graphql)
+def default_graphql_url(base_url):
+    if base_url.endswith('/api/v3'):
+        return base_url[:-len('/v3')] + '/graphql'
+    return base_url + '/graphql'
+
+# Base URL of the GitHub REST API and URL of the GraphQL endpoint, can be changed through environment variables or
+# configure_github_api (e.g. to use GitHub Enterprise Server or the local stand-in server in fake_github.py)
+api_base_url = os.getenv('GITCOCKTAIL_GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+graphql_url = os.getenv('GITCOCKTAIL_GITHUB_GRAPHQL_URL') or default_graphql_url(api_base_url)
+
+# Sends the HTTP requests made to the GitHub API without a session (a new connection per request)
+# Any object with the same get/post methods (taking the arguments of requests.get/post and returning a requests.Response)
+# can replace it, e.g. to record the requests or answer them without a network
+class RequestsTransport(object):
+
+    def get(self, url, headers=None, **kwargs):
+        return requests.get(url, headers=headers, **kwargs)
+
+    def post(self, url, headers=None, **kwargs):
+        return requests.post(url, headers=headers, **kwargs)
+
+# The shared HTTP client (see http_client) is used by default: keep-alive connections, compression, timeouts and retries
+transport = get_http_client()
+
+# Changes the GitHub API used by the scraper (only the specified settings), for the whole process
+# Returns the previous settings, so they can be restored by passing them back
+def configure_github_api(base_url=None, graphql_endpoint=None, http_transport=None):
+    global api_base_url, graphql_url, transport
+    previous = {"base_url": api_base_url, "graphql_endpoint": graphql_url, "http_transport": transport}
+
+    if base_url is not None:
+        api_base_url = base_url.rstrip('/')
+        graphql_url = graphql_endpoint or default_graphql_url(api_base_url)
+    elif graphql_endpoint is not None:
+        graphql_url = graphql_endpoint
+    if http_transport is not None:
+        transport = http_transport
+
+    return previous
+
+# Number of times a request rejected by a rate limit is retried (after waiting for the time the API asks for)
+max_rate_limit_retries = 2
+
+# Makes a request to the GitHub API once the request scheduler gives it its turn, updating the token's budget with the response
+# The call is traced as a span (see call_tracer); the body of streamed responses is counted as it is read
+def scheduled_request(send, url, headers, method="GET", json_body=None, stream=False):
+    authorization = (headers or {}).get("Authorization")
+    resource = "graphql" if url.endswith("/graphql") else "core"
+    span = call_tracer.start_span(method, url, json_body)
+
+    response = None
+    try:
+        for attempt in range(max_rate_limit_retries + 1):
+            try:
+                with call_tracer.timed_phase(span, "wait"):
+                    scheduler.acquire(authorization, resource)
+            except RateLimitExceeded:
+                # The retry can't be made in time, the caller gets the rate limit error instead
+                if response is None:
+                    raise
+                attempt -= 1
+                break
+            if response is not None:
+                response.close()
+            with call_tracer.timed_phase(span, "latency"):
+                response = send()
+            retry_after = scheduler.update(authorization, response, resource)
+            if retry_after is None or attempt == max_rate_limit_retries:
+                break
+            print(f"Rate limited by the GitHub API, retrying in {retry_after:.0f} seconds")
+    except Exception as e:
+        call_tracer.finish_span(span, None, error=e)
+        raise
+
+    if stream:
+        call_tracer.finish_span(span, response, attempt)
+        response.raw = call_tracer.CountingReader(response.raw, span)
+    else:
+        call_tracer.finish_span(span, response, attempt, len(response.content))
+    return response
+
+# Makes a GET request to the GitHub API through the request scheduler (and the local HTTP cache, unless cached is False)
+def github_get(url, headers=None, cached=True, **kwargs):
+    stream = kwargs.get("stream", False)
+    if cached:
+        return scheduled_request(lambda: cached_get(url, headers=headers, send=transport.get, **kwargs), url, headers, stream=stream)
+    return scheduled_request(lambda: transport.get(url, headers=headers, **kwargs), url, headers, stream=stream)
 
-    return data
+# Makes a POST request to the GitHub API (GraphQL) through the request scheduler
+def github_post(url, headers=None, **kwargs):
+    return scheduled_request(lambda: transport.post(url, headers=headers, **kwargs), url, headers, "POST", kwargs.get("json"))
+
+# Known rate limit budget of a token, by resource ('core', 'graphql', ...)
+def get_rate_limit_budget(token):
+    authorization = f"Bearer {token}" if token else None
+    return scheduler.get_budget(authorization)[token_id(authorization)]
+
+# Submits a function to an executor, running it with the caller's context (e.g. the trace of its analysis)
+def submit_in_context(executor, function, *args):
+    return executor.submit(contextvars.copy_context().run, function, *args)
 
 # Fetches the repo data through the GitHub API
 def get_repo_data(repo_url, token=None):
@@ -21,7 +135,7 @@ def get_repo_data(repo_url, token=None):
     repo_name = parts[-1]
 
     # Construct API URL
-    api_url = f"https://api.github.com/repos/{owner}/{repo_name}"
+    api_url = f"{api_base_url}/repos/{owner}/{repo_name}"
 
     # Headers for authentication
     headers = {}
@@ -29,7 +143,7 @@ def get_repo_data(repo_url, token=None):
         headers["Authorization"] = f"Bearer {token}"
 
     # Make a GET request to GitHub API
-    response = requests.get(api_url, headers=headers)
+    response = github_get(api_url, headers=headers)
 
     if response.status_code == 200:
         # Parse JSON response
@@ -39,6 +153,30 @@ def get_repo_data(repo_url, token=None):
         print(f"Error: Unable to fetch repository details (Status code {response.status_code}: {response.text})")
         return response.status_code
 
+# Fetches the SHA of the commit at the HEAD of the default branch of the specified repo through the GitHub API
+def get_head_commit_sha(repo_url, token=None):
+    # Extract owner and repo name from URL
+    parts = repo_url.rstrip('/').split('/')
+    owner = parts[-2]
+    repo_name = parts[-1]
+
+    # Construct API URL
+    api_url = f"{api_base_url}/repos/{owner}/{repo_name}/commits/HEAD"
+
+    # Headers for authentication, asking only for the SHA instead of the whole commit
+    headers = {"Accept": "application/vnd.github.sha"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    # Make a GET request to GitHub API
+    response = github_get(api_url, headers=headers)
+
+    if response.status_code == 200:
+        return response.text.strip()
+    else:
+        print(f"Error: Unable to fetch the HEAD commit (Status code {response.status_code}: {response.text})")
+        return response.status_code
+
 # Fetches the contents of the specified file from the specified repo through the GitHub API
 def get_file_content(repo_url, path, token=None):
     print('Getting a file content....')
@@ -48,7 +186,7 @@ def get_file_content(repo_url, path, token=None):
     repo_name = parts[-1]
 
     # Construct API URL
-    api_url = f"https://api.github.com/repos/{owner}/{repo_name}/contents/{path}"
+    api_url = f"{api_base_url}/repos/{owner}/{repo_name}/contents/{path}"
 
     # Headers for authentication
     headers = {}
@@ -56,7 +194,7 @@ def get_file_content(repo_url, path, token=None):
         headers["Authorization"] = f"Bearer {token}"
 
      # Make a GET request to GitHub API
-    response = requests.get(api_url, headers=headers)
+    response = github_get(api_url, headers=headers)
 
     if response.status_code == 200:
         data = response.json()
@@ -65,7 +203,7 @@ def get_file_content(repo_url, path, token=None):
             raw_headers = headers.copy()
             raw_headers["Accept"] = "application/vnd.github.v3.raw"
             # Re-request with raw Accept header
-            raw_response = requests.get(api_url, headers=raw_headers)
+            raw_response = github_get(api_url, headers=raw_headers)
             if raw_response.status_code == 200:
                 content = raw_response.text
             else:
@@ -80,6 +218,62 @@ def get_file_content(repo_url, path, token=None):
         print(f"Error: Unable to fetch file content (Status code {response.status_code}: {response.text})")
         return None
 
+# Text of a body read in chunks, decoded as they arrive so the whole body is never held as bytes next to its text
+class StreamedText(object):
+
+    def __init__(self):
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.parts = []
+
+    def feed(self, chunk):
+        self.parts.append(self.decoder.decode(chunk))
+
+    def text(self):
+        self.parts.append(self.decoder.decode(b"", final=True))
+        return "".join(self.parts)
+
+# Downloads the raw content of the specified file from the specified repo through the GitHub API, in a single request
+# The body is decoded as it is streamed and the download is abandoned if it goes over max_bytes
+def download_raw_file(repo_url, path, token=None, ref=None, max_bytes=None):
+    if max_bytes is None:
+        max_bytes = max_raw_file_bytes
+
+    # Extract owner and repo name from URL
+    parts = repo_url.rstrip('/').split('/')
+    owner = parts[-2]
+    repo_name = parts[-1]
+
+    # Construct API URL
+    api_url = f"{api_base_url}/repos/{owner}/{repo_name}/contents/{quote(path)}"
+    params = {"ref": ref} if ref else None
+
+    # Headers for authentication, asking for the raw file instead of the JSON description with base64 content
+    headers = {"Accept": "application/vnd.github.v3.raw"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    with github_get(api_url, headers=headers, cached=False, params=params, stream=True) as response:
+        if response.status_code != 200:
+            print(f"Error: Unable to download file {path} (Status code {response.status_code}: {response.text})")
+            return None
+
+        # The size is known beforehand most of the time
+        content_length = response.headers.get("Content-Length")
+        if content_length and int(content_length) > max_bytes:
+            print(f"Error: File {path} is too big to download ({content_length} bytes)")
+            return None
+
+        text = StreamedText()
+        downloaded = 0
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            downloaded += len(chunk)
+            if downloaded > max_bytes:
+                print(f"Error: File {path} is too big to download (over {max_bytes} bytes)")
+                return None
+            text.feed(chunk)
+
+        return text.text()
+
 # Fetches the languages identified in the specified repo through the GitHub API
 def get_repo_languages(repo_url, token=None):
     # Extract owner and repo name from URL
@@ -88,7 +282,7 @@ def get_repo_languages(repo_url, token=None):
     repo_name = parts[-1]
 
     # Construct API URL
-    api_url = f"https://api.github.com/repos/{owner}/{repo_name}/languages"
+    api_url = f"{api_base_url}/repos/{owner}/{repo_name}/languages"
 
     # Headers for authentication
     headers = {}
@@ -96,7 +290,7 @@ def get_repo_languages(repo_url, token=None):
         headers["Authorization"] = f"Bearer {token}"
 
     # Make a GET request to GitHub API
-    response = requests.get(api_url, headers=headers)
+    response = github_get(api_url, headers=headers)
 
     if response.status_code == 200:
         # Parse JSON response
@@ -114,7 +308,7 @@ def get_repo_readme(repo_url, token=None):
     repo_name = parts[-1]
 
     # GitHub API endpoint for fetching README
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/readme"
+    url = f"{api_base_url}/repos/{owner}/{repo_name}/readme"
 
     # Headers for authentication
     headers = {}
@@ -122,7 +316,7 @@ def get_repo_readme(repo_url, token=None):
         headers["Authorization"] = f"Bearer {token}"
 
     # Send GET request to the API
-    response = requests.get(url, headers=headers)
+    response = github_get(url, headers=headers)
 
     # Check if the request was successful
     if response.status_code == 200:
@@ -150,7 +344,7 @@ def get_repo_files(repo_url, default_branch, token=None):
 
     """
     # GitHub API endpoint for fetching repository information
-    repo_api_url = f"https://api.github.com/repos/{owner}/{repo_name}"
+    repo_api_url = f"{api_base_url}/repos/{owner}/{repo_name}"
 
     # Make a GET request to fetch repository information
     repo_response = requests.get(repo_api_url, headers=headers)
@@ -163,51 +357,136 @@ def get_repo_files(repo_url, default_branch, token=None):
     """
 
     # GitHub API endpoint for fetching the repository tree
-    tree_api_url = f"https://api.github.com/repos/{owner}/{repo_name}/git/trees/{default_branch}?recursive=1"
-
-    # Make a GET request to GitHub API for the tree
-    tree_response = requests.get(tree_api_url, headers=headers)
-
-    if tree_response.status_code == 200:
-        # Parse JSON response
-        repo_data = tree_response.json()
-
-        # Extract path, type, and url for each item, handling missing keys
-        filtered_data = []
-        for item in repo_data.get('tree', []):
-            filtered_item = {}
-            if 'path' in item:
-                filtered_item['path'] = item['path']
-            if 'type' in item:
-                filtered_item['type'] = item['type']
-            if 'url' in item:
-                filtered_item['url'] = item['url']
-
-            # Only add the item if it has at least one of the desired keys
-            if filtered_item:
-                filtered_data.append(filtered_item)
-
-        return filtered_data
-    else:
-        return f"Error: Unable to fetch the repository's file path data. Status code {tree_response.status_code}: {tree_response.text}"
-
-# Fetches the name of the submodules used in the specified repo through a query request to the GitHub GraphQL API
-def get_submodules(repo_url, token):
+    tree_api_url = f"{api_base_url}/repos/{owner}/{repo_name}/git/trees/{default_branch}?recursive=1"
+
+    # Prefix of the API URLs of the tree's blobs and trees
+    url_prefix = f"{api_base_url}/repos/{owner}/{repo_name}/git/"
+
+    # Make a GET request to GitHub API for the tree, reading the body as a stream
+    with github_get(tree_api_url, headers=headers, stream=True) as tree_response:
+        if tree_response.status_code != 200:
+            return f"Error: Unable to fetch the repository's file path data. Status code {tree_response.status_code}: {tree_response.text}"
+
+        # Parse the items of the JSON response as they arrive, straight into a compact file tree
+        try:
+            file_tree, truncated = FileTree.from_json_stream(tree_response.iter_content(chunk_size=64 * 1024), url_prefix)
+        except ValueError as e:
+            return f"Error: Unable to parse the repository's file path data: {e}"
+
+    # The recursive tree is cut short for very large repos, so walk it one subtree at a time instead
+    if truncated:
+        print("The repository's tree is too large to fetch at once, fetching it by subtrees")
+        file_path_data = walk_repo_tree(repo_url, default_branch, token)
+        if type(file_path_data) == str:
+            return file_path_data
+        return FileTree.from_entries(file_path_data, url_prefix)
+
+    return file_tree
+
+# Extracts the path (prefixed with the path of the tree it is in), type, url, sha and size of a tree item, handling missing keys
+def filter_tree_item(item, prefix=''):
+    filtered_item = {}
+    if 'path' in item:
+        filtered_item['path'] = prefix + item['path']
+    if 'type' in item:
+        filtered_item['type'] = item['type']
+    if 'url' in item:
+        filtered_item['url'] = item['url']
+    if 'sha' in item:
+        filtered_item['sha'] = item['sha']
+    if 'size' in item:
+        filtered_item['size'] = item['size']
+    return filtered_item
+
+# Fetches a single (non recursive) tree of the specified repo through the GitHub API
+# Returns the filtered items, with their paths prefixed by the tree's path, or None if it couldn't be fetched
+def get_subtree(repo_url, tree_sha, prefix, token=None):
     # Extract owner and repo name from URL
     parts = repo_url.rstrip('/').split('/')
     owner = parts[-2]
-    repo = parts[-1]
+    repo_name = parts[-1]
 
-    url = "https://api.github.com/graphql"
+    # Headers for authentication
     headers = {}
-    if token:  # Add token to header if it's provided
+    if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    # GraphQL query with pagination
-    query = """
-    query($owner: String!, $repo: String!) {
+    tree_api_url = f"{api_base_url}/repos/{owner}/{repo_name}/git/trees/{quote(tree_sha)}"
+    tree_response = github_get(tree_api_url, headers=headers)
+
+    if tree_response.status_code != 200:
+        print(f"Error: Unable to fetch subtree {prefix or '/'} (Status code {tree_response.status_code}: {tree_response.text})")
+        return None
+
+    tree_data = tree_response.json()
+    if tree_data.get('truncated'):
+        print(f"Warning: Subtree {prefix or '/'} has too many entries and was truncated by the API")
+
+    return [filter_tree_item(item, prefix) for item in tree_data.get('tree', [])]
+
+# Maximum number of entries listed when walking a tree one subtree at a time
+max_tree_entries = 1000000
+# Maximum number of subtrees fetched at the same time
+max_tree_workers = 8
+
+# Fetches all of the paths of the files present in the specified repo one subtree at a time (breadth-first, in parallel)
+# Used when the tree is too large for the recursive tree API; stops listing new subtrees after max_entries entries
+# Returns an error message if any of the subtrees couldn't be fetched (the listing would be missing its files)
+def walk_repo_tree(repo_url, default_branch, token=None, max_entries=None, max_workers=None):
+    max_entries = max_entries or max_tree_entries
+    max_workers = max_workers or max_tree_workers
+
+    file_path_data = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Future -> path of the subtree it is fetching
+        pending = {submit_in_context(executor, get_subtree, repo_url, default_branch, '', token): ''}
+        capped = False
+        failed = None
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                prefix = pending.pop(future)
+                items = future.result()
+                # A subtree is missing, drop the subtrees that are still pending
+                if items is None:
+                    failed = prefix
+                    for other in pending:
+                        other.cancel()
+                    pending.clear()
+                    break
+
+                for item in items:
+                    if len(file_path_data) >= max_entries:
+                        capped = True
+                        break
+                    file_path_data.append(item)
+                    # Walk into the subtree
+                    if item.get('type') == 'tree' and 'sha' in item:
+                        prefix = item['path'] + '/'
+                        pending[submit_in_context(executor, get_subtree, repo_url, item['sha'], prefix, token)] = prefix
+
+                # No more room, drop the subtrees that are still pending
+                if capped:
+                    for other in pending:
+                        other.cancel()
+                    pending.clear()
+                    break
+
+    if failed is not None:
+        return f"Error: Unable to fetch the repository's file path data (subtree {failed or '/'} couldn't be fetched)"
+    if capped:
+        print(f"Warning: The repository's tree has more than {max_entries} entries, only the first ones were listed")
+
+    # Same order as the recursive tree API (each tree followed by its contents)
+    file_path_data.sort(key=lambda item: item.get('path', '').split('/'))
+    return file_path_data
+
+# Query that fetches the name of the submodules used at the HEAD of a repo
+submodules_query = """
+    query FetchSubmodules($owner: String!, $repo: String!, $expression: String!) {
         repository(owner: $owner, name: $repo) {
-            object(expression: "HEAD") {
+            object(expression: $expression) {
                 ... on Commit {
                     submodules(first: 100) {  # Add pagination
                         nodes {
@@ -219,49 +498,304 @@ def get_submodules(repo_url, token):
         }
     }
     """
-    variables = {"owner": owner, "repo": repo}
-    response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
 
-    if response.status_code == 200:
-        data = response.json()
-        #pprint.pprint(data)  # Debugging: Print the full response
+# Extracts the names of the submodules from the response to submodules_query
+def parse_submodules_response(data):
+    # Safely extract submodules
+    repository_data = data.get("data", {}).get("repository", {})
+    if not repository_data:
+        print("Repository not found or access denied.")
+        return []
 
-        # Safely extract submodules
-        repository_data = data.get("data", {}).get("repository", {})
-        if not repository_data:
-            print("Repository not found or access denied.")
-            return []
+    commit_object = repository_data.get("object", {})
+    if not commit_object:
+        print("No commit found for the given repository.")
+        return []
 
-        commit_object = repository_data.get("object", {})
-        if not commit_object:
-            print("No commit found for the given repository.")
-            return []
+    submodules = commit_object.get("submodules", {}).get("nodes", [])
+    return [submodule["name"] for submodule in submodules]
 
-        submodules = commit_object.get("submodules", {}).get("nodes", [])
-        return [submodule["name"] for submodule in submodules]
+# Fetches the name of the submodules used in the specified repo through a query request to the GitHub GraphQL API
+# ref: commit (or branch) to read the submodules of, HEAD by default
+def get_submodules(repo_url, token, ref=None):
+    # Extract owner and repo name from URL
+    parts = repo_url.rstrip('/').split('/')
+    owner = parts[-2]
+    repo = parts[-1]
+
+    url = graphql_url
+    headers = {}
+    if token:  # Add token to header if it's provided
+        headers["Authorization"] = f"Bearer {token}"
+
+    # GraphQL query with pagination
+    variables = {"owner": owner, "repo": repo, "expression": ref or "HEAD"}
+    response = github_post(url, json={"query": submodules_query, "variables": variables}, headers=headers)
+
+    if response.status_code == 200:
+        data = response.json()
+        #pprint.pprint(data)  # Debugging: Print the full response
+        return parse_submodules_response(data)
     else:
         print(f"Error: {response.status_code}")
         print(response.text)
         return []
     
+# README file names looked up at the root of the repo by the overview query (in order of preference)
+readme_candidates = ["README.md", "README", "README.rst", "README.txt", "readme.md", "Readme.md", "README.markdown"]
+
+# Builds the tree entries selection of the overview query, nesting subtrees up to the specified depth
+def build_tree_entries_query(depth):
+    selection = "entries { path type oid object { ... on Blob { byteSize }"
+    if depth > 1:
+        selection += " ... on Tree { " + build_tree_entries_query(depth - 1) + " }"
+    return selection + " } }"
+
+# Builds the query that fetches the metadata, languages, README (if include_readme), submodules and tree of a repo all at once
+def build_overview_query(tree_depth=1, include_readme=True):
+    readme_queries = "\n".join(
+        f'readme_{index}: object(expression: "HEAD:{name}") {{ ... on Blob {{ text }} }}'
+        for index, name in enumerate(readme_candidates)
+    ) if include_readme else ""
+    query = f"""
+    query FetchRepoOverview($owner: String!, $repo: String!) {{
+      repository(owner: $owner, name: $repo) {{
+        databaseId
+        name
+        nameWithOwner
+        owner {{ login }}
+        description
+        url
+        homepageUrl
+        isPrivate
+        isFork
+        isArchived
+        createdAt
+        updatedAt
+        pushedAt
+        diskUsage
+        stargazerCount
+        forkCount
+        primaryLanguage {{ name }}
+        licenseInfo {{ key name spdxId }}
+        languages(first: 100, orderBy: {{field: SIZE, direction: DESC}}) {{
+          edges {{ size node {{ name }} }}
+        }}
+        defaultBranchRef {{
+          name
+          target {{
+            ... on Commit {{
+              oid
+              submodules(first: 100) {{ nodes {{ name }} }}
+              tree {{ {build_tree_entries_query(tree_depth)} }}
+            }}
+          }}
+        }}
+        {readme_queries}
+      }}
+    }}
+    """
+    return query
+
+# Flattens the (possibly nested) tree entries of the overview query into the format returned by get_repo_files
+def flatten_tree_entries(entries, owner, repo_name, file_path_data=None):
+    if file_path_data is None:
+        file_path_data = []
+
+    for entry in entries:
+        item = {"path": entry["path"], "type": entry["type"]}
+        # Same API URL the REST tree endpoint gives for blobs and trees
+        if entry["type"] in ("blob", "tree"):
+            item["url"] = f"{api_base_url}/repos/{owner}/{repo_name}/git/{entry['type']}s/{entry['oid']}"
+        item["sha"] = entry["oid"]
+        if (entry.get("object") or {}).get("byteSize") is not None:
+            item["size"] = entry["object"]["byteSize"]
+        file_path_data.append(item)
+
+        sub_entries = (entry.get("object") or {}).get("entries")
+        if sub_entries:
+            flatten_tree_entries(sub_entries, owner, repo_name, file_path_data)
+
+    return file_path_data
+
+# Whether the (possibly nested) tree entries of the overview query have trees whose entries weren't listed (past its depth)
+def has_unlisted_subtrees(entries):
+    for entry in entries:
+        if entry["type"] != "tree":
+            continue
+        sub_entries = (entry.get("object") or {}).get("entries")
+        if sub_entries is None or has_unlisted_subtrees(sub_entries):
+            return True
+    return False
+
+# Fetches the repo data, languages, README, submodules and tree in a single query request to the GitHub GraphQL API
+# The tree is only listed up to tree_depth levels, 'tree_complete' is False if it goes deeper
+def get_repo_overview(repo_url, token, tree_depth=1, include_readme=True):
+    # Extract owner and repo name from URL
+    parts = repo_url.rstrip('/').split('/')
+    owner = parts[-2]
+    repo = parts[-1]
+
+    url = graphql_url
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    query = build_overview_query(tree_depth, include_readme)
+    variables = {"owner": owner, "repo": repo}
+    response = github_post(url, json={"query": query, "variables": variables}, headers=headers)
+
+    if response.status_code != 200:
+        print(f"Error: Unable to fetch repository overview (Status code {response.status_code}: {response.text})")
+        return response.status_code
+
+    response = response.json()
+    repository = (response.get("data") or {}).get("repository")
+    if not repository:
+        print("Error: Unable to fetch repository overview:", response.get('errors'))
+        # Same status code the REST API gives for missing or inaccessible repos
+        return 404
+
+    # Repo data, using the same keys as the REST API (get_repo_data)
+    branch_ref = repository.get("defaultBranchRef") or {}
+    repo_data = {
+        "id": repository["databaseId"],
+        "name": repository["name"],
+        "full_name": repository["nameWithOwner"],
+        "owner": {"login": repository["owner"]["login"]},
+        "description": repository["description"],
+        "html_url": repository["url"],
+        "homepage": repository["homepageUrl"],
+        "private": repository["isPrivate"],
+        "fork": repository["isFork"],
+        "archived": repository["isArchived"],
+        "created_at": repository["createdAt"],
+        "updated_at": repository["updatedAt"],
+        "pushed_at": repository["pushedAt"],
+        "size": repository["diskUsage"],
+        "stargazers_count": repository["stargazerCount"],
+        "forks_count": repository["forkCount"],
+        "language": (repository.get("primaryLanguage") or {}).get("name"),
+        "license": repository["licenseInfo"],
+        "default_branch": branch_ref.get("name"),
+    }
+
+    # {language: bytes}, like the REST API (get_repo_languages)
+    languages = {edge["node"]["name"]: edge["size"] for edge in repository["languages"]["edges"]}
+
+    readme = None
+    for index in range(len(readme_candidates)):
+        blob = repository.get(f"readme_{index}")
+        if blob and blob.get("text") is not None:
+            readme = blob["text"]
+            break
+    if readme is None and include_readme:
+        readme = "Error: Unable to fetch README. No README file was found at the root of the repository"
+
+    commit = branch_ref.get("target") or {}
+    submodules = [submodule["name"] for submodule in commit.get("submodules", {}).get("nodes", [])]
+    tree_entries = commit.get("tree", {}).get("entries", [])
+    file_path_data = FileTree.from_entries(
+        flatten_tree_entries(tree_entries, owner, repo),
+        f"{api_base_url}/repos/{owner}/{repo}/git/",
+    )
+
+    return {
+        "repo_data": repo_data,
+        "languages": languages,
+        "readme": readme,
+        "submodules": submodules,
+        "file_path_data": file_path_data,
+        "tree_complete": not has_unlisted_subtrees(tree_entries),
+        "commit_sha": commit.get("oid"),
+    }
+
+# Maximum number of bytes of file content requested in a single dependency files query
+max_batch_bytes = 2 * 1024 * 1024
+# Size assumed for files whose size is not known
+default_file_size = 16 * 1024
+# Maximum number of dependency files queries made at the same time
+max_parallel_batches = 4
+# Files bigger than this (in bytes) are downloaded raw instead of through GraphQL, which would truncate them
+max_graphql_file_bytes = 512 * 1024
+# Raw downloads bigger than this (in bytes) are abandoned
+max_raw_file_bytes = 20 * 1024 * 1024
+
 #  Split a dictionary of {file_type: [paths]} into batches
-def split_into_batches(data, batch_size=100):
+#  A batch is closed when it reaches batch_size files or when the known sizes of its files ({path: bytes}) reach max_bytes
+def split_into_batches(data, batch_size=100, file_sizes=None, max_bytes=max_batch_bytes):
+    file_sizes = file_sizes or {}
     all_paths = []
     for file_type, paths in data.items():
         for path in paths:
             all_paths.append((file_type, path))
     
     batches = []
-    for i in range(0, len(all_paths), batch_size):
-        batch = {}
-        for (file_type, path) in all_paths[i:i+batch_size]:
-            batch.setdefault(file_type, []).append(path)
+    batch = {}
+    batch_count = 0
+    batch_bytes = 0
+    for (file_type, path) in all_paths:
+        size = file_sizes.get(path, default_file_size)
+        # Close the current batch if this file doesn't fit (a file bigger than max_bytes gets a batch of its own)
+        if batch and (batch_count >= batch_size or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch = {}
+            batch_count = 0
+            batch_bytes = 0
+        batch.setdefault(file_type, []).append(path)
+        batch_count += 1
+        batch_bytes += size
+    if batch:
         batches.append(batch)
     return batches
 
+# Splits a batch in two halves with (about) the same number of files
+def split_batch(batch):
+    all_paths = [(file_type, path) for file_type, paths in batch.items() for path in paths]
+    half = len(all_paths) // 2
+    halves = []
+    for part in (all_paths[:half], all_paths[half:]):
+        new_batch = {}
+        for (file_type, path) in part:
+            new_batch.setdefault(file_type, []).append(path)
+        halves.append(new_batch)
+    return halves
+
+# Matchers are built once for each list of targets (the configured one is precompiled by the registry)
+@lru_cache(maxsize=8)
+def get_dependency_file_matcher(targets):
+    config = get_config()
+    if targets == config.dependency_file_targets:
+        return config.target_matcher
+    return DependencyFileMatcher(targets)
+
+# Finds which of the targeted dependency files a path is (None if it isn't one)
+def match_dependency_file(path,targets):
+    return get_dependency_file_matcher(tuple(targets)).match(path)
+
 # Finds the path of all of the targeted dependency files present in the specified repo
 def find_dependency_files(file_path_data,targets):
     target_files = {}
+    matcher = get_dependency_file_matcher(tuple(targets))
+
+    # File trees only check each distinct file name once
+    if isinstance(file_path_data, FileTree):
+        for path, dep_file in file_path_data.match_blob_names(matcher.match):
+            target_files.setdefault(dep_file, []).append(path)
+        return target_files
+
+    # Sort them by list
+    for file in file_path_data:
+        if file['type'] == 'blob':
+            dep_file = matcher.match(file['path'])
+            if dep_file:
+                target_files.setdefault(dep_file, []).append(file['path'])
+    
+    return target_files
+
+# Old version of previous function (substring search of every target in every path)
+def old_find_dependency_files(file_path_data,targets):
+    target_files = {}
 
 
     # Sort them by list
@@ -274,6 +808,42 @@ def find_dependency_files(file_path_data,targets):
     
     return target_files
 
+# Analysis depths: 'deep' fetches every targeted dependency file; 'fast' only fetches the ones of the ecosystems of the
+# languages GitHub reports for the repo, and skips lockfiles that sit next to their manifest (e.g. a yarn.lock next to a package.json)
+analysis_depths = ['fast', 'deep']
+default_analysis_depth = 'deep'
+
+# Fields of the scraper result that no later stage of the pipeline reads (the processor and translator only use the repo
+# data, languages, submodules and dependency files): they are only fetched, or kept, when asked for through 'extras'
+extra_fields = ['readme', 'file_path_data']
+
+# Narrows the found dependency files down to the ones fetched at the specified analysis depth
+def select_dependency_files(target_files, languages, depth, data_json):
+    if depth != 'fast':
+        return target_files
+
+    # Without languages (e.g. the call failed) no ecosystem is left out
+    if languages:
+        repo_languages = {language.replace(" ", "_") for language in languages}
+        file_languages = data_json["dependency_file_languages"]
+        target_files = {
+            file_type: paths for file_type, paths in target_files.items()
+            if file_type not in file_languages
+            or any(language.replace(" ", "_") in repo_languages for language in file_languages[file_type])
+        }
+
+    # Directories of each manifest that was found
+    manifest_dirs = {file_type: {path.rpartition('/')[0] for path in paths} for file_type, paths in target_files.items()}
+
+    selected = {}
+    for file_type, paths in target_files.items():
+        manifest = data_json["lockfile_manifests"].get(file_type)
+        if manifest in manifest_dirs:
+            paths = [path for path in paths if path.rpartition('/')[0] not in manifest_dirs[manifest]]
+        if paths:
+            selected[file_type] = paths
+    return selected
+
 # Builds the entire dependency files query
 def build_dependency_query(target_files, default_branch):
     file_queries = []
@@ -305,64 +875,174 @@ def build_dependency_query(target_files, default_branch):
     #print(query)
     return query, alias_map
 
-# Fetches the content of the targeted dependency files in the specified repo through a query request to the GitHub GraphQL API
-def get_dependencies(repo_url, token, target_files, default_branch):
+# Paths of the found dependency files (None: every path)
+def get_target_paths(target_files):
+    if target_files is None:
+        return None
+    return {path for paths in target_files.values() for path in paths}
+
+# Maps the path of each blob in the file path data (only of the target files, if specified) to its git blob SHA
+def get_blob_shas(file_path_data, target_files=None):
+    paths = get_target_paths(target_files)
+    return {file['path']: file['sha'] for file in file_path_data if file.get('type') == 'blob' and 'sha' in file and (paths is None or file['path'] in paths)}
+
+# Maps the path of each blob in the file path data (only of the target files, if specified) to its size (in bytes)
+def get_blob_sizes(file_path_data, target_files=None):
+    paths = get_target_paths(target_files)
+    return {file['path']: file['size'] for file in file_path_data if file.get('type') == 'blob' and 'size' in file and (paths is None or file['path'] in paths)}
+
+# Types of the GraphQL errors a smaller query may not run into (GitHub's timeouts come without a type)
+retryable_graphql_errors = {"TIMEOUT", "RESOURCE_LIMITS_EXCEEDED", "MAX_NODE_LIMIT_EXCEEDED"}
+
+def retryable_graphql_error(error):
+    if error.get("type") is None:
+        return "timeout" in str(error.get("message", "")).lower()
+    return error["type"] in retryable_graphql_errors
+
+# Splits the result of a dependency files query into the blobs it returned ([(file_info, blob)], files that don't exist are
+# left out) and the files to fetch again ({file_type: [paths]}, the ones a timeout or resource limit error left without data)
+# Errors that won't go away by retrying (rate limits, missing repo, permissions, ...) are raised
+def dependency_batch_result(result, alias_map):
+    errors = result.get("errors") or []
+    fatal = [error for error in errors if not retryable_graphql_error(error)]
+    if fatal:
+        raise Exception(f"Query failed: {fatal}")
+
+    data = (result.get("data") or {}).get("repository") or {}
+    # Errors point to the alias they are about, if it is only one of them
+    failed_aliases = {error["path"][1] for error in errors if len(error.get("path") or []) > 1}
+
+    blobs = []
+    retry = {}
+    for alias, file_info in alias_map.items():
+        if errors and (alias not in data or alias in failed_aliases):
+            retry.setdefault(file_info["file_type"], []).append(file_info["path"])
+        elif data.get(alias) is not None:
+            blobs.append((file_info, data[alias]))
+
+    if retry:
+        print("Error in batch, the files it left out will be split and retried:", errors)
+    return blobs, retry
+
+# Fetches the content of a single batch of dependency files through a query request to the GitHub GraphQL API
+# Returns a list of (file_type, entry) and the files of the batch that may work with a smaller batch ({file_type: [paths]},
+# empty if there are none)
+def fetch_dependency_batch(repo_url, token, batch, default_branch):
     # Extract owner and repo name from URL
     parts = repo_url.rstrip('/').split('/')
     owner = parts[-2]
     repo = parts[-1]
 
-    url = "https://api.github.com/graphql"
+    url = graphql_url
     headers = {}
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    # Split target files into batches
-    batches = split_into_batches(target_files)
+    query, alias_map = build_dependency_query(batch, default_branch)
 
-    results = {}    
+    variables = {"owner": owner, "repo": repo}
+    response = github_post(url, json={"query": query, "variables": variables}, headers=headers)
 
-    for batch in batches:    
-        query, alias_map = build_dependency_query(batch, default_branch)
-    
-        variables = {"owner": owner, "repo": repo}
-        response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
-
-        if response.status_code == 200:
-            response = response.json()
-
-            # No errors from the query result
-            if 'errors' not in response:
-                data = response["data"]["repository"]
-
-                # Build a result dict with file info and content, crossreferencing the content with its path of origi
-                for alias, file_info in alias_map.items():
-                    blob = data.get(alias)
-                    if blob is not None:
-                        #if file_info["path"] == 'yarn.lock':
-                            #print(blob.get("text"))
-                        # If content is not complete, make seperate API call to fetch full contents
-                        if blob.get("isTruncated"):
-                            content = get_file_content(repo_url,file_info["path"],token)
-                            entry = {
-                                "path": file_info["path"],
-                                "text": content if blob else None,
-                                "isTruncated": "Not anymore" if blob else None
-                            }
-                        else:
-                            entry = {
-                                "path": file_info["path"],
-                                "text": blob.get("text") if blob else None,
-                                "isTruncated": blob.get("isTruncated") if blob else None
-                            }
-                        
-                        # Add to list of corresponding file type
-                        results.setdefault(file_info["file_type"], []).append(entry)
-            else: 
-                print("Error in batch or Repository has no dependency files:", response.get('errors'))
+    # Authentication and permission errors won't go away by retrying
+    if response.status_code in (401, 403, 404):
+        raise Exception(f"Query failed with status code {response.status_code}. {response.text}")
+    elif response.status_code != 200:
+        print(f"Error in batch (Status code {response.status_code}), it will be split and retried")
+        return [], batch
+
+    # Keep what the query returned, errors from the query result (timeouts, response size limits, ...) only retry the rest
+    blobs, retry = dependency_batch_result(response.json(), alias_map)
+    entries = []
+
+    # Build a result dict with file info and content, crossreferencing the content with its path of origin
+    for file_info, blob in blobs:
+        # If content is not complete, download the full contents
+        if blob.get("isTruncated"):
+            content = download_raw_file(repo_url,file_info["path"],token,default_branch)
+            entry = {"path": file_info["path"], "text": content, "isTruncated": "Not anymore"}
         else:
-            raise Exception(f"Query failed with status code {response.status_code}. {response.text}")
-        
+            entry = {"path": file_info["path"], "text": blob.get("text"), "isTruncated": blob.get("isTruncated")}
+        entries.append((file_info["file_type"], entry))
+
+    return entries, retry
+
+# Downloads a dependency file too big for GraphQL, returning it in the same format as fetch_dependency_batch
+def fetch_large_dependency_file(repo_url, token, file_type, path, default_branch):
+    content = download_raw_file(repo_url, path, token, default_branch)
+    if content is None:
+        return [], {}
+    return [(file_type, {"path": path, "text": content, "isTruncated": False})], {}
+
+# Fetches the content of the targeted dependency files in the specified repo through query requests to the GitHub GraphQL API
+# Files whose blob SHA (blob_shas: {path: sha}) is already in the blob store are not fetched again
+# Batches are sized by the files' sizes (file_sizes: {path: bytes}) and fetched in parallel; the files a batch couldn't fetch
+# (timeouts, resource limits) are split in two and retried, down to single files, which are then downloaded raw. Files too
+# big for GraphQL are downloaded raw directly
+def get_dependencies(repo_url, token, target_files, default_branch, blob_shas=None, file_sizes=None, parallel_batches=max_parallel_batches):
+    blob_shas = blob_shas or {}
+    store = get_shared_store()
+    results = {}
+
+    file_sizes = file_sizes or {}
+
+    # Take the files that are already stored out of the ones to fetch, and separate the ones too big for GraphQL
+    files_to_fetch = {}
+    large_files = []
+    for file_type, paths in target_files.items():
+        for path in paths:
+            sha = blob_shas.get(path)
+            text = store.get_text(sha) if sha else None
+            if text is not None:
+                results.setdefault(file_type, []).append({"path": path, "text": text, "isTruncated": False, "sha": sha})
+            elif file_sizes.get(path, 0) > max_graphql_file_bytes:
+                large_files.append((file_type, path))
+            else:
+                files_to_fetch.setdefault(file_type, []).append(path)
+
+    # Split target files into batches
+    batches = split_into_batches(files_to_fetch, file_sizes=file_sizes)
+
+    fetched = []
+    with ThreadPoolExecutor(max_workers=parallel_batches) as executor:
+        # Future -> batch it is fetching (a large file is a batch of its own, downloaded raw)
+        pending = {submit_in_context(executor, fetch_dependency_batch, repo_url, token, batch, default_branch): batch for batch in batches}
+        for file_type, path in large_files:
+            pending[submit_in_context(executor, fetch_large_dependency_file, repo_url, token, file_type, path, default_branch)] = {file_type: [path]}
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                entries, batch = future.result()
+                fetched.extend(entries)
+                if not batch:
+                    continue
+                if sum(len(paths) for paths in batch.values()) > 1:
+                    # Retry each half of the files the batch couldn't fetch
+                    for half in split_batch(batch):
+                        pending[submit_in_context(executor, fetch_dependency_batch, repo_url, token, half, default_branch)] = half
+                else:
+                    # A single file that can't be fetched through GraphQL
+                    for file_type, paths in batch.items():
+                        content = download_raw_file(repo_url,paths[0],token,default_branch)
+                        if content is not None:
+                            fetched.append((file_type, {"path": paths[0], "text": content, "isTruncated": False}))
+
+    for file_type, entry in fetched:
+        # Store the fetched content by its blob SHA, so it can be reused by any repo that has the same blob
+        sha = blob_shas.get(entry["path"])
+        if sha:
+            entry["sha"] = sha
+            store.put_text(sha, entry["text"])
+
+        # Add to list of corresponding file type
+        results.setdefault(file_type, []).append(entry)
+
+    # Keep the files of each type in the same order as target_files, whatever order they were fetched in
+    for file_type, entries in results.items():
+        order = {path: index for index, path in enumerate(target_files.get(file_type, []))}
+        entries.sort(key=lambda entry: order.get(entry["path"], len(order)))
+
     return results
     
 # Old version of previous function
@@ -372,7 +1052,7 @@ def old_get_dependencies(repo_url, token, languages):
     owner = parts[-2]
     repo = parts[-1]
 
-    url = "https://api.github.com/graphql"
+    url = graphql_url
     headers = {}
     if token:  # Add token to header if it's provided
         headers["Authorization"] = f"Bearer {token}"
@@ -488,7 +1168,7 @@ def old_get_dependencies(repo_url, token, languages):
     """
     
     variables = {"owner": owner, "repo": repo}
-    response = requests.post(url, json={"query": query, "variables": variables}, headers=headers)
+    response = github_post(url, json={"query": query, "variables": variables}, headers=headers)
     
     if response.status_code == 200:
         response = response.json()
@@ -521,12 +1201,43 @@ def save_file(repo_data):
     # Append the new data to the existing data
     existing_data.append(repo_data)
 
-    # Write the updated data back to the file
+    # Write the updated data back to the file (file trees are written as lists of entries)
     with open(filename, 'w') as f:
-        json.dump(existing_data, f, indent=4)
+        json.dump(existing_data, f, indent=4, default=list)
 
 # Scrap data from the repository
-def scrap_data(repo_url,token,debug=None):
+# depth: analysis depth ('fast' or 'deep', see select_dependency_files)
+# extras: fields of extra_fields to fetch (or keep) as well
+# ref: commit (or branch) the tree, submodules and dependency files are read from, the default branch if not specified
+# The calls made to the GitHub API are traced as one analysis, whose trace is added to the result as 'call_trace'
+def scrap_data(repo_url,token,debug=None,mode='sequential',depth=default_analysis_depth,extras=(),ref=None):
+    with call_tracer.trace_analysis(repo_url) as trace:
+        # Independent API calls are made in parallel
+        if mode == 'concurrent':
+            repo_data = scrap_data_concurrent(repo_url,token,debug,depth=depth,extras=extras,ref=ref)
+        # Repo data, languages, README, submodules and tree are fetched with a single query
+        elif mode == 'graphql':
+            repo_data = scrap_data_graphql(repo_url,token,debug,depth=depth,extras=extras,ref=ref)
+        # Tree, README, submodules and dependency files come from the repo's tarball
+        elif mode == 'tarball':
+            repo_data = scrap_data_tarball(repo_url,token,debug,depth=depth,extras=extras,ref=ref)
+        # Same calls as 'concurrent', made by coroutines on a shared asyncio event loop and connection pool
+        elif mode == 'async':
+            from .async_scraper import run_sync, scrap_data_async
+            repo_data = run_sync(scrap_data_async(repo_url,token,debug,depth=depth,extras=extras,ref=ref))
+        # Everything is read from a local working copy or bare repository (repo_url is its path, the token is not used)
+        elif mode == 'local':
+            from .local_git import scrap_data_local
+            repo_data = scrap_data_local(repo_url,debug,ref=ref or "HEAD",depth=depth,extras=extras)
+        else:
+            repo_data = scrap_data_sequential(repo_url,token,debug,depth=depth,extras=extras,ref=ref)
+
+    if type(repo_data) == dict:
+        repo_data["call_trace"] = trace.to_dict()
+    return repo_data
+
+# Fetches the data of a repo making one GitHub API call after the other
+def scrap_data_sequential(repo_url,token,debug=None,depth=default_analysis_depth,extras=(),ref=None):
     # Load data.json
     data_json = load_data_json()
     
@@ -536,10 +1247,11 @@ def scrap_data(repo_url,token,debug=None):
     if repo_data and type(repo_data) == dict:
         repo_name = repo_data.get('name')
         print(f"The repository name is: {repo_name}")
-        readme_data = get_repo_readme(repo_url,token)
+        ref = ref or repo_data.get('default_branch')
+        readme_data = get_repo_readme(repo_url,token) if 'readme' in extras else None
         lang_data = get_repo_languages(repo_url,token)
-        file_path_data = get_repo_files(repo_url,repo_data.get('default_branch'),token)
-        submodule_data = get_submodules(repo_url,token)
+        file_path_data = get_repo_files(repo_url,ref,token)
+        submodule_data = get_submodules(repo_url,token,ref)
         #dependency_files_data = get_dependencies(repo_url, token, list(lang_data.keys()))
         if lang_data:
             #print(f"Languages used:\n{lang_data}")
@@ -549,11 +1261,12 @@ def scrap_data(repo_url,token,debug=None):
             repo_data["readme"] = readme_data
         if file_path_data:
             #print(f"File path data:\n{file_path_data}")
-            repo_data["file_path_data"] = file_path_data
+            if 'file_path_data' in extras:
+                repo_data["file_path_data"] = file_path_data
             # Load types of dependency files to target
             targets = data_json["dependency_file_targets"]
-            target_files = find_dependency_files(file_path_data,targets)
-            dependency_files_data = get_dependencies(repo_url, token, target_files, repo_data.get('default_branch'))
+            target_files = select_dependency_files(find_dependency_files(file_path_data,targets), lang_data, depth, data_json)
+            dependency_files_data = get_dependencies(repo_url, token, target_files, ref, get_blob_shas(file_path_data, target_files), get_blob_sizes(file_path_data, target_files))
             if dependency_files_data:
                 #pprint.pprint(dependency_files_data)
                 repo_data["dependency_file_data"] = dependency_files_data
@@ -563,6 +1276,7 @@ def scrap_data(repo_url,token,debug=None):
         if submodule_data:
             #print(f"Submodules found:\n{submodule_data}")
             repo_data["submodules"] = submodule_data
+        repo_data["analysis_depth"] = depth
         #if dependency_files_data:
             #print(f"Dependency file data found:")
             #pprint.pprint(dependency_files_data)
@@ -576,6 +1290,285 @@ def scrap_data(repo_url,token,debug=None):
     else:
         return ('Error',repo_data)
 
+# Runs a function and returns its result along with the time it took (in seconds)
+def timed_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+# Same as scrap_data, but the calls that don't depend on each other are made in parallel through a bounded thread pool
+def scrap_data_concurrent(repo_url,token,debug=None,max_workers=4,depth=default_analysis_depth,extras=(),ref=None):
+    # Load data.json
+    data_json = load_data_json()
+    call_timings = {}
+
+    # Every other call depends on the repo's existence and default branch
+    repo_data, call_timings["get_repo_data"] = timed_call(get_repo_data,repo_url,token)
+
+    # If repo exists, is available and data was able to be fetched
+    if repo_data and type(repo_data) == dict:
+        repo_name = repo_data.get('name')
+        print(f"The repository name is: {repo_name}")
+        ref = ref or repo_data.get('default_branch')
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Future -> name of the call it is running
+            pending = {
+                submit_in_context(executor, timed_call, get_repo_languages, repo_url, token): "get_repo_languages",
+                submit_in_context(executor, timed_call, get_repo_files, repo_url, ref, token): "get_repo_files",
+                submit_in_context(executor, timed_call, get_submodules, repo_url, token, ref): "get_submodules",
+            }
+            if 'readme' in extras:
+                pending[submit_in_context(executor, timed_call, get_repo_readme, repo_url, token)] = "get_repo_readme"
+            results = {}
+
+            # Collect results as they finish, so dependency fetching starts as soon as the tree (and, at the 'fast' depth,
+            # the languages) are available
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    call = pending.pop(future)
+                    results[call], call_timings[call] = future.result()
+
+                files = results.get("get_repo_files")
+                languages_ready = depth != 'fast' or "get_repo_languages" in results
+                if "get_dependencies" not in pending.values() and "get_dependencies" not in results and languages_ready and files and type(files) == FileTree:
+                    # Load types of dependency files to target
+                    targets = data_json["dependency_file_targets"]
+                    target_files = select_dependency_files(find_dependency_files(files,targets), results.get("get_repo_languages"), depth, data_json)
+                    dependency_future = submit_in_context(executor, timed_call, get_dependencies, repo_url, token, target_files, ref, get_blob_shas(files, target_files), get_blob_sizes(files, target_files))
+                    pending[dependency_future] = "get_dependencies"
+
+        # Same keys and conditions as the sequential version
+        if results.get("get_repo_languages"):
+            repo_data["languages"] = results["get_repo_languages"]
+        if results.get("get_repo_readme"):
+            repo_data["readme"] = results["get_repo_readme"]
+        if results.get("get_repo_files"):
+            if 'file_path_data' in extras:
+                repo_data["file_path_data"] = results["get_repo_files"]
+            if results.get("get_dependencies"):
+                repo_data["dependency_file_data"] = results["get_dependencies"]
+        if results.get("get_submodules"):
+            repo_data["submodules"] = results["get_submodules"]
+
+        repo_data["analysis_depth"] = depth
+        repo_data["call_timings"] = call_timings
+        #pprint.pprint(call_timings)
+
+        if debug:
+            save_file(repo_data)
+
+        return repo_data
+    else:
+        return ('Error',repo_data)
+
+# Gets the names of the submodules declared in a .gitmodules file
+def parse_gitmodules(gitmodules_content):
+    return re.findall(r'^\s*\[submodule\s+"([^"]+)"\]', gitmodules_content, re.MULTILINE)
+
+# Computes the git blob SHA of a file's content (the same SHA the tree API gives)
+def git_blob_sha(content):
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+# Downloads the tarball of the specified repo at the specified ref through the GitHub API, reading it as a stream
+# Only the dependency files (and the README and .gitmodules at the root) are kept in memory; every other member is only listed
+def get_repo_tarball_data(repo_url, token, ref, targets):
+    # Extract owner and repo name from URL
+    parts = repo_url.rstrip('/').split('/')
+    owner = parts[-2]
+    repo_name = parts[-1]
+
+    # Construct API URL
+    api_url = f"{api_base_url}/repos/{owner}/{repo_name}/tarball/{quote(ref)}"
+
+    # Headers for authentication
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    # Members of a tarball have no API URL
+    file_path_data = FileTree()
+    dependency_files_data = {}
+    readme = None
+    gitmodules = None
+
+    with github_get(api_url, headers=headers, cached=False, stream=True) as response:
+        if response.status_code != 200:
+            print(f"Error: Unable to download the repository tarball (Status code {response.status_code}: {response.text})")
+            return response.status_code
+
+        # Read the archive as a stream, one member at a time
+        with tarfile.open(fileobj=response.raw, mode='r|gz') as tar:
+            for member in tar:
+                # Members are inside a '{owner}-{repo}-{sha}/' directory
+                path = member.name.partition('/')[2].rstrip('/')
+                if not path:
+                    continue
+
+                if member.isdir():
+                    file_path_data.append(path, "tree")
+                    continue
+                if not (member.isfile() or member.issym()):
+                    continue
+
+                dep_file = match_dependency_file(path, targets)
+                is_root_file = '/' not in path
+                if not member.isfile() or not (dep_file or (is_root_file and (path in readme_candidates or path == '.gitmodules'))):
+                    file_path_data.append(path, "blob", member.size)
+                    continue
+                if member.size > max_raw_file_bytes:
+                    print(f"Error: File {path} is too big to keep ({member.size} bytes)")
+                    file_path_data.append(path, "blob", member.size)
+                    continue
+
+                content = tar.extractfile(member).read()
+                text = content.decode('utf-8', errors='replace')
+                sha = git_blob_sha(content)
+                file_path_data.append(path, "blob", member.size, sha)
+
+                if dep_file:
+                    dependency_files_data.setdefault(dep_file, []).append({"path": path, "text": text, "isTruncated": False, "sha": sha})
+                if is_root_file and path == '.gitmodules':
+                    gitmodules = text
+                # Keep the README with the highest preference
+                if is_root_file and path in readme_candidates:
+                    if readme is None or readme_candidates.index(path) < readme_candidates.index(readme[0]):
+                        readme = (path, text)
+
+    return {
+        "file_path_data": file_path_data,
+        "dependency_file_data": dependency_files_data,
+        "readme": readme[1] if readme else "Error: Unable to fetch README. No README file was found at the root of the repository",
+        "submodules": parse_gitmodules(gitmodules) if gitmodules else [],
+    }
+
+# Same as scrap_data, but the tree, README, submodules and dependency files all come from a single download of the repo's tarball
+def scrap_data_tarball(repo_url,token,debug=None,depth=default_analysis_depth,extras=(),ref=None):
+    # Load data.json
+    data_json = load_data_json()
+
+    repo_data = get_repo_data(repo_url,token)
+
+    # If repo exists, is available and data was able to be fetched
+    if repo_data and type(repo_data) == dict:
+        repo_name = repo_data.get('name')
+        print(f"The repository name is: {repo_name}")
+        lang_data = get_repo_languages(repo_url,token)
+        # Load types of dependency files to target
+        targets = data_json["dependency_file_targets"]
+        tarball_data = get_repo_tarball_data(repo_url,token,ref or repo_data.get('default_branch'),targets)
+
+        if type(tarball_data) != dict:
+            return ('Error',tarball_data)
+
+        if lang_data:
+            repo_data["languages"] = lang_data
+        if tarball_data["readme"] and 'readme' in extras:
+            repo_data["readme"] = tarball_data["readme"]
+        if tarball_data["file_path_data"]:
+            if 'file_path_data' in extras:
+                repo_data["file_path_data"] = tarball_data["file_path_data"]
+            # Every dependency file is in the tarball, only the ones of the analysis depth are kept
+            dependency_files_data = tarball_data["dependency_file_data"]
+            target_paths = get_target_paths(select_dependency_files(
+                {file_type: [entry["path"] for entry in entries] for file_type, entries in dependency_files_data.items()},
+                lang_data, depth, data_json,
+            ))
+            dependency_files_data = {
+                file_type: [entry for entry in entries if entry["path"] in target_paths]
+                for file_type, entries in dependency_files_data.items()
+            }
+            dependency_files_data = {file_type: entries for file_type, entries in dependency_files_data.items() if entries}
+            if dependency_files_data:
+                repo_data["dependency_file_data"] = dependency_files_data
+        if tarball_data["submodules"]:
+            repo_data["submodules"] = tarball_data["submodules"]
+        repo_data["analysis_depth"] = depth
+
+        if debug:
+            save_file(repo_data)
+
+        return repo_data
+    else:
+        return ('Error',repo_data)
+
+# Same as scrap_data, but everything except the dependency files is fetched with a single GraphQL query
+# Only the top levels of the tree (up to tree_depth) are listed by the query; when the tree goes deeper, the whole tree is
+# fetched from the REST tree API instead, so dependency files in deeper directories are found too
+def scrap_data_graphql(repo_url,token,debug=None,tree_depth=1,depth=default_analysis_depth,extras=(),ref=None):
+    # Load data.json
+    data_json = load_data_json()
+
+    overview = get_repo_overview(repo_url,token,tree_depth,'readme' in extras)
+
+    # If repo exists, is available and data was able to be fetched
+    if overview and type(overview) == dict:
+        repo_data = overview["repo_data"]
+        repo_name = repo_data.get('name')
+        print(f"The repository name is: {repo_name}")
+
+        # The overview is read from the default branch, which may have moved past the requested commit since
+        if ref and overview["commit_sha"] != ref:
+            print(f"The default branch is no longer at {ref}, fetching its tree and submodules separately")
+            overview["file_path_data"] = get_repo_files(repo_url,ref,token)
+            overview["submodules"] = get_submodules(repo_url,token,ref)
+            if type(overview["file_path_data"]) != FileTree:
+                overview["file_path_data"] = None
+        elif not overview["tree_complete"]:
+            print(f"The repository's tree is more than {tree_depth} levels deep, fetching it whole")
+            overview["file_path_data"] = get_repo_files(repo_url,ref or overview["commit_sha"],token)
+            if type(overview["file_path_data"]) != FileTree:
+                overview["file_path_data"] = None
+        ref = ref or repo_data.get('default_branch')
+
+        if overview["languages"]:
+            repo_data["languages"] = overview["languages"]
+        if overview["readme"]:
+            repo_data["readme"] = overview["readme"]
+        if overview["file_path_data"]:
+            if 'file_path_data' in extras:
+                repo_data["file_path_data"] = overview["file_path_data"]
+            # Load types of dependency files to target
+            targets = data_json["dependency_file_targets"]
+            target_files = select_dependency_files(find_dependency_files(overview["file_path_data"],targets), overview["languages"], depth, data_json)
+            dependency_files_data = get_dependencies(repo_url, token, target_files, ref, get_blob_shas(overview["file_path_data"], target_files), get_blob_sizes(overview["file_path_data"], target_files))
+            if dependency_files_data:
+                repo_data["dependency_file_data"] = dependency_files_data
+        if overview["submodules"]:
+            repo_data["submodules"] = overview["submodules"]
+        repo_data["analysis_depth"] = depth
+
+        if debug:
+            save_file(repo_data)
+
+        return repo_data
+    else:
+        return ('Error',overview)
+
+# Compares the time find_dependency_files and old_find_dependency_files take on a synthetic tree (for debug)
+def benchmark_find_dependency_files(entries=500000, seed=0):
+    targets = load_data_json()["dependency_file_targets"]
+    rng = random.Random(seed)
+
+    # Mostly source files spread over nested directories, with a dependency file every ~200 entries
+    names = ["index.js", "main.py", "lib.rs", "README.md", "util.go", "App.java", "style.css", "test_utils.py", "Makefile"]
+    file_path_data = []
+    for i in range(entries):
+        directory = "/".join(f"dir{rng.randrange(50)}" for _ in range(rng.randrange(1, 6)))
+        if i % 200 == 0:
+            name = rng.choice(targets).replace(".csproj", "App.csproj").replace(".vbproj", "App.vbproj").replace(".fsproj", "App.fsproj")
+        else:
+            name = rng.choice(names)
+        file_path_data.append({"path": f"{directory}/{name}", "type": "blob"})
+
+    for function in (old_find_dependency_files, find_dependency_files):
+        start = time.perf_counter()
+        target_files = function(file_path_data, targets)
+        elapsed = time.perf_counter() - start
+        found = sum(len(paths) for paths in target_files.values())
+        print(f"{function.__name__}: {elapsed:.3f}s for {entries} entries ({found} dependency files)")
+
 # Test/Utilize the scrapper localy
 def test_scraper():
     # Example usage
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app imports its package as 'cocktail_scraper' (it runs from the app directory), so the tests do too
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
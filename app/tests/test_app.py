@@ -0,0 +1,22 @@
+import pytest
+import app as gitcocktail
+from cocktail_scraper.rate_limiter import RateLimitExceeded
+
+
+@pytest.fixture
+def client():
+    return gitcocktail.app.test_client()
+
+# A token out of budget gets a message with the time it has to wait, not an error page
+def test_generate_flashes_the_rate_limit_wait(client, monkeypatch):
+    async def rate_limited(repo_url, github_token, depth):
+        raise RateLimitExceeded(41.5)
+    monkeypatch.setattr(gitcocktail, "generate_repo_cic", rate_limited)
+
+    response = client.post('/generate', data={"repo_url": "https://github.com/owner/repo", "github_token": "token"})
+
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        [(category, message)] = session["_flashes"]
+    assert category == "error" and "42 seconds" in message
+
@@ -0,0 +1,67 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from multidict import CIMultiDict
+from cocktail_scraper.async_scraper import AsyncGitHubClient, AsyncResponse
+
+# Answers the first 'failures' requests with a 503, then with a 200
+class FlakyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    failures = 2
+    hits = 0
+
+    def log_message(self, *args):
+        pass
+
+    def answer(self):
+        FlakyHandler.hits += 1
+        status = 503 if FlakyHandler.hits <= FlakyHandler.failures else 200
+        self.send_response(status)
+        self.send_header("Content-Length", "2")
+        if status == 503:
+            self.send_header("Retry-After", "0")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def do_GET(self):
+        self.answer()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.answer()
+
+@pytest.fixture
+def flaky_url():
+    FlakyHandler.hits = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+
+@pytest.fixture
+def client():
+    client = AsyncGitHubClient()
+    yield client
+    client.close()
+
+def send(client, method, url):
+    async def request():
+        session = await client.get_session()
+        async with session.request(method, url, json={} if method == "POST" else None) as response:
+            return AsyncResponse(response.status, CIMultiDict(response.headers), await response.read())
+    return client.submit(client.request(method, url, request)).result()
+
+
+def test_get_is_retried_on_server_errors(client, flaky_url):
+    response = send(client, "GET", flaky_url)
+
+    assert (response.status_code, response.transport_retries) == (200, 2)
+    stats = client.get_stats()
+    assert (stats["requests"], stats["retries"]) == (3, 2)
+    # The retries go through the connection the first request opened
+    assert (stats["connections"], stats["reused_connections"]) == (1, 2)
+
+def test_post_is_not_retried(client, flaky_url):
+    response = send(client, "POST", flaky_url)
+
+    assert (response.status_code, response.transport_retries) == (503, 0)
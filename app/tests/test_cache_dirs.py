@@ -0,0 +1,18 @@
+import os
+import stat
+import pytest
+from cocktail_scraper import blob_store, config, http_cache
+
+
+def test_default_dirs_are_in_the_app_cache_dir():
+    assert os.path.dirname(http_cache.default_cache_dir) == config.app_cache_dir
+    assert os.path.dirname(blob_store.default_store_dir) == config.app_cache_dir
+
+# The caches hold private repo contents, so other users of the machine can't list or read them
+@pytest.mark.parametrize("create", [http_cache.HTTPCache, blob_store.BlobStore])
+def test_cache_dirs_are_only_accessible_to_their_user(tmp_path, create):
+    path = tmp_path / "gitcocktail" / "cache"
+
+    create(str(path))
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
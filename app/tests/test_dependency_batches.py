@@ -0,0 +1,90 @@
+import re
+import pytest
+from cocktail_scraper import blob_store, scraper
+
+def alias_map(*paths):
+    return {f"requirements_txt_{index}": {"file_type": "requirements.txt", "path": path} for index, path in enumerate(paths)}
+
+
+def test_batch_result_keeps_blobs_and_skips_missing_files():
+    aliases = alias_map("a/requirements.txt", "b/requirements.txt")
+    result = {"data": {"repository": {"requirements_txt_0": {"text": "flask\n", "isTruncated": False}, "requirements_txt_1": None}}}
+
+    blobs, retry = scraper.dependency_batch_result(result, aliases)
+
+    assert [file_info["path"] for file_info, _ in blobs] == ["a/requirements.txt"]
+    assert retry == {}
+
+def test_batch_result_retries_only_what_a_timeout_left_out():
+    aliases = alias_map("a/requirements.txt", "b/requirements.txt", "c/requirements.txt")
+    result = {
+        "data": {"repository": {"requirements_txt_0": {"text": "flask\n", "isTruncated": False}, "requirements_txt_1": None}},
+        "errors": [{"message": "Something went wrong while executing your query. This may be the result of a timeout"}],
+    }
+
+    blobs, retry = scraper.dependency_batch_result(result, aliases)
+
+    assert [file_info["path"] for file_info, _ in blobs] == ["a/requirements.txt"]
+    assert retry == {"requirements.txt": ["c/requirements.txt"]}
+
+def test_batch_result_retries_the_alias_an_error_points_to():
+    aliases = alias_map("a/requirements.txt", "b/requirements.txt")
+    result = {
+        "data": {"repository": {"requirements_txt_0": {"text": "flask\n", "isTruncated": False}, "requirements_txt_1": None}},
+        "errors": [{"type": "RESOURCE_LIMITS_EXCEEDED", "path": ["repository", "requirements_txt_1"], "message": "Too big"}],
+    }
+
+    blobs, retry = scraper.dependency_batch_result(result, aliases)
+
+    assert [file_info["path"] for file_info, _ in blobs] == ["a/requirements.txt"]
+    assert retry == {"requirements.txt": ["b/requirements.txt"]}
+
+@pytest.mark.parametrize("error_type", ["RATE_LIMITED", "NOT_FOUND", "FORBIDDEN"])
+def test_batch_result_raises_errors_retrying_wont_fix(error_type):
+    result = {"data": None, "errors": [{"type": error_type, "message": "No"}]}
+
+    with pytest.raises(Exception, match=error_type):
+        scraper.dependency_batch_result(result, alias_map("requirements.txt"))
+
+
+class QueryResponse(object):
+
+    def __init__(self, result):
+        self.status_code = 200
+        self.result = result
+
+    def json(self):
+        return self.result
+
+# A batch that times out after returning its first file is retried without that file, down to single files, which are
+# downloaded raw
+def test_get_dependencies_only_refetches_the_files_left_out(tmp_path, monkeypatch):
+    paths = [f"dir{index}/requirements.txt" for index in range(4)]
+    queried = []
+    downloaded = []
+
+    def download(repo_url, path, token=None, ref=None, max_bytes=None):
+        downloaded.append(path)
+        return path
+
+    def post(url, headers=None, json=None):
+        aliases = re.findall(r'(\w+): object\(expression: "main:([^"]+)"\)', json["query"])
+        queried.append([path for _, path in aliases])
+        if len(aliases) == 1:
+            return QueryResponse({"data": {"repository": {aliases[0][0]: {"text": aliases[0][1], "isTruncated": False}}}})
+        return QueryResponse({
+            "data": {"repository": {aliases[0][0]: {"text": aliases[0][1], "isTruncated": False}}},
+            "errors": [{"message": "timeout"}],
+        })
+
+    monkeypatch.setattr(scraper, "github_post", post)
+    monkeypatch.setattr(scraper, "download_raw_file", download)
+    monkeypatch.setattr(blob_store, "shared_store", blob_store.BlobStore(str(tmp_path)))
+
+    results = scraper.get_dependencies("https://github.com/owner/repo", None, {"requirements.txt": paths}, "main", parallel_batches=1)
+
+    assert [entry["text"] for entry in results["requirements.txt"]] == paths
+    assert queried[0] == paths
+    # Files a query returned are never asked for again
+    fetched_by_query = [query[0] for query in queried]
+    assert sorted(fetched_by_query + downloaded) == paths
@@ -0,0 +1,204 @@
+import json
+import textwrap
+import pytest
+from cocktail_scraper import blob_store, data_processor, dependencies_parser, http_cache, scraper
+from cocktail_scraper.fake_github import FakeGitHub, default_fixtures_dir, load_fixtures
+from cocktail_scraper.parser_pool import ParserPool
+
+fixture_repo = "gitcocktail-fixtures/polyglot-shop"
+
+def names(dependencies):
+    return [dependency["name"] for dependency in dependencies]
+
+def lockfile(text):
+    return textwrap.dedent(text).lstrip("\n")
+
+
+def test_package_lock_v3_skips_workspaces_and_links():
+    lock = json.dumps({
+        "name": "app",
+        "lockfileVersion": 3,
+        "packages": {
+            "": {"name": "app", "workspaces": ["packages/*"], "dependencies": {"a": "^1.0.0"}},
+            "node_modules/a": {"version": "1.0.0", "dependencies": {"b": "^2.0.0"}},
+            "node_modules/@scope/b": {"version": "2.0.0"},
+            "node_modules/a/node_modules/@scope/b": {"version": "1.0.0"},
+            "node_modules/a/node_modules/c": {"version": "3.0.0", "dependencies": {"name": "not-a-package"}},
+            "node_modules/ui": {"resolved": "packages/ui", "link": True},
+            "packages/ui": {"name": "ui", "version": "0.1.0", "dependencies": {"a": "^1.0.0"}},
+        },
+    })
+
+    assert names(dependencies_parser.js_packageLock(lock)) == ["a", "@scope/b", "c"]
+
+def test_package_lock_v2_prefers_packages_over_dependencies():
+    lock = json.dumps({
+        "lockfileVersion": 2,
+        "packages": {"": {"name": "app"}, "node_modules/a": {"version": "1.0.0"}},
+        "dependencies": {"a": {"version": "1.0.0"}, "legacy-only": {"version": "1.0.0"}},
+    })
+
+    assert names(dependencies_parser.js_packageLock(lock)) == ["a"]
+
+def test_package_lock_v1_nested_dependencies():
+    lock = json.dumps({
+        "name": "app",
+        "lockfileVersion": 1,
+        "dependencies": {
+            "a": {
+                "version": "1.0.0",
+                "requires": {"b": "^2.0.0"},
+                "dependencies": {"b": {"version": "2.0.0", "dependencies": {"@scope/c": {"version": "3.0.0"}}}},
+            },
+            "b": {"version": "1.0.0"},
+            "d": {"version": "4.0.0", "dev": True},
+        },
+    }, indent=2)
+
+    assert names(dependencies_parser.js_packageLock(lock)) == ["a", "b", "@scope/c", "d"]
+
+def test_gemfile_lock_gem_and_git_specs_without_path():
+    lock = lockfile("""
+        GIT
+          remote: https://github.com/example/theme.git
+          revision: 0123456789abcdef0123456789abcdef01234567
+          specs:
+            theme (0.3.0)
+              rails (>= 7.0)
+
+        PATH
+          remote: engines/checkout
+          specs:
+            checkout (0.1.0)
+              rack (>= 2.0)
+
+        GEM
+          remote: https://rubygems.org/
+          specs:
+            rack (3.0.9)
+            rails (7.1.3)
+              rack (>= 2.2.4)
+            theme (0.3.0)
+
+        PLATFORMS
+          ruby
+
+        DEPENDENCIES
+          checkout!
+          rails (~> 7.1)
+          theme!
+
+        BUNDLED WITH
+           2.5.6
+        """)
+
+    assert names(dependencies_parser.ruby_gemfileLock(lock)) == ["theme", "rack", "rails"]
+
+def test_gemfile_lock_windows_line_endings():
+    lock = "GEM\r\n  remote: https://rubygems.org/\r\n  specs:\r\n    rack (3.0.9)\r\n      base64 (>= 0)\r\n\r\nDEPENDENCIES\r\n  rack\r\n"
+
+    assert names(dependencies_parser.ruby_gemfileLock(lock)) == ["rack"]
+
+def test_composer_lock_packages_and_dev_packages():
+    lock = json.dumps({
+        "_readme": ["This file locks the dependencies of your project to a known state"],
+        "packages": [
+            {"name": "vendor/a", "version": "1.0.0", "authors": [{"name": "Someone"}], "require": {"php": ">=8.1"}},
+            {"name": "vendor/b", "version": "2.0.0", "extra": {"name": "not-a-package"}},
+        ],
+        "packages-dev": [{"name": "vendor/c", "version": "3.0.0"}, {"name": "vendor/a", "version": "1.0.0"}],
+        "platform": {"php": ">=8.1"},
+    }, indent=4)
+
+    assert names(dependencies_parser.php_composerLock(lock)) == ["vendor/a", "vendor/b", "vendor/c"]
+
+def test_cargo_lock_only_crates_with_a_source():
+    lock = lockfile("""
+        version = 3
+
+        [[package]]
+        name = "app"
+        version = "0.1.0"
+        dependencies = [
+         "serde",
+         "queue",
+        ]
+
+        [[package]]
+        name = "queue"
+        version = "0.2.0"
+        source = "git+https://github.com/example/queue?branch=main#0123456789abcdef"
+
+        [[package]]
+        name = "serde"
+        version = "1.0.197"
+        source = "registry+https://github.com/rust-lang/crates.io-index"
+        checksum = "3fb1c873e1b9b056a4dc4c0c198b24c3ffa059243875552b2bd0933b1aee4ce2"
+
+        [[package]]
+        name = "local-helper"
+        version = "0.1.0"
+        """)
+
+    assert names(dependencies_parser.rust_cargoLock(lock)) == ["queue", "serde"]
+
+def test_cargo_lock_v1_metadata_is_not_a_package():
+    lock = lockfile("""
+        [[package]]
+        name = "serde"
+        version = "1.0.0"
+        source = "registry+https://github.com/rust-lang/crates.io-index"
+
+        [metadata]
+        "checksum serde 1.0.0 (registry+https://github.com/rust-lang/crates.io-index)" = "0123"
+        name = "not-a-crate"
+        source = "not-a-source"
+        """)
+
+    assert names(dependencies_parser.rust_cargoLock(lock)) == ["serde"]
+
+# The fixture repo has one of each lockfile, which parse_dependencies sends to its parser and adds to 'others'
+def test_fixture_lockfiles_are_parsed_into_others():
+    fixture = load_fixtures(default_fixtures_dir)[fixture_repo]
+    lockfiles = {
+        "package-lock.json": "admin/package-lock.json",
+        "Gemfile.lock": "web/Gemfile.lock",
+        "composer.lock": "web/composer.lock",
+        "Cargo.lock": "services/worker/Cargo.lock",
+    }
+    repo = {"dependency_file_data": {
+        file_type: [{"path": path, "text": fixture.content(path).decode("utf-8"), "isTruncated": False}]
+        for file_type, path in lockfiles.items()
+    }}
+
+    others = set(names(data_processor.parse_dependencies(repo, list(fixture.languages), pool=ParserPool(workers=0))["others"]))
+
+    assert {"vue", "vue-demi", "rollup"} <= others
+    assert {"shop_theme", "rack-test", "rspec-rails"} <= others
+    assert {"guzzlehttp/promises", "sebastian/diff"} <= others
+    assert {"job-queue", "serde_derive"} <= others
+    # Workspaces, path gems and the crate of the repo itself are not dependencies
+    assert not {"@shop/ui", "checkout", "worker"} & others
+
+# The scraper finds and fetches the fixture's lockfiles through the stand-in GitHub API
+# (the GraphQL overview only lists the first level of the tree, the ones in deeper directories come from the REST tree)
+@pytest.mark.parametrize("mode", ["concurrent", "graphql"])
+def test_fixture_lockfiles_are_scraped(tmp_path, monkeypatch, mode):
+    monkeypatch.setattr(http_cache, "shared_cache", http_cache.HTTPCache(str(tmp_path / "cache")))
+    monkeypatch.setattr(blob_store, "shared_store", blob_store.BlobStore(str(tmp_path / "store")))
+
+    with FakeGitHub() as fake:
+        previous = scraper.configure_github_api(fake.base_url)
+        try:
+            repo_data = scraper.scrap_data(f"https://github.com/{fixture_repo}", "token", mode=mode)
+        finally:
+            scraper.configure_github_api(**previous)
+
+    dependency_files = repo_data["dependency_file_data"]
+    for file_type, path in (("package-lock.json", "admin/package-lock.json"), ("Gemfile.lock", "web/Gemfile.lock"),
+                            ("composer.lock", "web/composer.lock"), ("Cargo.lock", "services/worker/Cargo.lock")):
+        assert [entry["path"] for entry in dependency_files[file_type]] == [path]
+
+@pytest.mark.parametrize("parser", [dependencies_parser.js_packageLock, dependencies_parser.php_composerLock])
+def test_json_lockfiles_without_packages(parser):
+    assert parser("{}") == []
@@ -0,0 +1,34 @@
+import time
+import pytest
+from cocktail_scraper.rate_limiter import RequestScheduler, RateLimitExceeded, token_id
+
+
+def test_idle_token_states_are_dropped(monkeypatch):
+    scheduler = RequestScheduler(idle_ttl=60)
+    scheduler.acquire("Bearer old")
+    now = time.monotonic()
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    scheduler.acquire("Bearer new")
+
+    assert list(scheduler.states) == [token_id("Bearer new")]
+
+def test_token_states_backing_off_are_kept(monkeypatch):
+    scheduler = RequestScheduler(idle_ttl=60)
+    scheduler.state(token_id("Bearer old")).blocked_until = time.monotonic() + 120
+    now = time.monotonic()
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    scheduler.acquire("Bearer new")
+
+    assert set(scheduler.states) == {token_id("Bearer old"), token_id("Bearer new")}
+
+def test_requests_give_up_past_max_wait():
+    scheduler = RequestScheduler(max_wait=1)
+    scheduler.state(token_id("Bearer token")).blocked_until = time.monotonic() + 30
+
+    with pytest.raises(RateLimitExceeded) as error:
+        scheduler.acquire("Bearer token")
+
+    assert 29 < error.value.wait <= 30
+    assert scheduler.states[token_id("Bearer token")].waiting == []
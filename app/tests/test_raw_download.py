@@ -0,0 +1,35 @@
+import asyncio
+import pytest
+from cocktail_scraper import async_scraper, scraper
+from cocktail_scraper.fake_github import FakeGitHub, default_fixtures_dir, load_fixtures
+
+fixture_repo = "gitcocktail-fixtures/polyglot-shop"
+repo_url = f"https://github.com/{fixture_repo}"
+
+
+def test_streamed_text_decodes_characters_split_between_chunks():
+    text = scraper.StreamedText()
+    body = "name = \"café\" # ✓\n".encode("utf-8")
+    for index in range(len(body)):
+        text.feed(body[index:index + 1])
+
+    assert text.text() == "name = \"café\" # ✓\n"
+
+@pytest.fixture
+def fake_github():
+    with FakeGitHub() as fake:
+        previous = scraper.configure_github_api(fake.base_url)
+        try:
+            yield fake
+        finally:
+            scraper.configure_github_api(**previous)
+
+def test_raw_downloads_match_the_file(fake_github):
+    expected = load_fixtures(default_fixtures_dir)[fixture_repo].content("web/Gemfile.lock").decode("utf-8")
+
+    assert scraper.download_raw_file(repo_url, "web/Gemfile.lock", "token") == expected
+    assert asyncio.run(async_scraper.download_raw_file_async(repo_url, "web/Gemfile.lock", "token")) == expected
+
+def test_raw_downloads_over_max_bytes_are_abandoned(fake_github):
+    assert scraper.download_raw_file(repo_url, "web/Gemfile.lock", "token", max_bytes=100) is None
+    assert asyncio.run(async_scraper.download_raw_file_async(repo_url, "web/Gemfile.lock", "token", max_bytes=100)) is None
@@ -0,0 +1,39 @@
+import asyncio
+from cocktail_scraper import async_scraper, scraper
+
+# Subtrees of a small repo, by sha; 'broken' can't be fetched
+subtrees = {
+    "main": [{"path": "src", "type": "tree", "sha": "src"}, {"path": "README.md", "type": "blob", "sha": "readme"}],
+    "src": [{"path": "lib", "type": "tree", "sha": "broken"}, {"path": "app.py", "type": "blob", "sha": "app"}],
+}
+
+def get_subtree(repo_url, tree_sha, prefix, token=None):
+    if tree_sha not in subtrees:
+        return None
+    return [scraper.filter_tree_item(item, prefix) for item in subtrees[tree_sha]]
+
+async def get_subtree_async(repo_url, tree_sha, prefix, token=None):
+    return get_subtree(repo_url, tree_sha, prefix, token)
+
+
+def test_walk_repo_tree_lists_every_subtree(monkeypatch):
+    monkeypatch.setitem(subtrees, "broken", [])
+    monkeypatch.setattr(scraper, "get_subtree", get_subtree)
+
+    paths = [item["path"] for item in scraper.walk_repo_tree("https://github.com/owner/repo", "main")]
+
+    assert paths == ["README.md", "src", "src/app.py", "src/lib"]
+
+# A missing subtree would leave its files out of the analysis, so the walk fails instead
+def test_walk_repo_tree_fails_when_a_subtree_is_missing(monkeypatch):
+    monkeypatch.setattr(scraper, "get_subtree", get_subtree)
+
+    assert scraper.walk_repo_tree("https://github.com/owner/repo", "main").startswith("Error: ")
+    assert scraper.walk_repo_tree("https://github.com/owner/repo", "missing").startswith("Error: ")
+
+def test_walk_repo_tree_async_fails_when_a_subtree_is_missing(monkeypatch):
+    monkeypatch.setattr(async_scraper, "get_subtree_async", get_subtree_async)
+
+    result = asyncio.run(async_scraper.walk_repo_tree_async("https://github.com/owner/repo", "main"))
+
+    assert result.startswith("Error: ") and "src/lib/" in result